@@ -2,25 +2,56 @@
 AgentVox - Edge-based voice assistant using Gemma LLM with STT and TTS capabilities
 """
 
-from .voice_assistant import (
-    VoiceAssistant,
-    AudioLLMModule,
-    TTSModule,
-    AudioConfig,
-    ModelConfig,
-    main
-)
-from .record_speaker_wav import SpeakerRecorder
+import importlib
 
 __version__ = "0.1.0"
 __author__ = "MIMIC Lab"
 
-__all__ = [
-    "VoiceAssistant",
-    "AudioLLMModule",
-    "TTSModule",
-    "AudioConfig",
-    "ModelConfig",
-    "main",
-    "SpeakerRecorder"
-]
\ No newline at end of file
+# Public names and the submodules that define them. Submodules are imported on
+# first access so that `import agentvox` does not load speech or ML libraries.
+_LAZY_IMPORTS = {
+    "VoiceAssistant": ".voice_assistant",
+    "AudioLLMModule": ".voice_assistant",
+    "TTSModule": ".voice_assistant",
+    "AudioConfig": ".voice_assistant",
+    "ModelConfig": ".voice_assistant",
+    "main": ".voice_assistant",
+    "TextNormalizer": ".text_normalizer",
+    "SynthesisPool": ".tts_pool",
+    "AudioSink": ".audio_sink",
+    "create_sink": ".audio_sink",
+    "AudioSource": ".audio_source",
+    "create_source": ".audio_source",
+    "SpeakerRecorder": ".record_speaker_wav",
+    "QualityAnalyzer": ".voice_quality",
+    "LLMBackend": ".llm_backend",
+    "MLXBackend": ".llm_backend",
+    "LlamaCppBackend": ".llm_backend",
+    "FakeLLMBackend": ".llm_backend",
+    "create_backend": ".llm_backend",
+    "GenerationConfig": ".generation",
+    "GenerationScheduler": ".scheduler",
+    "ConversationMemory": ".memory",
+    "EndOfTurnPredictor": ".turn_detection",
+    "TranscriptionEngine": ".transcribe",
+    "MetricsRecorder": ".metrics",
+    "Span": ".metrics",
+    "JsonLinesSink": ".metrics",
+    "RingBufferSink": ".metrics",
+    "PrometheusSink": ".metrics",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
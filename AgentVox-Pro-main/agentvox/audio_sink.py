@@ -0,0 +1,286 @@
+"""
+Destinations for synthesized speech: local device, files, memory and network streams
+"""
+
+import socket
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+# Lateness of a chunk that a listener does not hear as a gap (seconds)
+UNDERRUN_TOLERANCE_S = 0.02
+# Sample rates an Opus stream can be written at
+OPUS_SAMPLE_RATES = {8000, 12000, 16000, 24000, 48000}
+
+
+class AudioSink:
+    """Receives int16 PCM while it is synthesized and measures its delivery
+
+    Each response begins with start(), from which the time to the first frame
+    is measured, and ends with end(). Underruns are counted against a
+    real-time playback clock that starts with the first frame: a chunk that
+    arrives after everything written before it would have finished playing
+    is an audible gap. Every sink uses the same clock, so a file or null sink
+    reports what a live listener would have heard, without device latency.
+    """
+
+    def __init__(self):
+        self.sample_rate = 24000
+        self.channels = 1
+        self._lock = threading.Lock()
+        self.start()
+
+    def open(self, sample_rate: int, channels: int = 1):
+        """Set the format of the PCM that will be written"""
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._open()
+
+    def start(self):
+        """Begin a response: reset the delivery measures"""
+        with self._lock:
+            self._start = time.perf_counter()
+            self._clock: Optional[float] = None  # When the audio written so far finishes playing
+            self.first_frame_ms: Optional[float] = None
+            self.underruns = 0
+            self.underrun_ms = 0.0
+            self.bytes_written = 0
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if self._clock is None:
+                self.first_frame_ms = (now - self._start) * 1000
+                self._clock = now
+            elif now > self._clock + UNDERRUN_TOLERANCE_S:
+                self.underruns += 1
+                self.underrun_ms += (now - self._clock) * 1000
+                self._clock = now
+            self._clock += len(chunk) / (2 * self.channels * self.sample_rate)
+            self.bytes_written += len(chunk)
+        self._write(chunk)
+
+    def end(self):
+        """Finish the current response"""
+
+    def close(self):
+        """Release the output; the sink cannot be written to afterwards"""
+
+    @property
+    def audio_seconds(self) -> float:
+        return self.bytes_written / (2 * self.channels * self.sample_rate)
+
+    def stats(self) -> Dict[str, float]:
+        """Delivery measures of the current response"""
+        stats = {"audio_s": self.audio_seconds, "underruns": self.underruns, "underrun_ms": self.underrun_ms}
+        if self.first_frame_ms is not None:
+            stats["first_audio_ms"] = self.first_frame_ms
+        return stats
+
+    def _open(self):
+        pass
+
+    def _write(self, chunk: bytes):
+        raise NotImplementedError
+
+
+class DeviceSink(AudioSink):
+    """Plays on a local output device; writes block at playback speed"""
+
+    def __init__(self, device_index: Optional[int] = None):
+        super().__init__()
+        self.device_index = device_index
+        self._audio = None
+        self._stream = None
+
+    def _open(self):
+        import pyaudio
+
+        self.close()
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.sample_rate,
+            output=True,
+            output_device_index=self.device_index
+        )
+
+    def _write(self, chunk: bytes):
+        if self._stream is None:
+            self._open()
+        self._stream.write(chunk)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+
+class WavFileSink(AudioSink):
+    """Appends all responses to a WAV file (the header is updated on every write)"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = Path(path)
+        self._file = None
+
+    def _open(self):
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = wave.open(str(self.path), "wb")
+        self._file.setnchannels(self.channels)
+        self._file.setsampwidth(2)
+        self._file.setframerate(self.sample_rate)
+
+    def _write(self, chunk: bytes):
+        if self._file is None:
+            self._open()
+        self._file.writeframes(chunk)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class OpusFileSink(AudioSink):
+    """Appends all responses to an Ogg Opus file (finalized by close())"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = Path(path)
+        self._file = None
+
+    def _open(self):
+        if self.sample_rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus does not support {self.sample_rate} Hz "
+                             f"(use one of {', '.join(map(str, sorted(OPUS_SAMPLE_RATES)))} or a WAV file)")
+        import soundfile as sf
+
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = sf.SoundFile(
+            str(self.path), "w", samplerate=self.sample_rate, channels=self.channels,
+            format="OGG", subtype="OPUS"
+        )
+
+    def _write(self, chunk: bytes):
+        if self._file is None:
+            self._open()
+        self._file.write(np.frombuffer(chunk, dtype=np.int16).reshape(-1, self.channels))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MemorySink(AudioSink):
+    """Keeps the audio of the current response in memory"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        super().__init__()
+
+    def start(self):
+        super().start()
+        self._chunks = []
+
+    def _write(self, chunk: bytes):
+        self._chunks.append(chunk)
+
+    def pcm(self) -> bytes:
+        return b"".join(self._chunks)
+
+    def audio(self) -> np.ndarray:
+        """int16 samples, shaped (frames, channels) for more than one channel"""
+        samples = np.frombuffer(self.pcm(), dtype=np.int16)
+        return samples.reshape(-1, self.channels) if self.channels > 1 else samples
+
+
+class NullSink(AudioSink):
+    """Discards the audio; measures synthesis throughput without any output"""
+
+    def _write(self, chunk: bytes):
+        pass
+
+
+class NetworkSink(AudioSink):
+    """Streams PCM in fixed-size frames as soon as they are synthesized
+
+    Frames are passed to `send`, e.g. a WebSocket send or socket.sendall;
+    the last partial frame of a response is sent by end().
+    """
+
+    def __init__(self, send: Callable[[bytes], None], frame_ms: int = 20, on_close: Optional[Callable[[], None]] = None):
+        self.send = send
+        self.frame_ms = frame_ms
+        self.on_close = on_close
+        self._pending = b""
+        super().__init__()
+
+    @classmethod
+    def connect(cls, url: str, frame_ms: int = 20) -> "NetworkSink":
+        """Sink that sends raw PCM over a TCP connection to tcp://host:port"""
+        parsed = urlparse(url)
+        if parsed.scheme != "tcp" or not parsed.hostname or not parsed.port:
+            raise ValueError(f"Expected tcp://host:port, got {url}")
+        connection = socket.create_connection((parsed.hostname, parsed.port))
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(connection.sendall, frame_ms=frame_ms, on_close=connection.close)
+
+    @property
+    def frame_bytes(self) -> int:
+        return 2 * self.channels * self.sample_rate * self.frame_ms // 1000
+
+    def start(self):
+        super().start()
+        self._pending = b""
+
+    def _write(self, chunk: bytes):
+        data = self._pending + chunk
+        end = len(data) - len(data) % self.frame_bytes
+        for offset in range(0, end, self.frame_bytes):
+            self.send(data[offset:offset + self.frame_bytes])
+        self._pending = data[end:]
+
+    def end(self):
+        if self._pending:
+            self.send(self._pending)
+            self._pending = b""
+
+    def close(self):
+        self.end()
+        if self.on_close is not None:
+            self.on_close()
+            self.on_close = None
+
+
+def create_sink(output: str) -> AudioSink:
+    """Sink for an output setting: device, null, memory, tcp://host:port or a .wav/.ogg/.opus path"""
+    if output == "device":
+        return DeviceSink()
+    if output == "null":
+        return NullSink()
+    if output == "memory":
+        return MemorySink()
+    if output.startswith("tcp://"):
+        return NetworkSink.connect(output)
+    suffix = Path(output).suffix.lower()
+    if suffix == ".wav":
+        return WavFileSink(output)
+    if suffix in (".ogg", ".opus"):
+        return OpusFileSink(output)
+    raise ValueError(f"Unknown audio output: {output} (device, null, memory, tcp://host:port or a .wav/.ogg/.opus file)")
@@ -0,0 +1,293 @@
+"""
+Sources of input audio: microphone, WAV replay, stdin/pipe PCM and network streams
+"""
+
+import socket
+import sys
+import time
+import wave
+from typing import BinaryIO, Iterator, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+
+from .vad import SAMPLE_RATE, pcm16_to_float
+
+# Length of the blocks a source yields (milliseconds)
+BLOCK_MS = 30
+
+
+class AudioSource:
+    """Yields mono float32 blocks in [-1, 1] at `sample_rate` until the input ends
+
+    Sources are iterable and usable as context managers; read() returns None
+    once the input has ended.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, block_ms: int = BLOCK_MS):
+        self.sample_rate = sample_rate
+        self.block_ms = block_ms
+
+    @property
+    def block_size(self) -> int:
+        return self.sample_rate * self.block_ms // 1000
+
+    def read(self) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def pause(self):
+        """Stop capturing until the next read; files and streams keep their position"""
+
+    def close(self):
+        pass
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while True:
+            block = self.read()
+            if block is None:
+                return
+            yield block
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MicrophoneSource(AudioSource):
+    """Reads the default (or a given) input device; the stream is opened on first read"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, block_ms: int = BLOCK_MS, device_index: Optional[int] = None):
+        super().__init__(sample_rate, block_ms)
+        self.device_index = device_index
+        self._audio = None
+        self._stream = None
+
+    def open(self):
+        import pyaudio
+
+        if self._stream is not None:
+            return
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.block_size,
+            input_device_index=self.device_index
+        )
+
+    def read(self) -> Optional[np.ndarray]:
+        self.open()
+        return pcm16_to_float(self._stream.read(self.block_size, exception_on_overflow=False))
+
+    def pause(self):
+        # Audio from before the next read would be stale
+        self.close()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+
+class WavFileSource(AudioSource):
+    """Replays a 16-bit WAV file as if it were being spoken
+
+    Blocks are paced at `speed` times real time (0 = as fast as possible).
+    `tail_silence_s` of silence follows the recording, paced in real time
+    whatever the speed, so an endpointer can end the last utterance.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, block_ms: int = BLOCK_MS, tail_silence_s: float = 1.5):
+        self.path = path
+        self.speed = speed
+        self.tail_silence_s = tail_silence_s
+        self._file = wave.open(path, "rb")
+        if self._file.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files can be replayed")
+        self.channels = self._file.getnchannels()
+        super().__init__(self._file.getframerate(), block_ms)
+        self._tail = int(tail_silence_s * self.sample_rate)
+        self._due: Optional[float] = None  # When the audio yielded so far has been spoken
+
+    def read(self) -> Optional[np.ndarray]:
+        now = time.perf_counter()
+        if self._due is None:
+            self._due = now
+        data = self._file.readframes(self.block_size) if self._file is not None else b""
+        if data:
+            block = pcm16_to_float(data)
+            if self.channels > 1:
+                block = block.reshape(-1, self.channels).mean(axis=1)
+            speed = self.speed
+        elif self._tail > 0:
+            block = np.zeros(min(self.block_size, self._tail), dtype=np.float32)
+            self._tail -= len(block)
+            speed = 1.0
+            self._due = max(self._due, now)
+        else:
+            return None
+
+        # A block is returned once it would have been spoken, as from a microphone
+        if speed > 0:
+            self._due += len(block) / (self.sample_rate * speed)
+            if self._due > now:
+                time.sleep(self._due - now)
+        return block
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class PipeSource(AudioSource):
+    """Reads raw int16 PCM from a binary stream (stdin by default), e.g. `arecord -t raw | agentvox --input -`"""
+
+    def __init__(
+        self,
+        stream: Optional[BinaryIO] = None,
+        sample_rate: int = SAMPLE_RATE,
+        channels: int = 1,
+        block_ms: int = BLOCK_MS
+    ):
+        super().__init__(sample_rate, block_ms)
+        self.stream = stream if stream is not None else sys.stdin.buffer
+        self.channels = channels
+
+    def read(self) -> Optional[np.ndarray]:
+        data = self._read_exactly(2 * self.channels * self.block_size)
+        if not data:
+            return None
+        # Drop a trailing partial sample
+        data = data[:len(data) - len(data) % (2 * self.channels)]
+        block = pcm16_to_float(data)
+        if self.channels > 1:
+            block = block.reshape(-1, self.channels).mean(axis=1)
+        return block
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.stream.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+
+class NetworkSource(PipeSource):
+    """Receives raw int16 PCM on a TCP port; the input ends when the sender disconnects"""
+
+    def __init__(self, url: str, sample_rate: int = SAMPLE_RATE, channels: int = 1, block_ms: int = BLOCK_MS):
+        parsed = urlparse(url)
+        if parsed.scheme != "tcp" or parsed.port is None:
+            raise ValueError(f"Expected tcp://host:port, got {url}")
+        self._server = socket.create_server((parsed.hostname or "0.0.0.0", parsed.port))
+        self._connection = None
+        super().__init__(stream=None, sample_rate=sample_rate, channels=channels, block_ms=block_ms)
+        self.stream = None
+
+    @property
+    def address(self):
+        return self._server.getsockname()
+
+    def read(self) -> Optional[np.ndarray]:
+        if self._connection is None:
+            self._connection, _ = self._server.accept()
+            self.stream = self._connection.makefile("rb")
+        return super().read()
+
+    def close(self):
+        if self._connection is not None:
+            self.stream.close()
+            self._connection.close()
+            self._connection = None
+        self._server.close()
+
+
+def create_source(
+    input: str,
+    sample_rate: int = SAMPLE_RATE,
+    speed: float = 1.0
+) -> AudioSource:
+    """Source for an input setting: microphone, a .wav file, - (stdin PCM) or tcp://host:port
+
+    `sample_rate` is the rate of the microphone and of raw PCM input; WAV
+    files are read at their own rate.
+    """
+    if input == "microphone":
+        return MicrophoneSource(sample_rate)
+    if input == "-":
+        return PipeSource(sample_rate=sample_rate)
+    if input.startswith("tcp://"):
+        return NetworkSource(input, sample_rate=sample_rate)
+    if input.lower().endswith(".wav"):
+        return WavFileSource(input, speed=speed)
+    raise ValueError(f"Unknown audio input: {input} (microphone, a .wav file, - or tcp://host:port)")
+
+
+class AmbientNoiseTracker:
+    """Noise floor of an input, calibrated once and then tracked as the input runs
+
+    The first `calibrate_s` of audio set the floor. After that, every block
+    below the speech threshold moves the floor a little (exponential
+    average), so the threshold follows a change in background noise without
+    a calibration pause before each utterance. Speech leaves the floor alone.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        calibrate_s: float = 1.0,
+        ratio: float = 3.0,
+        min_threshold: float = 0.005,
+        adapt: float = 0.05
+    ):
+        self.sample_rate = sample_rate
+        self.calibrate_samples = int(calibrate_s * sample_rate)
+        self.ratio = ratio  # Speech is this many times the noise RMS
+        self.min_threshold = min_threshold
+        self.adapt = adapt  # Weight of a new noise block in the floor
+        self.noise_rms = 0.0
+        self._calibrated = 0  # Samples used for calibration so far
+        self._energy = 0.0
+
+    @property
+    def calibrated(self) -> bool:
+        return self._calibrated >= self.calibrate_samples
+
+    @property
+    def threshold(self) -> float:
+        """RMS above which a block counts as speech"""
+        return max(self.min_threshold, self.noise_rms * self.ratio)
+
+    def calibrate(self, source: AudioSource):
+        """Read the calibration period from a source"""
+        while not self.calibrated:
+            block = source.read()
+            if block is None:
+                break
+            self.update(block)
+
+    def update(self, block: np.ndarray) -> bool:
+        """Track the noise floor with a block and return whether it is speech"""
+        if len(block) == 0:
+            return False
+        rms = float(np.sqrt(np.mean(block ** 2)))
+        if not self.calibrated:
+            self._energy += rms ** 2 * len(block)
+            self._calibrated += len(block)
+            self.noise_rms = float(np.sqrt(self._energy / self._calibrated))
+            return False
+        if rms > self.threshold:
+            return True
+        self.noise_rms += self.adapt * (rms - self.noise_rms)
+        return False
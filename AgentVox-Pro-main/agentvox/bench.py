@@ -0,0 +1,463 @@
+"""
+End-to-end latency benchmark that replays recorded audio through STT, LLM and TTS
+"""
+
+import argparse
+import json
+import platform
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .audio_sink import NullSink
+from .llm_backend import create_backend
+from .sentence_splitter import SentenceSplitter
+from .vad import FRAME_MS, SAMPLE_RATE, FrameVAD, resample
+from .voice_assistant import (ModelConfig, build_generation_config, build_prompt, build_prompt_prefix,
+                              build_system_prompt, stable_prefix)
+
+# Metrics reported for every turn, in report order
+METRICS = [
+    "vad_eos_ms",      # End of speech until the VAD ends the turn
+    "stt_ms",          # Transcription of the utterance
+    "ttft_ms",         # LLM request until the first token
+    "tokens_per_s",    # Decode speed after the first token
+    "draft_acceptance",  # Share of draft tokens accepted (speculative decoding only)
+    "first_sentence_ms",  # LLM request until the first complete sentence
+    "ttfa_ms",         # End of speech until the first synthesized audio chunk
+    "tts_rtf",         # Synthesis time divided by audio duration
+    "e2e_ms",          # End of speech until the last audio chunk of the response
+    "underruns",       # Gaps a real-time listener would hear during the response
+]
+
+# Metrics where a higher value is better
+HIGHER_IS_BETTER = {"tokens_per_s", "draft_acceptance"}
+
+# Sample prompts for the built-in synthetic fixtures
+SYNTHETIC_PROMPTS = {
+    "ko": [
+        "안녕하세요. 당신은 누구인가요?",
+        "음성 비서는 어떻게 동작하나요?",
+        "오늘 하루 잘 보내라고 말해 주세요.",
+    ],
+    "en": [
+        "Hello. Who are you?",
+        "How does a voice assistant work?",
+        "Please wish me a nice day.",
+    ],
+}
+
+
+@dataclass
+class Fixture:
+    """One recorded user utterance"""
+    name: str
+    audio: np.ndarray  # float32 mono at SAMPLE_RATE
+    transcript: Optional[str] = None  # Expected text, used by the stub STT
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+
+def load_fixtures(path: str) -> List[Fixture]:
+    """Load WAV files from a directory (or a single file) with optional .txt transcripts"""
+    import soundfile as sf
+
+    path = Path(path)
+    files = sorted(path.glob("*.wav")) if path.is_dir() else [path]
+    if not files:
+        raise FileNotFoundError(f"No WAV fixtures found in {path}")
+
+    fixtures = []
+    for wav in files:
+        audio, sr = sf.read(str(wav), dtype="float32", always_2d=True)
+        audio = resample(audio.mean(axis=1), sr)
+        txt = wav.with_suffix(".txt")
+        transcript = txt.read_text(encoding="utf-8").strip() if txt.exists() else None
+        fixtures.append(Fixture(wav.stem, audio, transcript))
+    return fixtures
+
+
+def synthetic_fixtures(language: str) -> List[Fixture]:
+    """Speech-like noise bursts followed by silence, for runs without recordings"""
+    prompts = SYNTHETIC_PROMPTS["ko" if language.startswith("ko") else "en"]
+    rng = np.random.default_rng(0)
+    fixtures = []
+    for i, prompt in enumerate(prompts):
+        speech_len = int(SAMPLE_RATE * (1.0 + 0.05 * len(prompt)))
+        t = np.arange(speech_len) / SAMPLE_RATE
+        # Syllable-rate envelope on top of a voiced tone and noise
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+        speech = envelope * (0.3 * np.sin(2 * np.pi * 180 * t) + 0.05 * rng.standard_normal(speech_len))
+        lead = np.zeros(int(SAMPLE_RATE * 0.3))
+        tail = np.zeros(int(SAMPLE_RATE * 1.5))
+        audio = np.concatenate([lead, speech, tail]).astype(np.float32)
+        fixtures.append(Fixture(f"synthetic_{i + 1}", audio, prompt))
+    return fixtures
+
+
+class EndOfSpeechDetector:
+    """Frame-level VAD that ends a turn after a fixed amount of trailing silence"""
+
+    def __init__(self, silence_ms: int):
+        self.silence_ms = silence_ms
+        self.vad = FrameVAD()
+
+    def detect(self, audio: np.ndarray) -> Optional[Dict[str, float]]:
+        """Return the end of speech and the moment the turn is ended, in seconds of audio
+
+        Trailing silence is padded as a live microphone would keep delivering it.
+        Returns None when the audio contains no speech.
+        """
+        frame_len = SAMPLE_RATE * FRAME_MS // 1000
+        silence_frames = int(np.ceil(self.silence_ms / FRAME_MS))
+        padded = np.concatenate([audio, np.zeros(frame_len * silence_frames, dtype=np.float32)])
+
+        last_speech = None
+        compute = 0.0
+        for i in range(len(padded) // frame_len):
+            frame = padded[i * frame_len:(i + 1) * frame_len]
+            start = time.perf_counter()
+            speech = self.vad.is_speech(frame)
+            compute += time.perf_counter() - start
+            if speech:
+                last_speech = i
+            elif last_speech is not None and i - last_speech >= silence_frames:
+                return {
+                    "speech_end": (last_speech + 1) * FRAME_MS / 1000,
+                    "detected": (i + 1) * FRAME_MS / 1000,
+                    "compute": compute,
+                }
+        return None
+
+
+class WhisperTranscriber:
+    """Offline Whisper transcription with the same model family as RealtimeSTT"""
+
+    def __init__(self, config: ModelConfig):
+        from faster_whisper import WhisperModel
+
+        # faster-whisper runs on CPU or CUDA only
+        device = "cuda" if config.device == "cuda" else "cpu"
+        self.model = WhisperModel(config.stt_model, device=device)
+        self.language = config.stt_language
+        self.beam_size = config.stt_beam_size
+
+    def transcribe(self, fixture: Fixture, audio: np.ndarray) -> str:
+        segments, _ = self.model.transcribe(audio, language=self.language, beam_size=self.beam_size)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class StubTranscriber:
+    """Returns the fixture transcript after a delay proportional to the audio length"""
+
+    def __init__(self, rtf: float = 0.05):
+        self.rtf = rtf
+
+    def transcribe(self, fixture: Fixture, audio: np.ndarray) -> str:
+        time.sleep(self.rtf * len(audio) / SAMPLE_RATE)
+        return fixture.transcript or fixture.name.replace("_", " ")
+
+
+class StubSynthesizer:
+    """Emits silent int16 PCM at a fixed real-time factor"""
+
+    sample_rate = 24000
+
+    def __init__(self, chars_per_second: float = 12.0, rtf: float = 0.2, chunk_seconds: float = 0.1):
+        self.chars_per_second = chars_per_second
+        self.rtf = rtf
+        self.chunk_seconds = chunk_seconds
+
+    def synthesize(self, text: str, on_audio_chunk: Callable[[bytes], None]):
+        remaining = len(text) / self.chars_per_second
+        chunk = np.zeros(int(self.sample_rate * self.chunk_seconds), dtype=np.int16).tobytes()
+        while remaining > 0:
+            time.sleep(self.rtf * self.chunk_seconds)
+            on_audio_chunk(chunk)
+            remaining -= self.chunk_seconds
+
+
+class BenchmarkRunner:
+    """Replay fixtures through VAD, STT, LLM and TTS and time every stage"""
+
+    def __init__(self, config: ModelConfig, transcriber, synthesizer, silence_ms: int):
+        self.config = config
+        self.transcriber = transcriber
+        self.synthesizer = synthesizer
+        self.detector = EndOfSpeechDetector(silence_ms)
+        # Audio is measured against a real-time playback clock without device latency
+        self.sink = NullSink()
+        self.sink.open(synthesizer.sample_rate)
+
+        self.llm = create_backend(config)
+        # The same sampling settings and stop rules as a live response
+        self.generation = build_generation_config(config)
+        if config.llm_prompt_cache:
+            self.llm.cache_prefix(build_system_prompt(config.stt_language), cache_file=config.llm_prompt_cache_file)
+
+    def run_turn(self, fixture: Fixture) -> Dict[str, Any]:
+        """Run one utterance through the pipeline and return its metrics"""
+        result: Dict[str, Any] = {"fixture": fixture.name}
+
+        # 1. End of speech
+        eos = self.detector.detect(fixture.audio)
+        if eos is None:
+            raise ValueError(f"No speech detected in fixture {fixture.name}")
+        vad_eos = eos["detected"] - eos["speech_end"] + eos["compute"]
+        result["vad_eos_ms"] = vad_eos * 1000
+        utterance = fixture.audio[:int(eos["detected"] * SAMPLE_RATE)]
+
+        # The partial transcript is prefilled while the user is still speaking
+        if self.config.llm_early_prefill and fixture.transcript:
+            partial = stable_prefix(fixture.transcript)
+            result["prefill_tokens"] = self.llm.prefill(build_prompt_prefix(self.config.stt_language, [], partial))
+
+        # Everything below is timed from the moment the VAD ends the turn
+        t0 = time.perf_counter()
+        self.sink.start()
+
+        # 2. Transcription
+        text = self.transcriber.transcribe(fixture, utterance)
+        stt_done = time.perf_counter()
+        result["stt_ms"] = (stt_done - t0) * 1000
+        result["transcript"] = text
+
+        # 3. Synthesis runs in its own thread, as it does during a conversation
+        sentences: "queue.Queue[Optional[str]]" = queue.Queue()
+        audio_stats = {"last_chunk": None, "synth_time": 0.0}
+
+        def on_audio_chunk(chunk: bytes):
+            audio_stats["last_chunk"] = time.perf_counter()
+            self.sink.write(chunk)
+
+        def tts_worker():
+            while True:
+                sentence = sentences.get()
+                if sentence is None:
+                    break
+                start = time.perf_counter()
+                self.synthesizer.synthesize(sentence, on_audio_chunk)
+                audio_stats["synth_time"] += time.perf_counter() - start
+
+        tts_thread = threading.Thread(target=tts_worker, daemon=True)
+        tts_thread.start()
+
+        # 4. Generation
+        prompt = self.llm.format_prompt(build_prompt(self.config.stt_language, [], text))
+        splitter = SentenceSplitter()
+        llm_start = time.perf_counter()
+        first_token = None
+        first_sentence = None
+        last_token = llm_start
+        for segment in self.llm.stream(prompt, self.generation):
+            last_token = time.perf_counter()
+            if first_token is None:
+                first_token = last_token
+            for sentence in splitter.feed(segment):
+                if first_sentence is None:
+                    first_sentence = time.perf_counter()
+                sentences.put(sentence)
+        remainder = splitter.flush()
+        if remainder:
+            if first_sentence is None:
+                first_sentence = time.perf_counter()
+            sentences.put(remainder)
+        sentences.put(None)
+        tts_thread.join()
+
+        tokens = self.llm.last_completion_tokens
+        if first_token is not None:
+            result["ttft_ms"] = (first_token - llm_start) * 1000
+            decode_time = last_token - first_token
+            if tokens > 1 and decode_time > 0:
+                result["tokens_per_s"] = (tokens - 1) / decode_time
+        if first_sentence is not None:
+            result["first_sentence_ms"] = (first_sentence - llm_start) * 1000
+        result["completion_tokens"] = tokens
+        result["prompt_tokens"] = self.llm.last_prompt_tokens
+        result["cached_tokens"] = self.llm.last_cached_tokens
+        if self.llm.last_draft_tokens:
+            result["draft_acceptance"] = self.llm.last_accepted_tokens / self.llm.last_draft_tokens
+
+        # 5. Audio
+        self.sink.end()
+        if self.sink.first_frame_ms is not None:
+            result["ttfa_ms"] = vad_eos * 1000 + self.sink.first_frame_ms
+            result["e2e_ms"] = (vad_eos + audio_stats["last_chunk"] - t0) * 1000
+            result["underruns"] = self.sink.underruns
+            if self.sink.audio_seconds > 0:
+                result["tts_rtf"] = audio_stats["synth_time"] / self.sink.audio_seconds
+
+        return result
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Compute p50/p95/mean for every metric over all runs"""
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs if metric in run]
+        if not values:
+            continue
+        summary[metric] = {
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "mean": float(np.mean(values)),
+            "count": len(values),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None):
+    """Print the summary table, with the change against a baseline if given"""
+    header = f"{'metric':<18}{'p50':>10}{'p95':>10}"
+    if baseline:
+        header += f"{'base p50':>10}{'base p95':>10}{'Δp50':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for metric, stats in summary.items():
+        line = f"{metric:<18}{stats['p50']:>10.2f}{stats['p95']:>10.2f}"
+        if baseline and metric in baseline:
+            base = baseline[metric]
+            line += f"{base['p50']:>10.2f}{base['p95']:>10.2f}"
+            if base["p50"]:
+                change = (stats["p50"] - base["p50"]) / base["p50"] * 100
+                better = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+                line += f"{change:>+8.1f}%" + (" ✓" if better and abs(change) >= 1 else "")
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="agentvox bench",
+                                     description="AgentVox end-to-end latency benchmark")
+    parser.add_argument("fixtures", nargs="?", default=None,
+                       help="Directory of WAV fixtures with optional .txt transcripts (default: built-in synthetic audio)")
+    parser.add_argument("--stub", action="store_true",
+                       help="Use stub STT/TTS and the fake LLM backend so the benchmark runs on CPU without models")
+    parser.add_argument("--model", type=str, default=None,
+                       help="MLX model identifier or path to a GGUF file")
+    parser.add_argument("--llm-backend", type=str, default=None,
+                       choices=["auto", "mlx", "llama_cpp", "fake"],
+                       help="LLM backend (default: fake with --stub, auto otherwise)")
+    parser.add_argument("--llm-threads", type=int, default=None,
+                       help="llama.cpp threads used for generation")
+    parser.add_argument("--llm-max-tokens", type=int, default=256,
+                       help="Maximum tokens per response (default: 256)")
+    parser.add_argument("--draft-model", type=str, default=None,
+                       help="Small GGUF draft model for speculative decoding, or 'lookup' (llama.cpp only)")
+    parser.add_argument("--draft-tokens", type=int, default=4,
+                       help="Draft tokens per verification step (default: 4)")
+    parser.add_argument("--no-prompt-cache", action="store_true",
+                       help="Prefill the full prompt every turn")
+    parser.add_argument("--early-prefill", action="store_true",
+                       help="Prefill the transcript minus its last word before the end of speech, as with partial transcripts")
+    parser.add_argument("--stt-model", type=str, default="base",
+                       help="Whisper model size for STT (default: base)")
+    parser.add_argument("--stt-language", type=str, default="ko",
+                       help="STT language (default: ko)")
+    parser.add_argument("--speaker-wav", type=str, default=None,
+                       help="Speaker voice sample for TTS")
+    parser.add_argument("--device", type=str, default=None,
+                       choices=["cpu", "cuda", "mps", "auto"],
+                       help="Device to use (default: cpu with --stub, auto otherwise)")
+    parser.add_argument("--silence-ms", type=int, default=600,
+                       help="Trailing silence that ends a turn, as in the recorder (default: 600)")
+    parser.add_argument("--repeat", type=int, default=3,
+                       help="Number of passes over the fixtures (default: 3)")
+    parser.add_argument("--tts-cache", action="store_true",
+                       help="Replay cached phrase audio; off by default so every sentence is synthesized and timed")
+    parser.add_argument("--warmup", type=int, default=1,
+                       help="Untimed turns before measuring (default: 1)")
+    parser.add_argument("--output", type=str, default="bench_results.json",
+                       help="JSON file for the results (default: bench_results.json)")
+    parser.add_argument("--compare", type=str, default=None,
+                       help="Previous results JSON to compare against")
+
+    args = parser.parse_args(argv)
+
+    config = ModelConfig(
+        stt_model=args.stt_model,
+        llm_model=args.model,
+        device=args.device or ("cpu" if args.stub else "auto"),
+        stt_language=args.stt_language,
+        speaker_wav=args.speaker_wav,
+        llm_max_tokens=args.llm_max_tokens,
+        llm_prompt_cache=not args.no_prompt_cache,
+        llm_early_prefill=args.early_prefill,
+        llm_backend=args.llm_backend or ("fake" if args.stub else "auto"),
+        llm_n_threads=args.llm_threads,
+        llm_draft_model=args.draft_model,
+        llm_draft_tokens=args.draft_tokens,
+        tts_cache=args.tts_cache
+    )
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures(config.stt_language)
+    print(f"Loaded {len(fixtures)} fixtures ({sum(f.duration for f in fixtures):.1f}s of audio)")
+
+    if args.stub:
+        transcriber = StubTranscriber()
+        synthesizer = StubSynthesizer()
+    else:
+        from .voice_assistant import TTSModule
+        transcriber = WhisperTranscriber(config)
+        synthesizer = TTSModule(config, sink=NullSink())
+
+    runner = BenchmarkRunner(config, transcriber, synthesizer, args.silence_ms)
+
+    for i in range(args.warmup):
+        runner.run_turn(fixtures[i % len(fixtures)])
+
+    runs = []
+    for n in range(args.repeat):
+        for fixture in fixtures:
+            result = runner.run_turn(fixture)
+            result["pass"] = n
+            runs.append(result)
+            print(f"[{n + 1}/{args.repeat}] {fixture.name}: "
+                  f"ttfa {result.get('ttfa_ms', float('nan')):.0f}ms, "
+                  f"e2e {result.get('e2e_ms', float('nan')):.0f}ms")
+
+    summary = summarize(runs)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["summary"]
+
+    print()
+    print_summary(summary, baseline)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "stub": args.stub,
+            "llm_backend": runner.llm.name,
+            "llm_model": config.llm_model,
+            "stt_model": config.stt_model,
+            "stt_language": config.stt_language,
+            "device": config.device,
+            "prompt_cache": config.llm_prompt_cache,
+            "tts_cache": config.tts_cache,
+            "silence_ms": args.silence_ms,
+            "repeat": args.repeat,
+            "fixtures": [f.name for f in fixtures],
+        },
+        "summary": summary,
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,10 +19,32 @@ def main():
         multiprocessing.set_start_method('spawn', force=True)
     except RuntimeError:
         pass  # Already set
-    
+
+    # Subcommands
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        from .bench import main as bench_main
+        bench_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "voice":
+        from .speaker_latents import main as voice_main
+        voice_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from .server import main as serve_main
+        serve_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "transcribe":
+        from .transcribe import main as transcribe_main
+        transcribe_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "turn-eval":
+        from .turn_detection import main as turn_eval_main
+        turn_eval_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="AgentVox - Voice Assistant")
     parser.add_argument("--model", type=str, default="mlx-community/gemma-3-12b-it-4bit",
-                       help="MLX model identifier (default: mlx-community/gemma-3-12b-it-4bit)")
+                       help="MLX model identifier or path to a GGUF file (default: mlx-community/gemma-3-12b-it-4bit)")
     parser.add_argument("--stt-model", type=str, default="base", 
                        choices=["tiny", "base", "small", "medium", "large"],
                        help="Whisper model size for STT")
@@ -32,10 +54,12 @@ def main():
     parser.add_argument("--voice", type=str, default="multilingual",
                        help="TTS voice preset (male/female/multilingual) - for compatibility")
     parser.add_argument("--tts-engine", type=str, default="coqui",
-                       choices=["coqui"],
-                       help="TTS engine to use (default: coqui)")
+                       choices=["coqui", "xtts"],
+                       help="TTS engine to use: coqui (worker process) or xtts (in-process with cached speaker latents) (default: coqui)")
     parser.add_argument("--speaker-wav", type=str, default=None,
-                       help="Speaker voice sample file for voice cloning (Coqui only)")
+                       help="Speaker voice sample (WAV) or JSON latents for voice cloning")
+    parser.add_argument("--speaker-latent-dir", type=str, default=None,
+                       help="Directory of cached binary speaker latents (default: models/tts/speakers)")
     parser.add_argument("--list-voices", action="store_true",
                        help="[Deprecated] List voices - not supported with Coqui engine")
     parser.add_argument("--list-tts-models", action="store_true",
@@ -56,10 +80,38 @@ def main():
                        help="Minimum speech duration in ms (default: 250)")
     parser.add_argument("--stt-vad-min-silence-duration", type=int, default=1000,
                        help="Minimum silence duration in ms before cutting off (default: 1000)")
+    parser.add_argument("--early-prefill", action="store_true",
+                       help="Transcribe partial speech and prefill the prompt while the user is still speaking")
+    parser.add_argument("--adaptive-endpointing", action="store_true",
+                       help="Shorten the silence wait when the partial transcript sounds like a finished sentence")
+    parser.add_argument("--adaptive-min-silence", type=int, default=250,
+                       help="Shortest silence wait in ms with --adaptive-endpointing (default: 250)")
+    parser.add_argument("--stt-realtime-model", type=str, default="tiny",
+                       help="Whisper model for partial transcripts with --early-prefill or --adaptive-endpointing (default: tiny)")
+    parser.add_argument("--input", type=str, default="microphone",
+                       help="Audio input: microphone, a .wav file to replay, - for raw int16 mono PCM on stdin, or tcp://host:port to receive it (default: microphone)")
+    parser.add_argument("--input-speed", type=float, default=1.0,
+                       help="Replay speed of a .wav input, 0 for as fast as possible (default: 1.0)")
+    parser.add_argument("--input-rate", type=int, default=16000,
+                       help="Sample rate of microphone, stdin and network input (default: 16000)")
     
     # TTS 파라미터
     parser.add_argument("--tts-speed", type=float, default=1.0,
                        help="TTS speed (1.0 is normal, higher is faster, default: 1.3)")
+    parser.add_argument("--no-tts-cache", action="store_true",
+                       help="Synthesize every phrase instead of replaying cached audio")
+    parser.add_argument("--tts-cache-dir", type=str, default=None,
+                       help="Directory for cached phrase audio (default: models/tts/phrase_cache)")
+    parser.add_argument("--tts-cache-phrases", type=str, default=None,
+                       help="Text file with phrases (one per line) to synthesize into the cache at startup")
+    parser.add_argument("--no-tts-normalize", action="store_true",
+                       help="Send LLM text to TTS as is instead of rewriting numbers, units and English into Hangul")
+    parser.add_argument("--tts-workers", type=int, default=1,
+                       help="TTS engines synthesizing upcoming sentences in parallel; each loads its own model (default: 1)")
+    parser.add_argument("--tts-max-ahead", type=float, default=10.0,
+                       help="Seconds of synthesized audio allowed ahead of playback with --tts-workers > 1 (default: 10)")
+    parser.add_argument("--tts-output", type=str, default="device",
+                       help="Where speech goes: device, null, memory, tcp://host:port, or a .wav/.ogg/.opus file (default: device)")
     
     # LLM 파라미터
     parser.add_argument("--llm-max-tokens", type=int, default=512,
@@ -68,8 +120,57 @@ def main():
                        help="LLM temperature for sampling (default: 0.7)")
     parser.add_argument("--llm-top-p", type=float, default=0.95,
                        help="LLM top-p for nucleus sampling (default: 0.95)")
+    parser.add_argument("--llm-repeat-penalty", type=float, default=1.1,
+                       help="LLM penalty for repeated tokens, 1.0 to disable (default: 1.1)")
+    parser.add_argument("--llm-stop", type=str, action="append", default=None,
+                       help="Stop sequence that ends a response, repeatable; \\n is a newline (default: the user label, e.g. \"\\n사용자:\")")
+    parser.add_argument("--llm-max-sentences", type=int, default=None,
+                       help="End spoken answers after this many sentences (default: no limit)")
+    parser.add_argument("--llm-max-spoken-chars", type=int, default=None,
+                       help="End spoken answers at the first sentence boundary after this many characters (default: no limit)")
     parser.add_argument("--llm-context-size", type=int, default=4096,
                        help="LLM context window size (default: 4096)")
+    parser.add_argument("--llm-history-tokens", type=int, default=1024,
+                       help="Token budget for recent turns kept verbatim in the prompt, 0 for no limit besides the context size (default: 1024)")
+    parser.add_argument("--no-llm-summary", action="store_true",
+                       help="Drop turns that no longer fit instead of summarizing them")
+    parser.add_argument("--llm-summary-tokens", type=int, default=200,
+                       help="Maximum length of the summary of older turns (default: 200)")
+    parser.add_argument("--no-streaming", action="store_true",
+                       help="Wait for the full LLM response before speaking")
+    parser.add_argument("--llm-backend", type=str, default="auto",
+                       choices=["auto", "mlx", "llama_cpp", "fake"],
+                       help="LLM backend (default: auto, llama_cpp for .gguf models and mlx otherwise)")
+    parser.add_argument("--llm-threads", type=int, default=None,
+                       help="llama.cpp threads used for generation (default: library default)")
+    parser.add_argument("--llm-threads-batch", type=int, default=None,
+                       help="llama.cpp threads used for prompt processing (default: same as --llm-threads)")
+    parser.add_argument("--llm-batch-size", type=int, default=512,
+                       help="llama.cpp prompt processing batch size (default: 512)")
+    parser.add_argument("--llm-gpu-layers", type=int, default=0,
+                       help="llama.cpp layers to offload to GPU, -1 for all (default: 0)")
+    parser.add_argument("--no-mmap", action="store_true",
+                       help="Load the GGUF model into memory instead of memory-mapping it")
+    parser.add_argument("--mlock", action="store_true",
+                       help="Lock the GGUF model in RAM to prevent swapping")
+    parser.add_argument("--draft-model", type=str, default=None,
+                       help="Small GGUF model of the same family (e.g. Gemma 3 1B) for speculative decoding, or 'lookup' to draft from earlier text (llama.cpp only)")
+    parser.add_argument("--draft-tokens", type=int, default=4,
+                       help="Tokens proposed by the draft model per verification step (default: 4)")
+    parser.add_argument("--no-prompt-cache", action="store_true",
+                       help="Prefill the full prompt every turn instead of reusing the cached system prompt")
+    parser.add_argument("--prompt-cache-file", type=str, default=None,
+                       help="File to save/load the system prompt cache across restarts")
+    parser.add_argument("--barge-in", action="store_true",
+                       help="Keep listening while speaking and stop playback when the user interrupts")
+    parser.add_argument("--sequential-startup", action="store_true",
+                       help="Load STT, LLM and TTS models one after another instead of concurrently")
+    
+    # Metrics
+    parser.add_argument("--metrics-log", type=str, default=None,
+                       help="Append per-stage timing spans as JSON lines to this file")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                       help="Serve Prometheus-style metrics at http://127.0.0.1:PORT/metrics")
     
     args = parser.parse_args()
     
@@ -113,6 +214,10 @@ def main():
         sys.exit(0)
     
     # Create configurations
+    tts_cache_phrases = None
+    if args.tts_cache_phrases:
+        with open(args.tts_cache_phrases, encoding="utf-8") as f:
+            tts_cache_phrases = [line.strip() for line in f if line.strip()]
     
     # Voice presets are for compatibility only - Coqui uses voice cloning
     stt_language = args.stt_language
@@ -120,7 +225,7 @@ def main():
     # Set device (auto-detection will happen in ModelConfig.__post_init__)
     device = args.device if args.device else "auto"
     
-    # Use MLX model (always)
+    # MLX model id or GGUF path; the backend is chosen from it unless --llm-backend is given
     llm_model = args.model
     
     model_config = ModelConfig(
@@ -134,15 +239,53 @@ def main():
         stt_vad_threshold=args.stt_vad_threshold,
         stt_vad_min_speech_duration_ms=args.stt_vad_min_speech_duration,
         stt_vad_min_silence_duration_ms=args.stt_vad_min_silence_duration,
+        stt_realtime_model=args.stt_realtime_model,
+        stt_adaptive_endpointing=args.adaptive_endpointing,
+        stt_adaptive_min_silence_ms=args.adaptive_min_silence,
+        stt_input=args.input,
+        stt_input_speed=args.input_speed,
+        stt_input_sample_rate=args.input_rate,
         # TTS parameters
         tts_engine=args.tts_engine,
         speaker_wav=args.speaker_wav,
+        speaker_latent_dir=args.speaker_latent_dir,
+        tts_cache=not args.no_tts_cache,
+        tts_cache_dir=args.tts_cache_dir,
+        tts_cache_phrases=tts_cache_phrases,
         tts_speed=args.tts_speed,
+        tts_normalize_text=not args.no_tts_normalize,
+        tts_workers=args.tts_workers,
+        tts_max_ahead_s=args.tts_max_ahead,
+        tts_output=args.tts_output,
         # LLM parameters
         llm_max_tokens=args.llm_max_tokens,
         llm_temperature=args.llm_temperature,
         llm_top_p=args.llm_top_p,
-        llm_context_size=args.llm_context_size
+        llm_repeat_penalty=args.llm_repeat_penalty,
+        llm_stop=[stop.replace("\\n", "\n") for stop in args.llm_stop] if args.llm_stop else None,
+        llm_max_sentences=args.llm_max_sentences,
+        llm_max_spoken_chars=args.llm_max_spoken_chars,
+        llm_context_size=args.llm_context_size,
+        llm_streaming=not args.no_streaming,
+        llm_prompt_cache=not args.no_prompt_cache,
+        llm_prompt_cache_file=args.prompt_cache_file,
+        llm_early_prefill=args.early_prefill,
+        llm_draft_model=args.draft_model,
+        llm_draft_tokens=args.draft_tokens,
+        llm_history_tokens=args.llm_history_tokens or None,
+        llm_summarize=not args.no_llm_summary,
+        llm_summary_tokens=args.llm_summary_tokens,
+        llm_backend=args.llm_backend,
+        llm_n_threads=args.llm_threads,
+        llm_n_threads_batch=args.llm_threads_batch,
+        llm_n_batch=args.llm_batch_size,
+        llm_n_gpu_layers=args.llm_gpu_layers,
+        llm_use_mmap=not args.no_mmap,
+        llm_use_mlock=args.mlock,
+        barge_in=args.barge_in,
+        parallel_startup=not args.sequential_startup,
+        metrics_log=args.metrics_log,
+        metrics_port=args.metrics_port
     )
     
     audio_config = AudioConfig()
@@ -0,0 +1,188 @@
+"""
+Event-driven conversation engine with concurrent listening, thinking and speaking
+"""
+
+import queue
+import threading
+import time
+from enum import Enum
+from typing import Optional
+
+
+class EngineState(Enum):
+    """States of a conversation turn"""
+    LISTENING = "listening"
+    THINKING = "thinking"
+    SPEAKING = "speaking"
+
+
+class ConversationEngine:
+    """Run STT, LLM and TTS in separate workers joined by queues
+
+    The microphone stays active while the assistant is talking. When the user
+    starts speaking during generation or playback, the current turn is
+    cancelled, playback is stopped and the next utterance is handled right away.
+    """
+
+    def __init__(self, audio_llm, tts, config):
+        self.audio_llm = audio_llm
+        self.tts = tts
+        self.config = config
+        self.is_korean = config.stt_language.startswith('ko')
+
+        # Transcribed utterances waiting for the LLM
+        self.utterances: "queue.Queue[Optional[str]]" = queue.Queue()
+        # (turn_id, sentence) pairs waiting for TTS; sentence None marks end of turn
+        self.sentences: "queue.Queue[tuple]" = queue.Queue()
+
+        self.state = EngineState.LISTENING
+        self.turn_id = 0
+        self.cancel_event = threading.Event()
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+        # Voice activity from the recorder triggers barge-in
+        self.audio_llm.on_speech_start = self._on_speech_start
+
+    def run(self):
+        """Start the workers and block until the user ends the conversation"""
+        if self.is_korean:
+            print("음성 대화 시스템이 시작되었습니다. (말하는 도중 끼어들기 가능)")
+            print("종료하려면 '종료'라고 말하세요.")
+        else:
+            print("Voice conversation system started. (you can interrupt at any time)")
+            print("Say 'exit' to quit.")
+        print("-" * 50)
+
+        for target in (self._stt_worker, self._llm_worker, self._tts_worker):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        try:
+            while not self.stop_event.is_set():
+                self.stop_event.wait(0.1)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stop all workers"""
+        self.stop_event.set()
+        self._interrupt()
+        self.utterances.put(None)
+        self.sentences.put((None, None))
+        self.audio_llm.on_speech_start = None
+
+    def _on_speech_start(self):
+        """Called by the recorder when voice activity begins"""
+        if self.state != EngineState.LISTENING:
+            self._interrupt()
+
+    def _interrupt(self):
+        """Cancel in-flight generation and stop playback"""
+        with self._lock:
+            self.turn_id += 1
+            self.cancel_event.set()
+            self.state = EngineState.LISTENING
+
+        self.audio_llm.cancel()
+
+        # Drop sentences that were queued for the cancelled turn
+        try:
+            while True:
+                self.sentences.get_nowait()
+        except queue.Empty:
+            pass
+
+        self.tts.stop()
+
+    def _stt_worker(self):
+        """Continuously transcribe user speech, including during playback"""
+        while not self.stop_event.is_set():
+            try:
+                text = self.audio_llm.listen()
+            except Exception as e:
+                if self.stop_event.is_set():
+                    break
+                print(f"STT error: {e}")
+                continue
+
+            if text:
+                self.utterances.put(text)
+            elif self.audio_llm.input_finished.is_set():
+                # A replayed, piped or network input has ended
+                self.utterances.put(None)
+                break
+
+    def _llm_worker(self):
+        """Generate responses for utterances and pass sentences to TTS"""
+        while not self.stop_event.is_set():
+            text = self.utterances.get()
+            if text is None and not self.stop_event.is_set():
+                self._finish()
+            if text is None or self.stop_event.is_set():
+                break
+
+            # Check exit command
+            if "exit" in text.lower() or "종료" in text:
+                print("\n대화를 종료합니다." if self.is_korean else "\nEnding conversation.")
+                self.stop_event.set()
+                break
+
+            # A newer utterance supersedes this one
+            if not self.utterances.empty():
+                continue
+
+            with self._lock:
+                self.turn_id += 1
+                turn_id = self.turn_id
+                self.cancel_event = threading.Event()
+                cancel_event = self.cancel_event
+                self.state = EngineState.THINKING
+
+            print("\n어시스턴트: " if self.is_korean else "\nAssistant: ", end="", flush=True)
+
+            try:
+                for sentence in self.audio_llm.stream_response(text, cancel_event=cancel_event):
+                    if cancel_event.is_set():
+                        break
+                    print(sentence, end=" ", flush=True)
+                    self.sentences.put((turn_id, sentence))
+            except Exception as e:
+                print(f"\nLLM error: {e}")
+            print()
+
+            self.sentences.put((turn_id, None))
+
+    def _finish(self):
+        """End the conversation once the last response has been spoken"""
+        while not self.stop_event.is_set() and (not self.sentences.empty() or self.state != EngineState.LISTENING):
+            time.sleep(0.05)
+        self.stop_event.set()
+
+    def _tts_worker(self):
+        """Play sentences of the current turn in order"""
+        while not self.stop_event.is_set():
+            turn_id, sentence = self.sentences.get()
+            if turn_id is None:
+                break
+
+            # Skip leftovers from cancelled turns
+            if turn_id != self.turn_id:
+                continue
+
+            if sentence is None:
+                # End of turn: wait for playback unless the user interrupts
+                while self.tts.is_speaking() and turn_id == self.turn_id:
+                    time.sleep(0.05)
+                with self._lock:
+                    if turn_id == self.turn_id:
+                        self.state = EngineState.LISTENING
+                continue
+
+            with self._lock:
+                if turn_id != self.turn_id:
+                    continue
+                self.state = EngineState.SPEAKING
+            self.tts.speak_async(sentence)
@@ -0,0 +1,127 @@
+"""
+Generation settings and stopping rules for LLM requests
+"""
+
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, List, Optional
+
+from .sentence_splitter import SentenceSplitter
+
+
+@dataclass
+class GenerationConfig:
+    """Sampling and stopping settings of one LLM request"""
+    max_tokens: int = 512
+    temperature: float = 0.7
+    top_p: float = 0.95
+    repeat_penalty: float = 1.1
+    stop: List[str] = field(default_factory=list)  # Text that ends the response (not included in it)
+    max_sentences: Optional[int] = None  # End the response after this many sentences
+    max_spoken_chars: Optional[int] = None  # End at the first sentence boundary after this many characters
+
+    @classmethod
+    def from_model_config(cls, config) -> "GenerationConfig":
+        """Defaults of the assistant from the llm_* fields of ModelConfig"""
+        return cls(
+            max_tokens=config.llm_max_tokens,
+            temperature=config.llm_temperature,
+            top_p=config.llm_top_p,
+            repeat_penalty=config.llm_repeat_penalty,
+            stop=list(config.llm_stop or []),
+            max_sentences=config.llm_max_sentences,
+            max_spoken_chars=config.llm_max_spoken_chars
+        )
+
+    def override(self, overrides: Optional[Dict[str, Any]] = None, **kwargs) -> "GenerationConfig":
+        """Copy with the given settings replaced; None values keep the current setting"""
+        changes = dict(overrides or {}, **kwargs)
+        unknown = set(changes) - {f.name for f in fields(self)}
+        if unknown:
+            raise ValueError(f"Unknown generation settings: {', '.join(sorted(unknown))}")
+        changes = {name: value for name, value in changes.items() if value is not None}
+        if "stop" in changes:
+            changes["stop"] = [changes["stop"]] if isinstance(changes["stop"], str) else list(changes["stop"])
+        return replace(self, **changes) if changes else self
+
+    @property
+    def has_stop_rules(self) -> bool:
+        return bool(self.stop) or self.max_sentences is not None or self.max_spoken_chars is not None
+
+
+class StopController:
+    """Apply stop sequences and the spoken-length budget to streamed text
+
+    Text that could be the start of a stop sequence is held back until the
+    next segment decides it. Sentences are counted with the same splitter
+    that feeds TTS, and once the budget is reached the output ends exactly
+    at that sentence boundary, so no fragment of the next sentence is spoken.
+    """
+
+    def __init__(self, config: GenerationConfig):
+        self.stop = [s for s in config.stop if s]
+        self.max_sentences = config.max_sentences
+        self.max_spoken_chars = config.max_spoken_chars
+        self.finish_reason: Optional[str] = None  # "stop" or "budget" once the response must end
+        self._held = ""
+        self._splitter = SentenceSplitter() if self._has_budget else None
+        self._text = ""  # Text released so far
+        self._boundary = 0  # End of the last complete sentence in _text
+        self.sentences = 0
+        self.spoken_chars = 0
+
+    @property
+    def _has_budget(self) -> bool:
+        return self.max_sentences is not None or self.max_spoken_chars is not None
+
+    @property
+    def stopped(self) -> bool:
+        return self.finish_reason is not None
+
+    def feed(self, segment: str) -> str:
+        """Text of the segment that may be emitted now"""
+        if self.stopped:
+            return ""
+        text = self._match_stop(segment)
+        if self._splitter is None:
+            return text
+        return self._count_sentences(text)
+
+    def flush(self) -> str:
+        """Held-back text once the stream has ended"""
+        if self.stopped:
+            return ""
+        text, self._held = self._held, ""
+        return text
+
+    def _match_stop(self, segment: str) -> str:
+        if not self.stop:
+            return segment
+        held = self._held + segment
+        found = [i for i in (held.find(stop) for stop in self.stop) if i >= 0]
+        if found:
+            self._held = ""
+            self.finish_reason = "stop"
+            return held[:min(found)]
+        # Keep the longest tail that may still grow into a stop sequence
+        keep = 0
+        for stop in self.stop:
+            for length in range(min(len(stop) - 1, len(held)), keep, -1):
+                if held.endswith(stop[:length]):
+                    keep = length
+                    break
+        self._held = held[len(held) - keep:] if keep else ""
+        return held[:len(held) - keep]
+
+    def _count_sentences(self, text: str) -> str:
+        start = len(self._text)
+        self._text += text
+        for sentence in self._splitter.feed(text):
+            self._boundary = self._text.index(sentence, self._boundary) + len(sentence)
+            self.sentences += 1
+            self.spoken_chars += len(sentence)
+            if (self.max_sentences is not None and self.sentences >= self.max_sentences) or \
+                    (self.max_spoken_chars is not None and self.spoken_chars >= self.max_spoken_chars):
+                self.finish_reason = "budget"
+                self._held = ""
+                return self._text[start:max(start, self._boundary)]
+        return text
@@ -0,0 +1,508 @@
+"""
+Pluggable LLM backends (MLX, llama.cpp and a deterministic stub engine)
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from .generation import GenerationConfig, StopController
+
+# Default model identifiers per backend
+DEFAULT_MLX_MODEL = "mlx-community/gemma-3-12b-it-4bit"
+
+# Gemma chat template used for GGUF models (BOS is added by the tokenizer)
+GEMMA_CHAT_TEMPLATE = "<start_of_turn>user\n{content}<end_of_turn>\n<start_of_turn>model\n"
+
+
+class LLMBackend:
+    """Common interface for LLM engines
+
+    Backends take a single user message, apply their chat template and stream
+    the generated text. Generation can be cancelled from another thread, and
+    token counts of the last request are kept for reporting. Subclasses
+    implement _stream() with the sampling settings of a GenerationConfig;
+    stop sequences and the spoken-length budget are applied here for all of
+    them.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.last_prompt_tokens = 0  # Tokens in the last prompt
+        self.last_cached_tokens = 0  # Prompt tokens reused from the prefix cache
+        self.last_completion_tokens = 0  # Tokens generated for the last prompt
+        self.last_draft_tokens = 0  # Tokens proposed by the draft model (speculative decoding)
+        self.last_accepted_tokens = 0  # Draft tokens the main model accepted
+        self.last_finish_reason = None  # stop, budget, length or end
+
+    def format_prompt(self, content: str) -> str:
+        """Apply the chat template to a single user message"""
+        return content
+
+    def cache_prefix(self, content_prefix: str, cache_file: Optional[str] = None):
+        """Precompute the model state for a fixed start of every user message
+
+        Backends without prefix caching ignore this.
+        """
+
+    def prefill(self, content_prefix: str) -> int:
+        """Evaluate the expected start of the next user message ahead of time
+
+        The next request reuses the part that matches and discards the rest.
+        Returns the number of tokens evaluated; backends without support
+        ignore this.
+        """
+        return 0
+
+    @contextmanager
+    def preserve_state(self):
+        """Keep the cached prefix and prefilled tokens across side requests such as summaries
+
+        Backends whose caches other prompts cannot evict do nothing.
+        """
+        yield
+
+    def stream(self, prompt: str, config: Optional[GenerationConfig] = None, **overrides) -> Iterator[str]:
+        """Yield text segments generated for a formatted prompt
+
+        Keyword arguments override single settings of config, e.g.
+        stream(prompt, config, max_tokens=64). The request starts when
+        stream() is called, so a cancel() issued before the first segment is
+        read still stops it.
+        """
+        config = (config or GenerationConfig()).override(overrides)
+        self._start_request()
+        return self._generate(prompt, config)
+
+    def _generate(self, prompt: str, config: GenerationConfig) -> Iterator[str]:
+        """Apply the stop rules of config to the segments of _stream()"""
+        segments = self._stream(prompt, config)
+        if not config.has_stop_rules:
+            yield from segments
+            self._finish(config)
+            return
+
+        controller = StopController(config)
+        try:
+            for segment in segments:
+                text = controller.feed(segment)
+                if text:
+                    yield text
+                if controller.stopped:
+                    break
+            else:
+                text = controller.flush()
+                if text:
+                    yield text
+        finally:
+            # Ends decoding in the backend when a stop rule fired
+            segments.close()
+        self._finish(config, controller.finish_reason)
+
+    def _stream(self, prompt: str, config: GenerationConfig) -> Iterator[str]:
+        """Yield text segments decoded with the sampling settings of config"""
+        raise NotImplementedError("The _stream method must be implemented by the backend.")
+
+    def generate(self, prompt: str, config: Optional[GenerationConfig] = None, **overrides) -> str:
+        """Generate the full response for a formatted prompt"""
+        return "".join(self.stream(prompt, config, **overrides))
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens in text"""
+        raise NotImplementedError("The count_tokens method must be implemented by the backend.")
+
+    def batch_engine(self, max_batch_size: int = 8):
+        """Engine that decodes several requests together, or None if unsupported"""
+        return None
+
+    def cancel(self):
+        """Stop the generation that is currently running"""
+        self.cancel_event.set()
+
+    def _start_request(self):
+        """Reset cancellation and token counters for a new request (called by stream())"""
+        self.cancel_event.clear()
+        self.last_prompt_tokens = 0
+        self.last_cached_tokens = 0
+        self.last_completion_tokens = 0
+        self.last_draft_tokens = 0
+        self.last_accepted_tokens = 0
+        self.last_finish_reason = None
+
+    def _finish(self, config: GenerationConfig, reason: Optional[str] = None):
+        """Record why the last request ended"""
+        if reason is None:
+            reason = "length" if self.last_completion_tokens >= config.max_tokens else "end"
+        self.last_finish_reason = reason
+
+    def _formatted_prefix(self, content_prefix: str) -> str:
+        """Formatted prompt text up to the end of content_prefix"""
+        formatted = self.format_prompt(content_prefix + "\n\n")
+        return formatted[:formatted.index(content_prefix) + len(content_prefix)]
+
+    @staticmethod
+    def _prefix_key(model_id: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model_id}\n{prefix}".encode("utf-8")).hexdigest()
+
+
+class MLXBackend(LLMBackend):
+    """MLX-VLM backend for Apple Silicon"""
+
+    name = "mlx"
+
+    def __init__(self, model_path: Optional[str] = None):
+        super().__init__()
+        from mlx_vlm import load
+
+        self.model_path = model_path or DEFAULT_MLX_MODEL
+        print(f"Loading MLX model: {self.model_path}")
+        self.model, self.processor = load(self.model_path)
+        self.model_config = self.model.config
+        self.tokenizer = getattr(self.processor, "tokenizer", self.processor)
+        self.prefix_cache = None
+
+    def format_prompt(self, content: str) -> str:
+        from mlx_vlm.prompt_utils import apply_chat_template
+        return apply_chat_template(self.processor, self.model_config, content)
+
+    def cache_prefix(self, content_prefix: str, cache_file: Optional[str] = None):
+        from .prompt_cache import PromptPrefixCache
+
+        self.prefix_cache = PromptPrefixCache(
+            self.model,
+            self.tokenizer,
+            model_id=self.model_path,
+            cache_file=cache_file
+        )
+        self.prefix_cache.build(self._formatted_prefix(content_prefix))
+
+    def prefill(self, content_prefix: str) -> int:
+        if self.prefix_cache is None:
+            return 0
+        return self.prefix_cache.extend(self._formatted_prefix(content_prefix))
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def batch_engine(self, max_batch_size: int = 8):
+        try:
+            from .scheduler import MLXBatchEngine
+            return MLXBatchEngine(self, max_batch_size)
+        except ImportError:
+            # Older mlx-vlm releases have no BatchGenerator
+            return None
+
+    @staticmethod
+    def _sampling_kwargs(config: GenerationConfig) -> dict:
+        """Sampling settings in the keyword arguments of mlx-vlm generate_step"""
+        kwargs = {"temperature": config.temperature, "top_p": config.top_p}
+        if config.repeat_penalty and config.repeat_penalty != 1.0:
+            kwargs["repetition_penalty"] = config.repeat_penalty
+        return kwargs
+
+    def _stream(self, prompt: str, config: GenerationConfig) -> Iterator[str]:
+
+        if self.prefix_cache is not None:
+            prompt_cache, token_ids = self.prefix_cache.prepare(prompt)
+            if prompt_cache is not None:
+                self.last_cached_tokens = self.prefix_cache.reused_tokens
+                self.last_prompt_tokens = self.last_cached_tokens + len(token_ids)
+                yield from self._decode_with_cache(token_ids, prompt_cache, config)
+                return
+
+        from mlx_vlm import stream_generate
+
+        self.last_prompt_tokens = self.count_tokens(prompt)
+        for result in stream_generate(
+            self.model,
+            self.processor,
+            prompt,
+            max_tokens=config.max_tokens,
+            **self._sampling_kwargs(config)
+        ):
+            if self.cancel_event.is_set():
+                return
+            self.last_completion_tokens += 1
+            yield result.text
+
+    def _stop_token_ids(self) -> set:
+        stop_ids = set(getattr(self.tokenizer, "eos_token_ids", None) or [self.tokenizer.eos_token_id])
+        end_of_turn = self.tokenizer.convert_tokens_to_ids("<end_of_turn>")
+        if isinstance(end_of_turn, int) and end_of_turn != getattr(self.tokenizer, "unk_token_id", None):
+            stop_ids.add(end_of_turn)
+        return stop_ids
+
+    def _decode_with_cache(self, token_ids: List[int], prompt_cache, config: GenerationConfig) -> Iterator[str]:
+        """Prefill only the uncached part of the prompt and decode the response"""
+        import mlx.core as mx
+        try:
+            from mlx_vlm.generate import generate_step
+        except ImportError:
+            from mlx_vlm.utils import generate_step
+
+        stop_ids = self._stop_token_ids()
+        detokenizer = self.processor.detokenizer
+        detokenizer.reset()
+
+        for n, (token, _) in zip(
+            range(config.max_tokens),
+            generate_step(
+                mx.array(token_ids)[None],
+                self.model,
+                None,
+                None,
+                prompt_cache=prompt_cache,
+                # generate_step stops at its own default (256) otherwise
+                max_tokens=config.max_tokens,
+                **self._sampling_kwargs(config)
+            )
+        ):
+            if self.cancel_event.is_set():
+                return
+            token = token.item() if hasattr(token, "item") else int(token)
+            if token in stop_ids:
+                break
+            self.last_completion_tokens += 1
+            detokenizer.add_token(token)
+            yield detokenizer.last_segment
+
+        detokenizer.finalize()
+        yield detokenizer.last_segment
+
+
+class LlamaCppBackend(LLMBackend):
+    """llama.cpp backend for GGUF models on CPU/GPU hosts"""
+
+    name = "llama_cpp"
+
+    def __init__(
+        self,
+        model_path: str,
+        n_ctx: int = 4096,
+        n_threads: Optional[int] = None,
+        n_threads_batch: Optional[int] = None,
+        n_batch: int = 512,
+        n_gpu_layers: int = 0,
+        use_mmap: bool = True,
+        use_mlock: bool = False,
+        chat_template: str = GEMMA_CHAT_TEMPLATE,
+        draft_model: Optional[str] = None,
+        num_draft_tokens: int = 4,
+        verbose: bool = False
+    ):
+        super().__init__()
+        from llama_cpp import Llama
+
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        self.model_path = model_path
+        self.chat_template = chat_template
+
+        # Speculative decoding: the draft proposes tokens and the main model verifies them in one batch
+        self.draft = None
+        if draft_model:
+            from .speculative import create_draft
+            self.draft = create_draft(
+                draft_model,
+                num_draft_tokens=num_draft_tokens,
+                n_ctx=n_ctx,
+                n_threads=n_threads,
+                n_gpu_layers=n_gpu_layers
+            )
+
+        print(f"Loading GGUF model: {model_path}")
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            n_threads_batch=n_threads_batch,
+            n_batch=n_batch,
+            n_gpu_layers=n_gpu_layers,
+            use_mmap=use_mmap,
+            use_mlock=use_mlock,
+            draft_model=self.draft,
+            # Verifying draft tokens needs the logits of every position
+            logits_all=self.draft is not None,
+            verbose=verbose
+        )
+
+    def format_prompt(self, content: str) -> str:
+        return self.chat_template.format(content=content)
+
+    def tokenize(self, text: str) -> List[int]:
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=True, special=True)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+    def cache_prefix(self, content_prefix: str, cache_file: Optional[str] = None):
+        """Evaluate the prefix once; llama.cpp reuses matching prompt prefixes on later calls"""
+        prefix = self._formatted_prefix(content_prefix)
+        key = self._prefix_key(self.model_path, prefix)
+        cache_path = Path(cache_file) if cache_file else None
+
+        if cache_path and cache_path.exists():
+            try:
+                with open(cache_path, "rb") as f:
+                    saved_key, state = pickle.load(f)
+                if saved_key == key:
+                    self.llm.load_state(state)
+                    return
+            except Exception as e:
+                print(f"Failed to load prompt cache: {e}")
+
+        self.llm.reset()
+        self.llm.eval(self.tokenize(prefix))
+
+        if cache_path:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(cache_path, "wb") as f:
+                    pickle.dump((key, self.llm.save_state()), f)
+            except Exception as e:
+                print(f"Failed to save prompt cache: {e}")
+
+    def prefill(self, content_prefix: str) -> int:
+        """Evaluate the prefix now; create_completion keeps the longest matching prefix"""
+        tokens = self.tokenize(self._formatted_prefix(content_prefix))
+        n_past = self.llm.longest_token_prefix(self.llm.input_ids[:self.llm.n_tokens], tokens)
+        if n_past >= len(tokens):
+            return 0
+        # eval() drops the KV entries after n_tokens before evaluating
+        self.llm.n_tokens = n_past
+        self.llm.eval(tokens[n_past:])
+        return len(tokens) - n_past
+
+    @contextmanager
+    def preserve_state(self):
+        # The context holds a single sequence, so any other prompt overwrites the prefix
+        state = self.llm.save_state()
+        try:
+            yield
+        finally:
+            self.llm.load_state(state)
+
+    def _stream(self, prompt: str, config: GenerationConfig) -> Iterator[str]:
+        tokens = self.tokenize(prompt)
+        self.last_prompt_tokens = len(tokens)
+        self.last_cached_tokens = self.llm.longest_token_prefix(self.llm.input_ids[:self.llm.n_tokens], tokens)
+        if self.draft is not None:
+            self.draft.start_request()
+
+        for chunk in self.llm.create_completion(
+            tokens,
+            max_tokens=config.max_tokens,
+            temperature=config.temperature,
+            top_p=config.top_p,
+            repeat_penalty=config.repeat_penalty,
+            stop=config.stop,
+            stream=True
+        ):
+            if self.cancel_event.is_set():
+                return
+            self.last_completion_tokens += 1
+            if self.draft is not None:
+                self.last_draft_tokens = self.draft.proposed_tokens
+                self.last_accepted_tokens = self.draft.accepted_tokens
+            yield chunk["choices"][0]["text"]
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic stub engine for benchmarks and tests without a model
+
+    Responses are picked from a fixed list by a hash of the prompt and emitted
+    word by word at a fixed rate, so runs are reproducible on any machine.
+    """
+
+    name = "fake"
+
+    RESPONSES = {
+        "ko": [
+            "안녕하세요. 저는 서강대학교 미믹랩에서 만든 에이아이 어시스턴트입니다. 무엇을 도와드릴까요?",
+            "좋은 질문입니다. 간단히 설명드리면, 음성 인식과 언어 모델과 음성 합성이 차례로 동작합니다.",
+            "오늘도 좋은 하루 보내세요. 더 궁금한 점이 있으면 언제든지 말씀해 주세요.",
+        ],
+        "en": [
+            "Hello. I am an AI assistant developed by MimicLab at Sogang University. How can I help you?",
+            "Good question. In short, speech recognition, the language model and speech synthesis run in turn.",
+            "Have a nice day. Let me know if you have any other questions.",
+        ],
+    }
+
+    def __init__(
+        self,
+        language: str = "ko",
+        tokens_per_second: float = 20.0,
+        time_to_first_token: float = 0.2
+    ):
+        super().__init__()
+        self.responses = self.RESPONSES["ko" if language.startswith("ko") else "en"]
+        self.tokens_per_second = tokens_per_second
+        self.time_to_first_token = time_to_first_token
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def response_for(self, prompt: str) -> str:
+        """Canned response picked by a hash of the prompt"""
+        return self.responses[zlib.crc32(prompt.encode("utf-8")) % len(self.responses)]
+
+    def batch_engine(self, max_batch_size: int = 8):
+        from .scheduler import FakeBatchEngine
+        return FakeBatchEngine(self, max_batch_size)
+
+    def _stream(self, prompt: str, config: GenerationConfig) -> Iterator[str]:
+        self.last_prompt_tokens = self.count_tokens(prompt)
+
+        words = self.response_for(prompt).split()[:config.max_tokens]
+
+        time.sleep(self.time_to_first_token)
+        for i, word in enumerate(words):
+            if self.cancel_event.is_set():
+                return
+            if i > 0 and self.tokens_per_second > 0:
+                time.sleep(1.0 / self.tokens_per_second)
+            self.last_completion_tokens += 1
+            yield word if i == 0 else " " + word
+
+
+def create_backend(config) -> LLMBackend:
+    """Create the LLM backend selected in ModelConfig"""
+    backend = config.llm_backend
+    model = config.llm_model
+
+    if backend == "auto":
+        backend = "llama_cpp" if model and model.endswith(".gguf") else "mlx"
+
+    if config.llm_draft_model and backend != "llama_cpp":
+        print(f"Speculative decoding is only supported by the llama.cpp backend, ignoring the draft model for {backend}")
+
+    if backend == "mlx":
+        return MLXBackend(model)
+    if backend == "llama_cpp":
+        if not model:
+            raise FileNotFoundError("A GGUF model path is required for the llama.cpp backend")
+        return LlamaCppBackend(
+            model,
+            n_ctx=config.llm_context_size,
+            n_threads=config.llm_n_threads,
+            n_threads_batch=config.llm_n_threads_batch,
+            n_batch=config.llm_n_batch,
+            n_gpu_layers=config.llm_n_gpu_layers,
+            use_mmap=config.llm_use_mmap,
+            use_mlock=config.llm_use_mlock,
+            draft_model=config.llm_draft_model,
+            num_draft_tokens=config.llm_draft_tokens
+        )
+    if backend == "fake":
+        return FakeLLMBackend(language=config.stt_language)
+
+    raise ValueError(f"Unknown LLM backend: {backend}")
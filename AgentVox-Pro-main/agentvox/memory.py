@@ -0,0 +1,204 @@
+"""
+Conversation memory that fits history to a token budget and summarizes older turns
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+from .metrics import MetricsRecorder
+
+# Tokens reserved for the chat template and role markers around the prompt
+TEMPLATE_OVERHEAD_TOKENS = 32
+
+SUMMARY_HEADER = {
+    "ko": "이전 대화 요약:",
+    "en": "Summary of the earlier conversation:",
+}
+
+SUMMARY_INSTRUCTION = {
+    "ko": ("다음은 사용자와 어시스턴트의 대화입니다. 이후 대화에 필요한 사실, 사용자의 요청과 선호, "
+           "결정된 내용을 중심으로 기존 요약을 갱신하세요. 요약만 평범한 문장으로 {words}단어 이내로 쓰세요."),
+    "en": ("Below is a conversation between a user and an assistant. Update the existing summary with the "
+           "facts, user requests, preferences and decisions needed later in the conversation. "
+           "Write only the summary as plain sentences in at most {words} words."),
+}
+
+
+class ConversationMemory:
+    """Recent turns that fit a token budget plus a running summary of older ones
+
+    Turns are counted with the model's tokenizer. The newest turns that fit
+    the budget are kept verbatim; turns that fall out of it are folded into
+    the summary by a background thread between turns. Starting a new turn
+    interrupts the summary so it never delays a response; it is retried
+    after that turn.
+    """
+
+    def __init__(
+        self,
+        language: str = "ko",
+        llm=None,
+        context_size: int = 4096,
+        max_tokens: int = 512,
+        history_tokens: Optional[int] = 1024,
+        summarize: bool = True,
+        summary_tokens: int = 200,
+        metrics: Optional[MetricsRecorder] = None
+    ):
+        self.language = "ko" if language.startswith("ko") else "en"
+        self.llm = llm
+        self.context_size = context_size
+        self.max_tokens = max_tokens
+        self.history_tokens = history_tokens
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.metrics = metrics or MetricsRecorder()
+
+        self.turns: List[Tuple[str, int]] = []  # (line, tokens) for every turn not yet summarized
+        self.summary = ""
+        self.llm_lock = threading.Lock()  # Held while the LLM generates a response or a summary
+        self._lock = threading.Lock()
+        self._interrupt = threading.Event()
+        self._summarizer: Optional[threading.Thread] = None
+
+    def lines(self) -> List[str]:
+        """History lines that are kept verbatim"""
+        with self._lock:
+            return [line for line, _ in self.turns]
+
+    def add_turn(self, user_text: str, response: str):
+        """Record a finished turn and compact the history if it no longer fits"""
+        if self.language == "ko":
+            lines = [f"사용자: {user_text}", f"어시스턴트: {response}"]
+        else:
+            lines = [f"User: {user_text}", f"Assistant: {response}"]
+        with self._lock:
+            for line in lines:
+                self.turns.append((line, self._count(line)))
+        self._compact()
+
+    def build_prompt(self, text: str, partial: bool = False) -> str:
+        """Prompt with the system prompt, summary and the recent turns that fit
+
+        With partial=True the prompt ends right after the user text.
+        """
+        from .voice_assistant import build_prompt, build_prompt_prefix
+
+        # A new turn takes the LLM, so stop any summary in progress
+        self.interrupt()
+
+        with self._lock:
+            window = self._window(self._budget(self._base_prompt(text)))
+            history = [line for line, _ in self.turns[len(self.turns) - window:]] if window else []
+            summary = self.summary
+        return (build_prompt_prefix if partial else build_prompt)(self.language, history, text, summary)
+
+    def interrupt(self):
+        """Stop the summary in progress so the LLM is free for the next turn"""
+        self._interrupt.set()
+
+    def reset(self):
+        self._interrupt.set()
+        with self._lock:
+            self.turns = []
+            self.summary = ""
+
+    def _base_prompt(self, text: str) -> str:
+        """Prompt without history"""
+        from .voice_assistant import build_prompt
+        return build_prompt(self.language, [], text, self.summary)
+
+    def _count(self, text: str) -> int:
+        if self.llm is None:
+            return len(text.split())
+        return self.llm.count_tokens(text)
+
+    def _budget(self, base_prompt: str) -> int:
+        """Tokens available for history next to the fixed part of the prompt"""
+        budget = self.context_size - self.max_tokens - self._count(base_prompt) - TEMPLATE_OVERHEAD_TOKENS
+        if self.history_tokens is not None:
+            budget = min(budget, self.history_tokens)
+        return max(0, budget)
+
+    def _window(self, budget: int) -> int:
+        """Number of newest lines whose tokens fit the budget (whole turns only)"""
+        used = 0
+        count = 0
+        for i in range(len(self.turns) - 2, -1, -2):
+            turn_tokens = sum(tokens for _, tokens in self.turns[i:i + 2])
+            if used + turn_tokens > budget:
+                break
+            used += turn_tokens
+            count += 2
+        return count
+
+    def _compact(self):
+        """Fold turns outside the budget into the summary, or drop them"""
+        with self._lock:
+            # Leave room for the summary to grow to its full length
+            reserved = max(0, self.summary_tokens - self._count(self.summary)) if self.summarize else 0
+            budget = self._budget(self._base_prompt("")) - reserved
+            overflow = len(self.turns) - self._window(max(0, budget))
+            if overflow <= 0:
+                return
+            if not self.summarize or self.llm is None:
+                del self.turns[:overflow]
+                return
+            if self._summarizer is not None and self._summarizer.is_alive():
+                return
+            self._interrupt.clear()
+            self._summarizer = threading.Thread(
+                target=self._summarize,
+                args=(overflow,),
+                name="agentvox-summary",
+                daemon=True
+            )
+            self._summarizer.start()
+
+    def _summarize(self, count: int):
+        """Merge the oldest turns into the summary (runs in the background)"""
+        with self._lock:
+            old_lines = [line for line, _ in self.turns[:count]]
+            previous = self.summary
+        content = self._summary_request(previous, old_lines)
+
+        # The summary must not evict the prefix state the next turn starts from
+        with self.llm_lock, self.llm.preserve_state(), self.metrics.span("summarize", turns=count // 2) as span:
+            if self._interrupt.is_set():
+                span.set(cancelled=True)
+                return
+            pieces = []
+            segments = self.llm.stream(
+                self.llm.format_prompt(content),
+                max_tokens=self.summary_tokens,
+                temperature=0.3
+            )
+            try:
+                for segment in segments:
+                    if self._interrupt.is_set():
+                        span.set(cancelled=True)
+                        return
+                    pieces.append(segment)
+            finally:
+                # Decoding has to end before the state is restored
+                segments.close()
+            summary = "".join(pieces).strip()
+            span.set(summary_tokens=self.llm.last_completion_tokens)
+
+        if not summary:
+            return
+        with self._lock:
+            # The history may have been reset while the summary was generated
+            if self.summary != previous or [line for line, _ in self.turns[:count]] != old_lines:
+                return
+            self.summary = summary
+            del self.turns[:count]
+
+    def _summary_request(self, previous: str, lines: List[str]) -> str:
+        words = max(20, self.summary_tokens // 2)
+        parts = [SUMMARY_INSTRUCTION[self.language].format(words=words)]
+        if previous:
+            parts.append(f"{SUMMARY_HEADER[self.language]}\n{previous}")
+        parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+
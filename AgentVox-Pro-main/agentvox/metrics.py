@@ -0,0 +1,273 @@
+"""
+Timing spans for the stages of a conversation turn, with pluggable sinks
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+# Histogram buckets (ms) for the Prometheus sink
+DEFAULT_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Span attributes that count things (also as a suffix, e.g. prompt_tokens); only these are summed into counters
+COUNT_ATTRIBUTES = ("tokens", "chars", "bytes", "underruns", "turns")
+
+
+@dataclass
+class Span:
+    """Timing of one stage of a turn with its attributes (token counts, audio length, ...)"""
+    name: str
+    turn: int
+    start: float  # Wall clock (time.time()) when the stage started
+    duration_ms: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs):
+        """Attach attributes to the span while the stage is running"""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "turn": self.turn,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            **self.attrs,
+        }
+
+
+class MetricsSink:
+    """Receives finished spans"""
+
+    def emit(self, span: Span):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(MetricsSink):
+    """Append one JSON object per span to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RingBufferSink(MetricsSink):
+    """Keep the most recent spans in memory"""
+
+    def __init__(self, capacity: int = 1000):
+        self._spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, name: Optional[str] = None) -> List[Span]:
+        """Return buffered spans, oldest first, optionally only those of one stage"""
+        with self._lock:
+            spans = list(self._spans)
+        if name is not None:
+            spans = [s for s in spans if s.name == name]
+        return spans
+
+    def turn(self, turn: int) -> List[Span]:
+        """Return the spans recorded for one turn"""
+        return [s for s in self.spans() if s.turn == turn]
+
+
+class PrometheusSink(MetricsSink):
+    """Aggregate span durations and numeric attributes in Prometheus text format
+
+    Durations become an `agentvox_stage_duration_ms` histogram labelled by stage.
+    Count attributes (tokens, chars, ...) are summed into
+    `agentvox_stage_<attr>_total` counters. Other numeric attributes, such as
+    latencies and rates, become `agentvox_stage_<attr>` summaries with a
+    `_sum` and `_count`, so dashboards can average them.
+    If a port is given, the metrics are served over HTTP at /metrics.
+    """
+
+    def __init__(self, port: Optional[int] = None, host: str = "127.0.0.1",
+                 buckets_ms=DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._histograms: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._summaries: Dict[tuple, List[float]] = {}  # (attr, stage) -> [sum, count]
+        self._lock = threading.Lock()
+        self._server = None
+        if port is not None:
+            self.serve(port, host)
+
+    def emit(self, span: Span):
+        with self._lock:
+            hist = self._histograms.setdefault(span.name, {
+                "buckets": [0] * len(self.buckets_ms),
+                "count": 0,
+                "sum": 0.0,
+            })
+            for i, bound in enumerate(self.buckets_ms):
+                if span.duration_ms <= bound:
+                    hist["buckets"][i] += 1
+            hist["count"] += 1
+            hist["sum"] += span.duration_ms
+
+            for key, value in span.attrs.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if self._is_count(key):
+                    self._counters[(key, span.name)] = self._counters.get((key, span.name), 0.0) + value
+                else:
+                    summary = self._summaries.setdefault((key, span.name), [0.0, 0])
+                    summary[0] += value
+                    summary[1] += 1
+
+    @staticmethod
+    def _is_count(key: str) -> bool:
+        return key in COUNT_ATTRIBUTES or key.endswith(tuple("_" + name for name in COUNT_ATTRIBUTES))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP agentvox_stage_duration_ms Duration of conversation stages in milliseconds",
+            "# TYPE agentvox_stage_duration_ms histogram",
+        ]
+        with self._lock:
+            for stage, hist in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets_ms, hist["buckets"]):
+                    lines.append(f'agentvox_stage_duration_ms_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'agentvox_stage_duration_ms_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'agentvox_stage_duration_ms_sum{{stage="{stage}"}} {hist["sum"]:.3f}')
+                lines.append(f'agentvox_stage_duration_ms_count{{stage="{stage}"}} {hist["count"]}')
+
+            previous = None
+            for (key, stage), value in sorted(self._counters.items()):
+                metric = f"agentvox_stage_{key}_total"
+                if metric != previous:
+                    lines.append(f"# TYPE {metric} counter")
+                    previous = metric
+                lines.append(f'{metric}{{stage="{stage}"}} {value:g}')
+
+            previous = None
+            for (key, stage), (total, count) in sorted(self._summaries.items()):
+                metric = f"agentvox_stage_{key}"
+                if metric != previous:
+                    lines.append(f"# TYPE {metric} summary")
+                    previous = metric
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {total:g}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve the metrics over HTTP in a background thread"""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class MetricsRecorder:
+    """Create spans for each stage of a turn and pass them to the sinks
+
+    Without sinks, spans are still timed but not stored, so instrumented code
+    does not need to check whether metrics are enabled.
+    """
+
+    def __init__(self, sinks: Optional[List[MetricsSink]] = None):
+        self.sinks = list(sinks or [])
+        self.turn = 0
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink: MetricsSink):
+        self.sinks.append(sink)
+
+    def new_turn(self) -> int:
+        """Start a new turn; later spans are tagged with its number"""
+        with self._lock:
+            self.turn += 1
+            return self.turn
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        """Time the enclosed block as one stage
+
+        The span is emitted even if the block raises or a generator using it is
+        closed early, with an `error` or `cancelled` attribute set.
+        """
+        span = Span(name=name, turn=self.turn, start=time.time(), attrs=dict(attrs))
+        started = time.perf_counter()
+        try:
+            yield span
+        except GeneratorExit:
+            span.set(cancelled=True)
+            raise
+        except Exception as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            self.emit(span)
+
+    def emit(self, span: Span):
+        for sink in self.sinks:
+            try:
+                sink.emit(span)
+            except Exception as e:
+                print(f"Metrics sink error: {e}")
+
+    def find_sink(self, sink_type: type) -> Optional[MetricsSink]:
+        """Return the first sink of the given type"""
+        for sink in self.sinks:
+            if isinstance(sink, sink_type):
+                return sink
+        return None
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def create_recorder(config) -> MetricsRecorder:
+    """Create a recorder with the sinks enabled in ModelConfig"""
+    sinks: List[MetricsSink] = [RingBufferSink(config.metrics_buffer_size)]
+    if config.metrics_log:
+        sinks.append(JsonLinesSink(config.metrics_log))
+    if config.metrics_port:
+        sinks.append(PrometheusSink(port=config.metrics_port))
+    return MetricsRecorder(sinks)
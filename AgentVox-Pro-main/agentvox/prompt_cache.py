@@ -0,0 +1,176 @@
+"""
+Reusable KV cache for the fixed system-prompt prefix of MLX prompts
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import mlx.core as mx
+from mlx.utils import tree_flatten, tree_map, tree_unflatten
+from mlx_vlm.models.cache import make_prompt_cache
+
+# Number of tokens evaluated per forward pass while prefilling the prefix
+PREFILL_STEP_SIZE = 512
+
+
+class PromptPrefixCache:
+    """Model state for a prompt prefix, computed once and reused every turn
+
+    The prefix (chat template header plus system prompt) is prefilled a single
+    time. Each turn gets a copy of that state, so only the history lines and the
+    user text that follow the prefix have to be prefilled.
+
+    Text expected to follow the prefix (e.g. a partial transcript) can also be
+    prefilled speculatively with extend(); the next prompt reuses the part of
+    it that matches and the rest is trimmed off.
+    """
+
+    def __init__(self, model, tokenizer, model_id: str, cache_file: Optional[str] = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.model_id = model_id
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.token_ids: List[int] = []
+        self.cache: Optional[List[Any]] = None
+        self.reused_tokens = 0  # Prompt tokens served from the cache by the last prepare()
+        self._speculative: Optional[Tuple[List[int], List[Any]]] = None
+        self._key = None
+
+    def encode(self, text: str) -> List[int]:
+        """Tokenize formatted prompt text (special tokens are already in the template)"""
+        return list(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def build(self, prefix: str):
+        """Compute or load the cache for the given prefix text"""
+        token_ids = self.encode(prefix)
+        key = hashlib.sha256(f"{self.model_id}\n{prefix}".encode("utf-8")).hexdigest()
+        if key == self._key and self.cache is not None:
+            return
+
+        cache = None
+        if self.cache_file and self.cache_file.exists():
+            cache = self._load(key)
+
+        if cache is None:
+            cache = self._prefill(token_ids)
+            if self.cache_file:
+                self._save(key, cache)
+
+        self.cache = cache
+        self.token_ids = token_ids
+        self._speculative = None
+        self._key = key
+
+    def prepare(self, prompt: str) -> Tuple[Optional[List[Any]], List[int]]:
+        """Return a cache for the start of the prompt and the token ids still to prefill
+
+        The speculative cache is used when it matches more of the prompt than
+        the fixed prefix. If the prompt does not start with the cached prefix,
+        no cache is returned and the full prompt has to be prefilled.
+        """
+        token_ids = self.encode(prompt)
+        n = len(self.token_ids)
+        self.reused_tokens = 0
+        if self.cache is None or len(token_ids) <= n or token_ids[:n] != self.token_ids:
+            return None, token_ids
+
+        # At least one token has to be processed to get logits for the response
+        cache, reused = self._reuse_speculative(token_ids, limit=len(token_ids) - 1)
+        self._speculative = None  # Generation extends the returned cache
+        if cache is None:
+            cache, reused = self._copy(self.cache), n
+        self.reused_tokens = reused
+        return cache, token_ids[reused:]
+
+    def extend(self, prompt_prefix: str) -> int:
+        """Prefill text that is expected to start the next prompt and return the new tokens"""
+        token_ids = self.encode(prompt_prefix)
+        n = len(self.token_ids)
+        if self.cache is None or len(token_ids) <= n or token_ids[:n] != self.token_ids:
+            return 0
+
+        cache, done = self._reuse_speculative(token_ids, limit=len(token_ids))
+        if cache is None:
+            cache, done = self._copy(self.cache), n
+        new_tokens = token_ids[done:]
+        if new_tokens:
+            self._run(new_tokens, cache)
+        self._speculative = (token_ids, cache)
+        return len(new_tokens)
+
+    def _reuse_speculative(self, token_ids: List[int], limit: int) -> Tuple[Optional[List[Any]], int]:
+        """Trim the speculative cache to its common prefix with token_ids"""
+        if self._speculative is None:
+            return None, 0
+        speculative_ids, cache = self._speculative
+        common = 0
+        for a, b in zip(speculative_ids, token_ids[:limit]):
+            if a != b:
+                break
+            common += 1
+        excess = len(speculative_ids) - common
+        if common <= len(self.token_ids) or not all(c.is_trimmable() for c in cache):
+            return None, 0
+        if excess:
+            for c in cache:
+                c.trim(excess)
+        return cache, common
+
+    def _new_cache(self) -> List[Any]:
+        return make_prompt_cache(self.model.language_model)
+
+    def _prefill(self, token_ids: List[int]) -> List[Any]:
+        """Run the prefix through the language model to fill a new cache"""
+        cache = self._new_cache()
+        self._run(token_ids, cache)
+        return cache
+
+    def _run(self, token_ids: List[int], cache: List[Any]):
+        """Feed tokens through the language model, extending the cache"""
+        inputs = mx.array(token_ids)[None]
+        for start in range(0, len(token_ids), PREFILL_STEP_SIZE):
+            self.model.language_model(inputs[:, start:start + PREFILL_STEP_SIZE], cache=cache)
+            mx.eval([c.state for c in cache])
+
+    def _copy(self, cache: List[Any]) -> List[Any]:
+        """Deep copy cache state so a turn cannot modify the shared prefix"""
+        copied = self._new_cache()
+        for src, dst in zip(cache, copied):
+            dst.state = tree_map(lambda x: mx.array(x) if isinstance(x, mx.array) else x, src.state)
+            dst.meta_state = src.meta_state
+        mx.eval([c.state for c in copied])
+        return copied
+
+    def _save(self, key: str, cache: List[Any]):
+        """Write the prefix state to a safetensors file"""
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            arrays = dict(tree_flatten([c.state for c in cache]))
+            metadata = {
+                "key": key,
+                "meta_state": json.dumps([c.meta_state for c in cache]),
+            }
+            mx.save_safetensors(str(self.cache_file), arrays, metadata)
+        except Exception as e:
+            print(f"Failed to save prompt cache: {e}")
+
+    def _load(self, key: str) -> Optional[List[Any]]:
+        """Read the prefix state from disk if it matches the current prefix and model"""
+        try:
+            arrays, metadata = mx.load(str(self.cache_file), return_metadata=True)
+            if metadata.get("key") != key:
+                return None
+            states = tree_unflatten(list(arrays.items()))
+            meta_states = json.loads(metadata["meta_state"])
+            cache = self._new_cache()
+            if len(states) != len(cache):
+                return None
+            for c, state, meta_state in zip(cache, states, meta_states):
+                c.state = state
+                c.meta_state = meta_state
+            return cache
+        except Exception as e:
+            print(f"Failed to load prompt cache: {e}")
+            return None
@@ -8,11 +8,24 @@ import sys
 import os
 import wave
 import tempfile
-import speech_recognition as sr
+from collections import deque
 import soundfile as sf
 import numpy as np
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from .audio_source import AmbientNoiseTracker, AudioSource, MicrophoneSource
+from .voice_quality import QualityAnalyzer, QualityReport
+
+# Longest take and the wait for the speaker to start (seconds)
+MAX_TAKE_SECONDS = 20
+START_TIMEOUT_SECONDS = 30
+# Audio kept from before the speaker starts (seconds)
+PRE_ROLL_SECONDS = 0.5
+# Silence that ends a take (seconds)
+PAUSE_SECONDS = 1.5
+# Pause between takes in the combined sample (seconds)
+TAKE_PAUSE_SECONDS = 0.5
 
 
 # Language-specific prompts for voice recording
@@ -38,6 +51,7 @@ RECORDING_PROMPTS = {
         "quality_check": "녹음 품질 확인 중...",
         "quality_good": "✓ 녹음 품질이 좋습니다.",
         "quality_poor": "✗ 녹음 품질이 낮습니다. 다시 녹음해주세요.",
+        "quality_rejected": "✗ 녹음을 중단했습니다:",
         "no_speech": "음성이 감지되지 않았습니다.",
         "error": "오류가 발생했습니다:"
     },
@@ -62,6 +76,7 @@ RECORDING_PROMPTS = {
         "quality_check": "Checking recording quality...",
         "quality_good": "✓ Recording quality is good.",
         "quality_poor": "✗ Recording quality is poor. Please record again.",
+        "quality_rejected": "✗ Recording stopped:",
         "no_speech": "No speech detected.",
         "error": "An error occurred:"
     },
@@ -86,6 +101,7 @@ RECORDING_PROMPTS = {
         "quality_check": "録音品質を確認中...",
         "quality_good": "✓ 録音品質は良好です。",
         "quality_poor": "✗ 録音品質が低いです。もう一度録音してください。",
+        "quality_rejected": "✗ 録音を中止しました：",
         "no_speech": "音声が検出されませんでした。",
         "error": "エラーが発生しました："
     },
@@ -110,6 +126,7 @@ RECORDING_PROMPTS = {
         "quality_check": "正在检查录音质量...",
         "quality_good": "✓ 录音质量良好。",
         "quality_poor": "✗ 录音质量较差。请重新录音。",
+        "quality_rejected": "✗ 录音已停止：",
         "no_speech": "未检测到语音。",
         "error": "发生错误："
     }
@@ -117,40 +134,71 @@ RECORDING_PROMPTS = {
 
 
 class SpeakerRecorder:
-    def __init__(self, language: str = "ko", sample_rate: int = 22050):
+    def __init__(self, language: str = "ko", sample_rate: int = 22050, source: Optional[AudioSource] = None):
         self.language = language
-        self.sample_rate = sample_rate
+        self.source = source or MicrophoneSource(sample_rate)
+        self.sample_rate = self.source.sample_rate
         self.prompts = RECORDING_PROMPTS.get(language, RECORDING_PROMPTS["en"])
         
-        # Initialize speech recognizer
-        self.recognizer = sr.Recognizer()
-        self.recognizer.energy_threshold = 1500
-        self.recognizer.dynamic_energy_threshold = False
-        self.recognizer.pause_threshold = 1.5
-        self.microphone = sr.Microphone(sample_rate=sample_rate)
-        
-        # Adjust for ambient noise
-        with self.microphone as source:
-            print(f"\n{self.prompts['quality_check']}")
-            self.recognizer.adjust_for_ambient_noise(source, duration=1.0)
+        # Calibrate for ambient noise once; the floor is tracked between takes
+        self.noise = AmbientNoiseTracker(self.sample_rate)
+        print(f"\n{self.prompts['quality_check']}")
+        try:
+            self.noise.calibrate(self.source)
+        finally:
+            self.source.pause()
     
     def check_audio_quality(self, audio_data: np.ndarray) -> bool:
         """Check if audio quality is sufficient for voice cloning"""
-        # Check volume level
-        max_amplitude = np.max(np.abs(audio_data))
-        if max_amplitude < 0.01:  # Too quiet
-            return False
+        analyzer = QualityAnalyzer(self.sample_rate, max_seconds=len(audio_data) / self.sample_rate + 1)
+        analyzer.feed(audio_data)
+        return analyzer.report().ok
+    
+    def _capture(self, source: AudioSource) -> Tuple[Optional[np.ndarray], Optional[QualityReport], Optional[str]]:
+        """Record one take into a preallocated buffer, analyzing it as it arrives
         
-        # Check for clipping
-        if np.sum(np.abs(audio_data) > 0.95) > len(audio_data) * 0.01:  # More than 1% clipping
-            return False
+        Returns the audio, its quality report and the problem that stopped the
+        take early (None if the speaker finished).
+        """
+        chunk = source.block_size
+        rate = source.sample_rate
+        buffer = np.empty(int(MAX_TAKE_SECONDS * rate) + chunk, dtype=np.float32)
+        pre_roll = deque(maxlen=max(1, int(PRE_ROLL_SECONDS * rate / chunk)))
+        analyzer = QualityAnalyzer(rate, max_seconds=len(buffer) / rate)
+        pause_chunks = int(np.ceil(PAUSE_SECONDS * rate / chunk))
         
-        # Check signal-to-noise ratio (simple version)
-        signal_power = np.mean(audio_data ** 2)
-        if signal_power < 0.001:  # Too weak signal
-            return False
-            
-        return True
+        # Wait for speech, following the noise floor meanwhile
+        waited = 0
+        while True:
+            samples = source.read()
+            if samples is None:
+                raise TimeoutError("input ended while waiting for speech")
+            pre_roll.append(samples)
+            waited += len(samples)
+            if self.noise.update(samples):
+                break
+            if waited > START_TIMEOUT_SECONDS * rate:
+                raise TimeoutError("listening timed out while waiting for phrase to start")
+        
+        length = 0
+        problem = None
+        silent_chunks = 0
+        pending = list(pre_roll)
+        while length + chunk <= len(buffer):
+            if pending:
+                samples = pending.pop(0)
+            else:
+                samples = source.read()
+                if samples is None:
+                    break
+                silent_chunks = silent_chunks + 1 if np.sqrt(np.mean(samples ** 2)) <= self.noise.threshold else 0
+            buffer[length:length + len(samples)] = samples
+            length += len(samples)
+            problem = analyzer.feed(samples)
+            if problem or silent_chunks >= pause_chunks:
+                break
+        
+        return buffer[:length], analyzer.report(), problem
     
     def record_single_prompt(self, prompt: str) -> tuple[np.ndarray, bool]:
         """Record a single prompt and return audio data"""
@@ -160,39 +208,38 @@ class SpeakerRecorder:
         
         input(f"\n{self.prompts['ready']} ")
         
-        with self.microphone as source:
-            print(f"{self.prompts['recording']}")
+        print(f"{self.prompts['recording']}")
+        
+        try:
+            # Quality is checked while recording, so a bad take stops early
+            audio_array, report, problem = self._capture(self.source)
             
-            try:
-                # Record with timeout
-                audio = self.recognizer.listen(
-                    source,
-                    timeout=30,
-                    phrase_time_limit=20  # Maximum 20 seconds per recording
-                )
-                
-                # Convert to numpy array
-                wav_data = audio.get_wav_data()
-                audio_array = np.frombuffer(wav_data, dtype=np.int16).astype(np.float32) / 32768.0
-                
-                print(f"{self.prompts['recorded']}")
+            if problem:
+                print(f"{self.prompts['quality_rejected']} {problem}")
+                return audio_array, False
+            
+            print(f"{self.prompts['recorded']}")
+            
+            # Check quality
+            print(f"{self.prompts['quality_check']}")
+            print(f"  SNR {report.snr_db:.0f} dB, speech {report.speech_db:.0f} dBFS, "
+                  f"silence {report.silence_ratio:.0%}, flatness {report.spectral_flatness:.2f}")
+            if report.ok:
+                print(f"{self.prompts['quality_good']}")
+                return audio_array, True
+            else:
+                print(f"{self.prompts['quality_poor']} ({'; '.join(report.problems)})")
+                return audio_array, False
                 
-                # Check quality
-                print(f"{self.prompts['quality_check']}")
-                if self.check_audio_quality(audio_array):
-                    print(f"{self.prompts['quality_good']}")
-                    return audio_array, True
-                else:
-                    print(f"{self.prompts['quality_poor']}")
-                    return audio_array, False
-                    
-            except sr.WaitTimeoutError:
-                print(f"{self.prompts['no_speech']}")
-                return None, False
-            except Exception as e:
-                print(f"{self.prompts['error']} {e}")
-                return None, False
-    
+        except TimeoutError:
+            print(f"{self.prompts['no_speech']}")
+            return None, False
+        except Exception as e:
+            print(f"{self.prompts['error']} {e}")
+            return None, False
+        finally:
+            self.source.pause()
+
     def record_all_prompts(self, output_path: str):
         """Record all prompts and save to a single file"""
         print(f"\n{self.prompts['title']}")
@@ -223,17 +270,15 @@ class SpeakerRecorder:
                         break
         
         if all_audio:
-            # Combine all audio with short pauses
-            pause_samples = int(0.5 * self.sample_rate)  # 0.5 second pause
-            pause = np.zeros(pause_samples)
-            
-            combined_audio = []
-            for i, audio in enumerate(all_audio):
-                combined_audio.extend(audio)
-                if i < len(all_audio) - 1:
-                    combined_audio.extend(pause)
+            # Combine all audio with short pauses in one preallocated buffer
+            pause_samples = int(TAKE_PAUSE_SECONDS * self.sample_rate)
+            total = sum(len(audio) for audio in all_audio) + pause_samples * (len(all_audio) - 1)
+            combined_audio = np.zeros(total, dtype=np.float32)
             
-            combined_audio = np.array(combined_audio)
+            position = 0
+            for audio in all_audio:
+                combined_audio[position:position + len(audio)] = audio
+                position += len(audio) + pause_samples
             
             # Save as WAV file
             sf.write(output_path, combined_audio, self.sample_rate)
@@ -0,0 +1,399 @@
+"""
+Continuous batching of LLM requests from many conversations
+"""
+
+import copy
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .generation import GenerationConfig
+from .llm_backend import LLMBackend
+
+# Marks the end of a request's output queue
+_DONE = object()
+
+
+class GenerationRequest:
+    """One prompt submitted to the scheduler, iterated for its text segments"""
+
+    def __init__(self, prompt: str, config: Optional[GenerationConfig] = None):
+        self.prompt = prompt
+        self.config = config or GenerationConfig()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.submitted = time.perf_counter()
+        self.cancelled = threading.Event()
+        self.finished = False
+        self._output: "queue.Queue" = queue.Queue()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._output.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self):
+        """Stop generating; the scheduler drops the sequence at its next step"""
+        self.cancelled.set()
+
+    def _push(self, text: str):
+        self.completion_tokens += 1
+        if text:
+            self._output.put(text)
+
+    def _finish(self, error: Optional[Exception] = None):
+        if self.finished:
+            return
+        self.finished = True
+        if error is not None:
+            self._output.put(error)
+        self._output.put(_DONE)
+
+
+class BatchEngine:
+    """Decode several sequences together, one token each per step
+
+    Sequences can be inserted and removed between steps.
+    """
+
+    def insert(self, request: GenerationRequest):
+        raise NotImplementedError("The insert method must be implemented by the engine.")
+
+    def remove(self, request: GenerationRequest):
+        raise NotImplementedError("The remove method must be implemented by the engine.")
+
+    def step(self) -> List[Tuple[GenerationRequest, str, bool]]:
+        """Advance every active sequence and return (request, text, finished) per token"""
+        raise NotImplementedError("The step method must be implemented by the engine.")
+
+    def __len__(self) -> int:
+        raise NotImplementedError("The __len__ method must be implemented by the engine.")
+
+
+class MLXBatchEngine(BatchEngine):
+    """Continuous batching with the mlx-vlm BatchGenerator
+
+    Temperature, top-p and the repetition penalty are applied per sequence as
+    logits processors, so requests with different sampling settings share a
+    batch.
+    """
+
+    def __init__(self, backend, max_batch_size: int = 8):
+        import mlx.core as mx
+        from mlx_vlm.generate import BatchGenerator
+
+        self.backend = backend
+        self.generator = BatchGenerator(
+            backend.model,
+            backend.processor,
+            stop_tokens=backend._stop_token_ids(),
+            sampler=lambda logprobs: mx.random.categorical(logprobs),
+            completion_batch_size=max_batch_size,
+            prefill_batch_size=max_batch_size
+        )
+        self.stop_ids = backend._stop_token_ids()
+        self.requests: Dict[int, GenerationRequest] = {}
+        self.detokenizers: Dict[int, object] = {}
+
+    @staticmethod
+    def _sampling_processor(temperature: float, top_p: float):
+        """Logits processor applying one request's temperature and top-p"""
+        import mlx.core as mx
+
+        def process(tokens, logits):
+            if temperature <= 0:
+                return mx.where(logits >= logits.max(axis=-1, keepdims=True), logits, -float("inf"))
+            logits = logits / temperature
+            if top_p < 1.0:
+                probs = mx.softmax(logits, axis=-1)
+                sorted_probs = mx.sort(probs, axis=-1)[..., ::-1]
+                # Smallest probability still inside the nucleus
+                inside = (mx.cumsum(sorted_probs, axis=-1) - sorted_probs) < top_p
+                threshold = mx.min(mx.where(inside, sorted_probs, 1.0), axis=-1, keepdims=True)
+                logits = mx.where(probs >= threshold, logits, -float("inf"))
+            return logits
+
+        return process
+
+    def _logits_processors(self, config: GenerationConfig) -> list:
+        processors = []
+        if config.repeat_penalty and config.repeat_penalty != 1.0:
+            from mlx_vlm.sample_utils import make_repetition_penalty
+            processors.append(make_repetition_penalty(config.repeat_penalty))
+        processors.append(self._sampling_processor(config.temperature, config.top_p))
+        return processors
+
+    def insert(self, request: GenerationRequest):
+        token_ids = list(self.backend.tokenizer.encode(request.prompt, add_special_tokens=False))
+        request.prompt_tokens = len(token_ids)
+        (uid,) = self.generator.insert(
+            [token_ids],
+            max_tokens=[request.config.max_tokens],
+            logits_processors=[self._logits_processors(request.config)]
+        )
+        detokenizer = copy.copy(self.backend.processor.detokenizer)
+        detokenizer.reset()
+        self.requests[uid] = request
+        self.detokenizers[uid] = detokenizer
+
+    def remove(self, request: GenerationRequest):
+        for uid, active in list(self.requests.items()):
+            if active is request:
+                self.generator.remove(uid)
+                self._drop(uid)
+
+    def _drop(self, uid: int):
+        self.requests.pop(uid, None)
+        self.detokenizers.pop(uid, None)
+
+    def step(self) -> List[Tuple[GenerationRequest, str, bool]]:
+        results = self.generator.next()
+        if isinstance(results, tuple):
+            _, results = results
+
+        outputs = []
+        for response in results:
+            request = self.requests.get(response.uid)
+            if request is None:
+                continue
+            detokenizer = self.detokenizers[response.uid]
+            finished = response.finish_reason is not None
+            if response.token not in self.stop_ids:
+                detokenizer.add_token(response.token)
+            if finished:
+                detokenizer.finalize()
+                self._drop(response.uid)
+            outputs.append((request, detokenizer.last_segment, finished))
+        return outputs
+
+    def __len__(self) -> int:
+        return len(self.requests)
+
+
+class FakeBatchEngine(BatchEngine):
+    """Batched version of the stub engine
+
+    Each step emits one word for every active sequence. A step costs a little
+    more as the batch grows, like a memory-bound decode on real hardware.
+    """
+
+    def __init__(self, backend, max_batch_size: int = 8, batch_overhead: float = 0.05):
+        self.backend = backend
+        self.batch_overhead = batch_overhead
+        self.words: Dict[GenerationRequest, List[str]] = {}
+        self.positions: Dict[GenerationRequest, int] = {}
+        self.prefill: List[GenerationRequest] = []
+
+    def insert(self, request: GenerationRequest):
+        request.prompt_tokens = self.backend.count_tokens(request.prompt)
+        self.words[request] = self.backend.response_for(request.prompt).split()[:request.config.max_tokens]
+        self.positions[request] = 0
+        self.prefill.append(request)
+
+    def remove(self, request: GenerationRequest):
+        self.words.pop(request, None)
+        self.positions.pop(request, None)
+        if request in self.prefill:
+            self.prefill.remove(request)
+
+    def step(self) -> List[Tuple[GenerationRequest, str, bool]]:
+        if self.prefill:
+            # Newly inserted prompts are prefilled together
+            time.sleep(self.backend.time_to_first_token)
+            self.prefill = []
+        elif self.backend.tokens_per_second > 0:
+            time.sleep((1.0 + self.batch_overhead * (len(self.words) - 1)) / self.backend.tokens_per_second)
+
+        outputs = []
+        for request, words in list(self.words.items()):
+            position = self.positions[request]
+            finished = position + 1 >= len(words)
+            text = "" if not words else (words[position] if position == 0 else " " + words[position])
+            self.positions[request] = position + 1
+            if finished:
+                self.remove(request)
+            outputs.append((request, text, finished))
+        return outputs
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+class GenerationScheduler:
+    """Merge generation requests from many conversations into shared decode batches
+
+    A single thread owns the model. Between decode steps it admits waiting
+    requests up to max_batch_size and drops finished or cancelled ones, and
+    each token is streamed back to the request it belongs to. Backends without
+    batch support run the requests one after another instead.
+    """
+
+    def __init__(self, backend: LLMBackend, max_batch_size: int = 8):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.engine = backend.batch_engine(max_batch_size)
+        if self.engine is None:
+            print(f"The {backend.name} backend does not support batching, requests run one at a time")
+
+        self.pending: List[GenerationRequest] = []
+        self.active: List[GenerationRequest] = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # Counters for stats()
+        self.steps = 0
+        self.generated_tokens = 0
+        self.batched_sequences = 0
+
+        self._thread = threading.Thread(target=self._run, name="agentvox-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, config: Optional[GenerationConfig] = None) -> GenerationRequest:
+        """Queue a formatted prompt and return the request to iterate its output"""
+        request = GenerationRequest(prompt, config)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The generation scheduler is closed")
+            self.pending.append(request)
+            self._condition.notify()
+        return request
+
+    def client(self) -> "ScheduledBackend":
+        """LLM backend for one conversation that submits its requests here"""
+        return ScheduledBackend(self)
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                "active": len(self.active),
+                "pending": len(self.pending),
+                "steps": self.steps,
+                "generated_tokens": self.generated_tokens,
+                "mean_batch_size": self.batched_sequences / self.steps if self.steps else 0.0,
+            }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        for request in self.pending + self.active:
+            request._finish()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self.pending and not self.active:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                waiting = [request for request in self.pending if not request.cancelled.is_set()]
+                for request in self.pending:
+                    if request.cancelled.is_set():
+                        request._finish()
+                self.pending = []
+
+            if self.engine is None:
+                with self._condition:
+                    self.pending = waiting[1:] + self.pending
+                if waiting:
+                    self._run_unbatched(waiting[0])
+                continue
+
+            try:
+                self._step_batch(waiting)
+            except Exception as e:
+                print(f"Batched generation error: {e}")
+                for request in self.active:
+                    self.engine.remove(request)
+                    request._finish(e)
+                self.active = []
+
+    def _step_batch(self, waiting: List[GenerationRequest]):
+        # Admit new sequences while there is room in the batch
+        room = self.max_batch_size - len(self.active)
+        for request in waiting[:room]:
+            self.engine.insert(request)
+            self.active.append(request)
+        if waiting[room:]:
+            with self._condition:
+                self.pending = waiting[room:] + self.pending
+
+        for request in [r for r in self.active if r.cancelled.is_set()]:
+            self.engine.remove(request)
+            self.active.remove(request)
+            request._finish()
+
+        if not self.active:
+            return
+
+        outputs = self.engine.step()
+        with self._condition:
+            self.steps += 1
+            self.batched_sequences += len(outputs)
+            self.generated_tokens += len(outputs)
+
+        for request, text, finished in outputs:
+            request._push(text)
+            if finished:
+                self.active.remove(request)
+                request._finish()
+
+    def _run_unbatched(self, request: GenerationRequest):
+        self.active = [request]
+        try:
+            for segment in self.backend.stream(request.prompt, request.config):
+                if request.cancelled.is_set():
+                    self.backend.cancel()
+                    break
+                request._push(segment)
+            request.prompt_tokens = self.backend.last_prompt_tokens
+            request.completion_tokens = self.backend.last_completion_tokens
+            request._finish()
+        except Exception as e:
+            request._finish(e)
+        finally:
+            self.active = []
+            with self._condition:
+                self.steps += 1
+                self.batched_sequences += 1
+                self.generated_tokens += request.completion_tokens
+
+
+class ScheduledBackend(LLMBackend):
+    """LLM backend of one conversation, generating through a shared scheduler
+
+    Prompt formatting and token counting use the shared model; cancellation
+    and token counts are per conversation.
+    """
+
+    def __init__(self, scheduler: GenerationScheduler):
+        super().__init__()
+        self.scheduler = scheduler
+        self.backend = scheduler.backend
+        self.name = self.backend.name
+
+    def format_prompt(self, content: str) -> str:
+        return self.backend.format_prompt(content)
+
+    def count_tokens(self, text: str) -> int:
+        return self.backend.count_tokens(text)
+
+    def _stream(self, prompt: str, config: GenerationConfig) -> Iterator[str]:
+        request = self.scheduler.submit(prompt, config)
+        try:
+            for segment in request:
+                if self.cancel_event.is_set():
+                    return
+                self.last_prompt_tokens = request.prompt_tokens
+                self.last_completion_tokens = request.completion_tokens
+                yield segment
+        finally:
+            request.cancel()
+            self.last_prompt_tokens = request.prompt_tokens
+            self.last_completion_tokens = request.completion_tokens
@@ -0,0 +1,85 @@
+"""
+Incremental sentence splitting for streaming LLM output into TTS
+"""
+
+import re
+from typing import Iterable, Iterator, List, Optional
+
+# Terminal punctuation (Korean/English/CJK) optionally followed by closing quotes
+# or brackets. A boundary is only confirmed once the next character is known, so
+# "3.14" or "e.g." are not cut while tokens are still arriving.
+_BOUNDARY = re.compile(
+    r'[.!?…。！？]+["\'”’)\]]*(?=\s|[가-힣])'
+    r'|\n'
+)
+
+# English abbreviations that end with a period but do not end a sentence
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc",
+    "e.g", "i.e", "no", "fig", "approx", "inc", "ltd", "co",
+}
+
+
+def _is_abbreviation(text: str) -> bool:
+    """Check whether text ends with an abbreviation or a single initial"""
+    if not text.endswith("."):
+        return False
+    words = text[:-1].split()
+    if not words:
+        return False
+    word = words[-1].lower()
+    # Initials and dotted acronyms such as "J." or "U.S."
+    if "." in word or (len(word) == 1 and word.isalpha()):
+        return True
+    return word in _ABBREVIATIONS
+
+
+class SentenceSplitter:
+    """Split a stream of text fragments into complete sentences"""
+
+    def __init__(self, min_length: int = 6):
+        # Sentences shorter than this are merged into the following one
+        self.min_length = min_length
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add a fragment and return the sentences completed by it"""
+        self.buffer += text
+        sentences = []
+        start = 0
+
+        for match in _BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if not candidate:
+                start = match.end()
+                continue
+            if match.group() != "\n" and _is_abbreviation(candidate):
+                continue
+            if len(candidate) < self.min_length:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left once the stream has ended"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return remainder or None
+
+
+def iter_sentences(fragments: Iterable[str], min_length: int = 6) -> Iterator[str]:
+    """Yield sentences from an iterable of text fragments"""
+    splitter = SentenceSplitter(min_length=min_length)
+    for fragment in fragments:
+        yield from splitter.feed(fragment)
+    remainder = splitter.flush()
+    if remainder:
+        yield remainder
+
+
+def split_sentences(text: str, min_length: int = 6) -> List[str]:
+    """Split a complete text into sentences"""
+    return list(iter_sentences([text], min_length=min_length))
@@ -0,0 +1,354 @@
+"""
+Headless WebSocket server running the voice pipeline for many concurrent sessions
+
+Protocol (one WebSocket per session):
+- Client -> server binary: int16 mono PCM at the session sample rate (default 16 kHz)
+- Client -> server text (JSON):
+    {"type": "config", "sample_rate": 48000}   set the input sample rate
+    {"type": "config", "generation": {...}}   set GenerationConfig overrides for the session
+    {"type": "end"}                           end the current utterance now (push-to-talk)
+    {"type": "text", "text": "...", "generation": {...}}
+                                              send a user turn without audio (overrides optional)
+    {"type": "cancel"}                        stop the current response
+    {"type": "reset"}                         clear the conversation history
+- Server -> client text (JSON): ready, speech_start, transcript, response, turn_end, error
+- Server -> client binary: int16 mono PCM at the sample rate announced in "ready",
+  in 20 ms frames; turn_end carries the time to the first frame and underruns
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from .audio_sink import NetworkSink, NullSink
+from .scheduler import GenerationScheduler
+from .vad import SAMPLE_RATE, StreamingEndpointer, pcm16_to_float, resample
+from .voice_assistant import AudioLLMModule, ModelConfig, TTSModule
+
+
+class SharedModels:
+    """Models loaded once per process and shared by every session
+
+    Whisper runs on a small pool of workers. Generation requests of all
+    sessions go through a GenerationScheduler that decodes them in shared
+    batches. TTS has a single worker thread, so sentences from different
+    sessions are synthesized in turn.
+    """
+
+    def __init__(self, config: ModelConfig, stt_workers: int = 2, max_sessions: int = 32):
+        from faster_whisper import WhisperModel
+
+        self.config = config
+        start = time.time()
+
+        # faster-whisper runs on CPU or CUDA only
+        device = "cuda" if config.device == "cuda" else "cpu"
+        self.whisper = WhisperModel(config.stt_model, device=device, num_workers=stt_workers)
+
+        # LLM backend and system prompt cache, reused through a module without a recorder
+        self._llm_module = AudioLLMModule(config, load=False)
+        self._llm_module.load_llm()
+        self.llm = self._llm_module.llm
+        self.scheduler = GenerationScheduler(self.llm, max_batch_size=config.llm_max_batch_size)
+
+        # Audio is streamed to each session, never played on the server
+        self.tts = TTSModule(config, sink=NullSink())
+
+        self.stt_pool = ThreadPoolExecutor(max_workers=stt_workers, thread_name_prefix="agentvox-stt")
+        # Session threads only wait for tokens from the scheduler
+        self.llm_pool = ThreadPoolExecutor(max_workers=max_sessions, thread_name_prefix="agentvox-llm")
+        self.tts_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agentvox-tts")
+
+        print(f"Models ready ({time.time() - start:.1f}s)")
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        segments, _ = self.whisper.transcribe(
+            audio,
+            language=self.config.stt_language,
+            beam_size=self.config.stt_beam_size
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def new_conversation(self) -> AudioLLMModule:
+        """Per-session prompt building and history on top of the shared LLM"""
+        conversation = AudioLLMModule(self.config, load=False)
+        conversation.llm = self.scheduler.client()
+        conversation.memory.llm = conversation.llm
+        return conversation
+
+
+class VoiceSession:
+    """One client connection with its own VAD state and conversation history"""
+
+    def __init__(self, session_id: int, websocket, models: SharedModels, silence_ms: int):
+        self.id = session_id
+        self.websocket = websocket
+        self.models = models
+        self.loop = asyncio.get_running_loop()
+        self.sample_rate = SAMPLE_RATE
+        self.endpointer = StreamingEndpointer(silence_ms=silence_ms)
+        self.conversation = models.new_conversation()
+        self.generation = {}  # GenerationConfig overrides of this session
+
+        # Messages to the client, sent in order by a single writer task
+        self.outbox: "asyncio.Queue" = asyncio.Queue()
+        self.turn: Optional[asyncio.Task] = None
+        self.cancel_event = threading.Event()
+        self._synthesizing = False  # This session owns the shared TTS right now
+
+    async def run(self):
+        writer = asyncio.create_task(self._writer())
+        self.send({
+            "type": "ready",
+            "session": self.id,
+            "sample_rate": self.models.tts.sample_rate,
+            "format": "pcm_s16le",
+        })
+        try:
+            async for message in self.websocket:
+                if isinstance(message, bytes):
+                    self._on_audio(message)
+                else:
+                    self._on_control(json.loads(message))
+        finally:
+            self.cancel()
+            writer.cancel()
+
+    def send(self, message):
+        """Queue a JSON message (dict) or audio (bytes) for the client"""
+        self.outbox.put_nowait(message)
+
+    def send_threadsafe(self, message):
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, message)
+
+    async def _writer(self):
+        while True:
+            message = await self.outbox.get()
+            if isinstance(message, dict):
+                message = json.dumps(message, ensure_ascii=False)
+            await self.websocket.send(message)
+
+    def _on_audio(self, data: bytes):
+        audio = resample(pcm16_to_float(data), self.sample_rate)
+        for event, utterance in self.endpointer.feed(audio):
+            if event == "start":
+                # The user talks over the response: stop it (barge-in)
+                self.cancel()
+                self.send({"type": "speech_start"})
+            elif utterance is not None and len(utterance):
+                self._start_turn(self._transcribe_and_respond(utterance))
+
+    def _on_control(self, message: dict):
+        kind = message.get("type")
+        if kind == "config":
+            self.sample_rate = int(message.get("sample_rate", self.sample_rate))
+            if "generation" in message:
+                try:
+                    generation = dict(self.generation, **message["generation"])
+                    self.conversation.generation_config(generation)
+                except (TypeError, ValueError) as e:
+                    self.send({"type": "error", "message": str(e)})
+                    return
+                self.generation = generation
+        elif kind == "end":
+            utterance = self.endpointer.flush()
+            if utterance is not None and len(utterance):
+                self._start_turn(self._transcribe_and_respond(utterance))
+        elif kind == "text":
+            self._start_turn(self._respond(message.get("text", ""), message.get("generation")))
+        elif kind == "cancel":
+            self.cancel()
+        elif kind == "reset":
+            self.cancel()
+            self.conversation.reset_conversation()
+        else:
+            self.send({"type": "error", "message": f"Unknown message type: {kind}"})
+
+    def _start_turn(self, coroutine):
+        self.cancel()
+        self.cancel_event = threading.Event()
+        self.turn = asyncio.create_task(coroutine)
+
+    def cancel(self):
+        """Stop the response of the current turn"""
+        self.cancel_event.set()
+        if self._synthesizing:
+            self.models.tts.stop()
+        if self.turn is not None and not self.turn.done():
+            self.turn.cancel()
+
+    async def _transcribe_and_respond(self, utterance: np.ndarray):
+        text = await self.loop.run_in_executor(self.models.stt_pool, self.models.transcribe, utterance)
+        if not text:
+            return
+        self.send({"type": "transcript", "text": text})
+        await self._respond(text)
+
+    async def _respond(self, text: str, generation: Optional[dict] = None):
+        if not text.strip():
+            return
+        try:
+            overrides = dict(self.generation, **(generation or {}))
+            self.conversation.generation_config(overrides)
+        except (TypeError, ValueError) as e:
+            self.send({"type": "error", "message": str(e)})
+            return
+        cancel_event = self.cancel_event
+        sentences: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        def generate():
+            try:
+                for sentence in self.conversation.stream_response(text, cancel_event=cancel_event, overrides=overrides):
+                    self.loop.call_soon_threadsafe(sentences.put_nowait, sentence)
+            finally:
+                self.loop.call_soon_threadsafe(sentences.put_nowait, None)
+
+        def send_frame(frame: bytes):
+            if not cancel_event.is_set():
+                self.send_threadsafe(frame)
+
+        # Frames are sent as they are synthesized; delivery is measured as the client hears it
+        sink = NetworkSink(send_frame)
+        sink.open(self.models.tts.sample_rate)
+
+        def synthesize(sentence: str):
+            if cancel_event.is_set():
+                return
+            self._synthesizing = True
+            try:
+                self.models.tts.synthesize(sentence, sink.write)
+            finally:
+                self._synthesizing = False
+
+        error = None
+        generation = self.loop.run_in_executor(self.models.llm_pool, generate)
+        try:
+            # Synthesis of each sentence starts while the next one is generated
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    break
+                self.send({"type": "response", "text": sentence})
+                await self.loop.run_in_executor(self.models.tts_pool, synthesize, sentence)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+        except Exception as e:
+            # Synthesis failed: stop generating the rest of the response
+            cancel_event.set()
+            error = e
+        finally:
+            try:
+                await asyncio.shield(generation)
+            except Exception as e:
+                error = error or e
+            if error is not None:
+                print(f"Session {self.id} response error: {error}")
+
+        if error is not None:
+            self.send({"type": "error", "message": f"Response failed: {error}"})
+            return
+        if not cancel_event.is_set():
+            sink.end()
+            self.send({"type": "turn_end", "text": self.conversation.last_response, "audio": sink.stats()})
+
+
+class VoiceServer:
+    """Accept WebSocket clients and run a VoiceSession for each"""
+
+    def __init__(self, models: SharedModels, silence_ms: int = 600, max_sessions: int = 32):
+        self.models = models
+        self.silence_ms = silence_ms
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self._ids = itertools.count(1)
+
+    async def handle(self, websocket, path=None):
+        if len(self.sessions) >= self.max_sessions:
+            await websocket.close(code=1013, reason="Server is at capacity")
+            return
+
+        session = VoiceSession(next(self._ids), websocket, self.models, self.silence_ms)
+        self.sessions[session.id] = session
+        print(f"Session {session.id} connected ({len(self.sessions)} active)")
+        try:
+            await session.run()
+        except Exception as e:
+            print(f"Session {session.id} error: {e}")
+        finally:
+            del self.sessions[session.id]
+            print(f"Session {session.id} closed ({len(self.sessions)} active)")
+
+    async def serve(self, host: str, port: int):
+        import websockets
+
+        async with websockets.serve(self.handle, host, port, max_size=2 ** 22):
+            print(f"AgentVox server listening on ws://{host}:{port}")
+            await asyncio.Future()
+
+
+def main(argv=None):
+    """Entry point for `agentvox serve`"""
+    parser = argparse.ArgumentParser(prog="agentvox serve", description="AgentVox WebSocket voice server")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                       help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765,
+                       help="Port to listen on (default: 8765)")
+    parser.add_argument("--max-sessions", type=int, default=32,
+                       help="Maximum concurrent sessions (default: 32)")
+    parser.add_argument("--max-batch-size", type=int, default=8,
+                       help="Responses decoded together in one LLM batch (default: 8)")
+    parser.add_argument("--stt-workers", type=int, default=2,
+                       help="Concurrent Whisper transcriptions (default: 2)")
+    parser.add_argument("--silence-ms", type=int, default=600,
+                       help="Trailing silence that ends an utterance (default: 600)")
+    parser.add_argument("--model", type=str, default=None,
+                       help="MLX model identifier or path to a GGUF file")
+    parser.add_argument("--llm-backend", type=str, default="auto",
+                       choices=["auto", "mlx", "llama_cpp", "fake"],
+                       help="LLM backend (default: auto)")
+    parser.add_argument("--llm-max-tokens", type=int, default=512,
+                       help="Maximum tokens per response (default: 512)")
+    parser.add_argument("--stt-model", type=str, default="base",
+                       help="Whisper model size for STT (default: base)")
+    parser.add_argument("--stt-language", type=str, default="ko",
+                       help="Conversation language (default: ko)")
+    parser.add_argument("--tts-engine", type=str, default="coqui", choices=["coqui", "xtts"],
+                       help="TTS engine (default: coqui)")
+    parser.add_argument("--speaker-wav", type=str, default=None,
+                       help="Speaker voice sample (WAV) or JSON latents for voice cloning")
+    parser.add_argument("--device", type=str, default=None,
+                       choices=["cpu", "cuda", "mps", "auto"],
+                       help="Device to use for inference (default: auto-detect)")
+
+    args = parser.parse_args(argv)
+
+    config = ModelConfig(
+        stt_model=args.stt_model,
+        llm_model=args.model,
+        device=args.device or "auto",
+        stt_language=args.stt_language,
+        tts_engine=args.tts_engine,
+        speaker_wav=args.speaker_wav,
+        llm_max_tokens=args.llm_max_tokens,
+        llm_backend=args.llm_backend,
+        llm_max_batch_size=args.max_batch_size
+    )
+
+    models = SharedModels(config, stt_workers=args.stt_workers, max_sessions=args.max_sessions)
+    server = VoiceServer(models, silence_ms=args.silence_ms, max_sessions=args.max_sessions)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Binary store for XTTS speaker conditioning latents
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# Default XTTS checkpoint version (same default as RealtimeTTS CoquiEngine)
+XTTS_VERSION = "v2.0.2"
+
+# XTTS v2 latent dimensions
+GPT_LATENT_DIM = 1024
+SPEAKER_EMBEDDING_DIM = 512
+
+DEFAULT_STORE_DIR = Path(__file__).parent.parent / "models" / "tts" / "speakers"
+
+
+@dataclass
+class SpeakerLatents:
+    """XTTS conditioning for one voice, stored as float16"""
+    gpt_cond_latent: np.ndarray  # (frames, 1024)
+    speaker_embedding: np.ndarray  # (512,)
+
+    def to_torch(self, device=None):
+        """Return tensors shaped as Xtts.inference_stream expects them"""
+        import torch
+
+        gpt_cond_latent = torch.from_numpy(np.asarray(self.gpt_cond_latent, dtype=np.float32))
+        speaker_embedding = torch.from_numpy(np.asarray(self.speaker_embedding, dtype=np.float32))
+        gpt_cond_latent = gpt_cond_latent.reshape(-1, GPT_LATENT_DIM).unsqueeze(0)
+        speaker_embedding = speaker_embedding.reshape(1, SPEAKER_EMBEDDING_DIM, 1)
+        if device is not None:
+            gpt_cond_latent = gpt_cond_latent.to(device)
+            speaker_embedding = speaker_embedding.to(device)
+        return gpt_cond_latent, speaker_embedding
+
+    @classmethod
+    def from_torch(cls, gpt_cond_latent, speaker_embedding) -> "SpeakerLatents":
+        """Convert the output of Xtts.get_conditioning_latents"""
+        return cls(
+            gpt_cond_latent.detach().cpu().reshape(-1, GPT_LATENT_DIM).half().numpy(),
+            speaker_embedding.detach().cpu().reshape(-1).half().numpy()
+        )
+
+    @classmethod
+    def from_json(cls, path: str) -> "SpeakerLatents":
+        """Read latents from the JSON format written by RealtimeTTS CoquiEngine"""
+        with open(path, "r", encoding="utf-8") as f:
+            latents = json.load(f)
+        return cls(
+            np.asarray(latents["gpt_cond_latent"], dtype=np.float16).reshape(-1, GPT_LATENT_DIM),
+            np.asarray(latents["speaker_embedding"], dtype=np.float16).reshape(-1)
+        )
+
+    def to_json(self, path: str):
+        """Write latents in the JSON format read by RealtimeTTS CoquiEngine"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "gpt_cond_latent": np.asarray(self.gpt_cond_latent, dtype=np.float16).tolist(),
+                "speaker_embedding": np.asarray(self.speaker_embedding, dtype=np.float16).tolist(),
+            }, f)
+
+
+class SpeakerLatentStore:
+    """Speaker latents on disk as float16 .npy files, loaded with mmap
+
+    Entries are keyed by a hash of the voice source file and the model version,
+    so a changed recording or model never reuses stale latents.
+    """
+
+    def __init__(self, root: Optional[str] = None, model_version: str = XTTS_VERSION):
+        self.root = Path(root) if root else DEFAULT_STORE_DIR
+        self.model_version = model_version
+
+    @staticmethod
+    def source_file(voice: str) -> Path:
+        """File that identifies a voice: the WAV recording if present, otherwise the JSON latents"""
+        path = Path(voice)
+        if path.suffix.lower() == ".json":
+            wav = path.with_suffix(".wav")
+            if wav.exists():
+                return wav
+        return path
+
+    def key(self, voice: str) -> str:
+        """Hash of the voice source contents and the model version"""
+        digest = hashlib.sha256(self.model_version.encode("utf-8"))
+        with open(self.source_file(voice), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()[:32]
+
+    def entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def load(self, key: str) -> Optional[SpeakerLatents]:
+        """Memory-map stored latents, or return None if there is no entry"""
+        entry = self.entry_dir(key)
+        gpt_path = entry / "gpt_cond_latent.npy"
+        speaker_path = entry / "speaker_embedding.npy"
+        if not gpt_path.exists() or not speaker_path.exists():
+            return None
+        try:
+            return SpeakerLatents(
+                np.load(gpt_path, mmap_mode="r"),
+                np.load(speaker_path, mmap_mode="r")
+            )
+        except (OSError, ValueError) as e:
+            print(f"Failed to load speaker latents: {e}")
+            return None
+
+    def save(self, key: str, latents: SpeakerLatents, source: Optional[str] = None) -> Path:
+        """Write latents atomically so a crash never leaves a half-written entry"""
+        entry = self.entry_dir(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.root, prefix=f".{key}-"))
+        tmp.chmod(0o755)
+        np.save(tmp / "gpt_cond_latent.npy", np.asarray(latents.gpt_cond_latent, dtype=np.float16))
+        np.save(tmp / "speaker_embedding.npy", np.asarray(latents.speaker_embedding, dtype=np.float16))
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "source": str(source) if source else None,
+                "model_version": self.model_version,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }, f, ensure_ascii=False)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # Another process stored the same entry first
+            for file in tmp.iterdir():
+                file.unlink()
+            tmp.rmdir()
+        return entry
+
+    def get(
+        self,
+        voice: str,
+        compute: Optional[Callable[[str], SpeakerLatents]] = None
+    ) -> Tuple[SpeakerLatents, str]:
+        """Return latents for a voice and where they came from
+
+        The store is checked first. Otherwise JSON latents (given directly or
+        next to the WAV) are converted, and only then are latents computed from
+        the recording with the compute callback.
+        """
+        key = self.key(voice)
+        latents = self.load(key)
+        if latents is not None:
+            return latents, "cache"
+
+        path = Path(voice)
+        json_path = path if path.suffix.lower() == ".json" else path.with_suffix(".json")
+        if json_path.exists():
+            latents = SpeakerLatents.from_json(str(json_path))
+            origin = "json"
+        elif compute is not None and path.suffix.lower() != ".json":
+            latents = compute(str(path))
+            origin = "computed"
+        else:
+            raise FileNotFoundError(f"No speaker latents found for {voice}")
+
+        self.save(key, latents, source=voice)
+        return self.load(key) or latents, origin
+
+    def convert(self, json_path: str) -> Path:
+        """Store JSON latents in binary form and return the entry directory"""
+        latents = SpeakerLatents.from_json(json_path)
+        return self.save(self.key(json_path), latents, source=json_path)
+
+
+def main(argv=None):
+    """Entry point for `agentvox voice`"""
+    parser = argparse.ArgumentParser(prog="agentvox voice", description="Build voices and manage cached speaker latents")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert CoquiEngine JSON latents to the binary store")
+    convert.add_argument("json_files", nargs="+", help="JSON latent files (e.g. speaker_ko.json)")
+    convert.add_argument("--store", type=str, default=None,
+                         help=f"Speaker latent store directory (default: {DEFAULT_STORE_DIR})")
+    convert.add_argument("--model-version", type=str, default=XTTS_VERSION,
+                         help=f"XTTS checkpoint version the latents belong to (default: {XTTS_VERSION})")
+
+    build = subparsers.add_parser("build", help="Build a speaker WAV and latents from existing recordings")
+    build.add_argument("inputs", nargs="+", help="Directories or files of WAV/MP3 recordings")
+    build.add_argument("--output", "-o", type=str, required=True,
+                       help="Speaker WAV to write; latents go to the same name with .json and to the store")
+    build.add_argument("--target-seconds", type=float, default=30.0,
+                       help="Total speech to keep (default: 30)")
+    build.add_argument("--workers", type=int, default=4,
+                       help="Recordings analyzed in parallel (default: 4)")
+    build.add_argument("--loudness", type=float, default=-20.0,
+                       help="Target speech level in dBFS (default: -20)")
+    build.add_argument("--no-latents", action="store_true",
+                       help="Only write the speaker WAV (no XTTS model needed)")
+    build.add_argument("--device", type=str, default=None, choices=["cpu", "cuda", "mps"],
+                       help="Device for computing the latents (default: auto)")
+    build.add_argument("--store", type=str, default=None,
+                       help=f"Speaker latent store directory (default: {DEFAULT_STORE_DIR})")
+    build.add_argument("--model-version", type=str, default=XTTS_VERSION,
+                       help=f"XTTS checkpoint version (default: {XTTS_VERSION})")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from .voice_builder import build_voice
+        output = build_voice(
+            args.inputs,
+            args.output,
+            target_seconds=args.target_seconds,
+            workers=args.workers,
+            target_db=args.loudness,
+            latents=not args.no_latents,
+            store_dir=args.store,
+            model_version=args.model_version,
+            device=args.device
+        )
+        if output is not None:
+            print(f"Usage: agentvox --tts-engine xtts --speaker-wav {output}")
+        return
+
+    if args.command == "convert":
+        store = SpeakerLatentStore(args.store, model_version=args.model_version)
+        for json_file in args.json_files:
+            start = time.time()
+            entry = store.convert(json_file)
+            json_size = os.path.getsize(json_file)
+            binary_size = sum(f.stat().st_size for f in entry.glob("*.npy"))
+            print(f"{json_file} -> {entry} "
+                  f"({json_size / 1024:.0f} KB -> {binary_size / 1024:.0f} KB, {time.time() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Draft models for speculative decoding with the llama.cpp backend
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+
+class TrackedDraft(LlamaDraftModel):
+    """Draft model that counts how many proposed tokens the main model accepts
+
+    llama.cpp evaluates the draft tokens in one batch with the main model and
+    keeps the prefix it agrees with. The next call shows which tokens were
+    kept, so acceptance is measured without touching the decoding loop.
+    """
+
+    def __init__(self, num_draft_tokens: int = 4):
+        self.num_draft_tokens = num_draft_tokens
+        self.proposed_tokens = 0
+        self.accepted_tokens = 0
+        self._context_length = 0
+        self._last_draft: Optional[np.ndarray] = None
+
+    def start_request(self):
+        """Reset the counters for a new generation request"""
+        self.proposed_tokens = 0
+        self.accepted_tokens = 0
+        self._last_draft = None
+
+    @property
+    def acceptance_rate(self) -> Optional[float]:
+        if not self.proposed_tokens:
+            return None
+        return self.accepted_tokens / self.proposed_tokens
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs) -> np.ndarray:
+        if self._last_draft is not None and len(self._last_draft):
+            kept = input_ids[self._context_length:self._context_length + len(self._last_draft)]
+            mismatch = np.flatnonzero(kept != self._last_draft[:len(kept)])
+            self.accepted_tokens += int(mismatch[0]) if len(mismatch) else len(kept)
+
+        draft = np.asarray(self.propose(input_ids), dtype=np.intc)[:self.num_draft_tokens]
+        self.proposed_tokens += len(draft)
+        self._context_length = len(input_ids)
+        self._last_draft = draft
+        return draft
+
+    def propose(self, input_ids: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("The propose method must be implemented by the draft model.")
+
+
+class SmallModelDraft(TrackedDraft):
+    """Greedy proposals from a small GGUF model sharing the main model's tokenizer
+
+    The draft model keeps its own KV cache and only evaluates the tokens added
+    since its previous call.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        num_draft_tokens: int = 4,
+        n_ctx: int = 4096,
+        n_threads: Optional[int] = None,
+        n_gpu_layers: int = 0
+    ):
+        super().__init__(num_draft_tokens)
+        from llama_cpp import Llama
+
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"Draft model file not found: {model_path}")
+
+        print(f"Loading draft model: {model_path}")
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            n_gpu_layers=n_gpu_layers,
+            verbose=False
+        )
+        self.eos_token = self.llm.token_eos()
+
+    def propose(self, input_ids: np.ndarray) -> np.ndarray:
+        draft = []
+        for token in self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, repeat_penalty=1.0):
+            if token == self.eos_token:
+                break
+            draft.append(token)
+            if len(draft) >= self.num_draft_tokens:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+class PromptLookupDraft(TrackedDraft):
+    """Proposals copied from earlier text that follows the current n-gram (no extra model)"""
+
+    def __init__(self, num_draft_tokens: int = 4, max_ngram_size: int = 2):
+        super().__init__(num_draft_tokens)
+        self.lookup = LlamaPromptLookupDecoding(max_ngram_size=max_ngram_size, num_pred_tokens=num_draft_tokens)
+
+    def propose(self, input_ids: np.ndarray) -> np.ndarray:
+        return self.lookup(input_ids)
+
+
+def create_draft(
+    draft_model: str,
+    num_draft_tokens: int = 4,
+    n_ctx: int = 4096,
+    n_threads: Optional[int] = None,
+    n_gpu_layers: int = 0
+) -> TrackedDraft:
+    """Draft for a GGUF path, or prompt lookup for "lookup" """
+    if draft_model == "lookup":
+        return PromptLookupDraft(num_draft_tokens)
+    return SmallModelDraft(
+        draft_model,
+        num_draft_tokens=num_draft_tokens,
+        n_ctx=n_ctx,
+        n_threads=n_threads,
+        n_gpu_layers=n_gpu_layers
+    )
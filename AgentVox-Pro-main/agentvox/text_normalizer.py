@@ -0,0 +1,267 @@
+"""
+Text normalization for TTS: markdown, emoji, numbers, units and English in Korean readings
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+# Hangul readings of the Latin alphabet, for acronyms spelled letter by letter
+LETTER_READINGS = {
+    "A": "에이", "B": "비", "C": "씨", "D": "디", "E": "이", "F": "에프", "G": "지",
+    "H": "에이치", "I": "아이", "J": "제이", "K": "케이", "L": "엘", "M": "엠", "N": "엔",
+    "O": "오", "P": "피", "Q": "큐", "R": "알", "S": "에스", "T": "티", "U": "유",
+    "V": "브이", "W": "더블유", "X": "엑스", "Y": "와이", "Z": "제트",
+}
+
+# English words and acronyms that are read as words (keys are lowercase)
+WORD_READINGS = {
+    "ok": "오케이", "okay": "오케이", "email": "이메일", "app": "앱", "apps": "앱", "web": "웹",
+    "wifi": "와이파이", "internet": "인터넷", "online": "온라인", "offline": "오프라인",
+    "google": "구글", "youtube": "유튜브", "iphone": "아이폰", "ipad": "아이패드",
+    "android": "안드로이드", "windows": "윈도우", "apple": "애플", "samsung": "삼성",
+    "naver": "네이버", "kakao": "카카오", "kakaotalk": "카카오톡", "microsoft": "마이크로소프트",
+    "amazon": "아마존", "netflix": "넷플릭스", "facebook": "페이스북", "instagram": "인스타그램",
+    "python": "파이썬", "java": "자바", "javascript": "자바스크립트", "linux": "리눅스",
+    "chatgpt": "챗지피티", "openai": "오픈에이아이", "gemma": "젬마", "mimiclab": "미믹랩",
+    "sogang": "서강", "computer": "컴퓨터", "software": "소프트웨어", "hardware": "하드웨어",
+    "smartphone": "스마트폰", "bluetooth": "블루투스", "laptop": "랩톱", "mobile": "모바일",
+    "server": "서버", "data": "데이터", "cloud": "클라우드", "chatbot": "챗봇", "robot": "로봇",
+    "program": "프로그램", "service": "서비스", "update": "업데이트", "download": "다운로드",
+    "upload": "업로드", "login": "로그인", "password": "패스워드", "nasa": "나사",
+    "unesco": "유네스코", "ram": "램", "rom": "롬", "jpeg": "제이펙", "covid": "코비드",
+}
+
+# Units after a number: (reading before the number, reading after it)
+UNIT_READINGS: Dict[str, Tuple[str, str]] = {
+    "km/h": ("시속 ", "킬로미터"), "%": ("", " 퍼센트"), "℃": ("", "도"), "°C": ("", "도"),
+    "°F": ("화씨 ", "도"), "°": ("", "도"), "km": ("", "킬로미터"), "cm": ("", "센티미터"),
+    "mm": ("", "밀리미터"), "m": ("", "미터"), "kg": ("", "킬로그램"), "mg": ("", "밀리그램"),
+    "g": ("", "그램"), "ml": ("", "밀리리터"), "mL": ("", "밀리리터"), "L": ("", "리터"),
+    "TB": ("", "테라바이트"), "GB": ("", "기가바이트"), "MB": ("", "메가바이트"),
+    "KB": ("", "킬로바이트"), "GHz": ("", "기가헤르츠"), "MHz": ("", "메가헤르츠"),
+    "kHz": ("", "킬로헤르츠"), "Hz": ("", "헤르츠"), "kW": ("", "킬로와트"), "W": ("", "와트"),
+    "V": ("", "볼트"), "mAh": ("", "밀리암페어시"),
+}
+
+# Currency signs before a number
+CURRENCY_READINGS = {"$": "달러", "€": "유로", "£": "파운드", "¥": "엔", "₩": "원"}
+
+# Symbols spoken as words; anything else outside this table is dropped
+SYMBOL_READINGS = {
+    "&": " 앤드 ", "+": " 플러스 ", "=": " 는 ", "@": " 앳 ", "×": " 곱하기 ", "÷": " 나누기 ",
+    "±": " 플러스마이너스 ",
+}
+
+# Counters that take native Korean numbers (한 개, 두 명, 세 시); others take Sino-Korean ones
+NATIVE_COUNTERS = (
+    "번째", "시간", "마리", "사람", "가지", "군데", "그루", "송이", "켤레", "개", "명", "살",
+    "시", "번", "잔", "병", "권", "장", "대", "채", "벌", "쌍", "곳", "달", "통", "줄", "척", "판",
+)
+# Words that start like a native counter but take Sino-Korean numbers (삼 개월, not 세 개월)
+SINO_COUNTERS = ("개월", "달러", "번지", "시즌", "채널", "대학", "장관")
+
+_SINO_DIGITS = "영일이삼사오육칠팔구"
+_SMALL_UNITS = ("", "십", "백", "천")
+_LARGE_UNITS = ("", "만", "억", "조", "경")
+_NATIVE_ONES = ("", "하나", "둘", "셋", "넷", "다섯", "여섯", "일곱", "여덟", "아홉")
+_NATIVE_TENS = ("", "열", "스물", "서른", "마흔", "쉰", "예순", "일흔", "여든", "아흔")
+# Shortened forms before a counter
+_NATIVE_PRENOMINAL = {"하나": "한", "둘": "두", "셋": "세", "넷": "네", "스물": "스무"}
+# Months with irregular readings
+_MONTHS = {6: "유월", 10: "시월"}
+
+
+def _alternation(keys) -> str:
+    """Regex alternation of literal keys, longest first so the longest key wins"""
+    return "|".join(re.escape(key) for key in sorted(keys, key=len, reverse=True))
+
+
+# Patterns are compiled once from the tables above
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?!\d)|\d+"
+_MARKDOWN_PATTERNS = [
+    (re.compile(r"```[^\n]*\n?|`"), ""),                          # Code fences and inline code
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),              # Links and images: keep the label
+    (re.compile(r"https?://\S+|www\.\S+"), ""),                   # Bare URLs
+    (re.compile(r"(\*{1,3}|_{2,3})(\S(?:.*?\S)?)\1"), r"\2"),     # Bold and italics
+    (re.compile(r"^\s{0,3}(?:#{1,6}|>|[-*+•]|\d+[.)])\s+", re.M), ""),  # Headings, quotes, list items
+]
+_EMOJI = re.compile(
+    "[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U0000FE0F\U0000200D\U00002B00-\U00002BFF\U0001F1E6-\U0001F1FF]+"
+)
+_PHONE = re.compile(r"(?<!\d)(0\d{1,2})-(\d{3,4})-(\d{4})(?!\d)")
+_DATE = re.compile(r"(?<![\d.])(\d{4})[-./](\d{1,2})[-./](\d{1,2})(?![\d.])")
+_TIME = re.compile(r"(?<![\d:])(\d{1,2}):(\d{2})(?::(\d{2}))?(?![\d:])")
+_CURRENCY = re.compile(rf"({_alternation(CURRENCY_READINGS)})\s?({_NUMBER})(?:\.(\d+))?")
+_RANGE = re.compile(rf"(?<![\d.])({_NUMBER}(?:\.\d+)?)\s?[~∼〜]\s?(?=\d)")
+_UNIT = re.compile(rf"(?<![\d.])(-?)({_NUMBER})(?:\.(\d+))?\s?({_alternation(UNIT_READINGS)})(?![A-Za-z])")
+_ORDINAL = re.compile(r"(?<![\d.])(\d+)\s?(번째|째)")
+_MONTH = re.compile(r"(?<![\d.])(\d{1,2})\s?월")
+_COUNTER = re.compile(rf"(?<![\d.])({_NUMBER})\s?({_alternation(SINO_COUNTERS + NATIVE_COUNTERS)})")
+# Scores (4 대 1, 3대2) are read in Sino-Korean, not as a count of machines
+_SCORE = re.compile(r"(?<![\d.,])(\d+)\s?대\s?(?=\d)")
+# Age and period decades (20대, 50대) are read in Sino-Korean; 50 대 with a space counts machines
+_DECADE = re.compile(r"(?<![\d.,])([1-9]0)대")
+# A hyphen between a name and its number (GPT-4, KF-94) is a pause, not a minus sign
+_NAME_NUMBER = re.compile(r"(?<=[A-Za-z])-(?=\d)")
+_DECIMAL = re.compile(rf"(?<![\d.])({_NUMBER})(?:\.(\d+))?")
+_SIGNED = re.compile(r"(?:(?<=\s)|^)-(?=\d)")
+_WORD = re.compile(r"(?<![A-Za-z])[A-Za-z][A-Za-z'-]*(?![A-Za-z])")
+# An English word next to a single letter makes it a word (I am, Plan B), not an initial
+_ENGLISH_BEFORE = re.compile(r"[A-Za-z][A-Za-z'-]*[.,!?]?[ \t]+$")
+_ENGLISH_AFTER = re.compile(r"[ \t]+[A-Za-z]")
+_SYMBOLS = re.compile(_alternation(SYMBOL_READINGS))
+_DROPPED = re.compile(r"[*_|^<>\[\]{}\\#`~]")
+_SPACES = re.compile(r"[ \t]+")
+
+
+def sino_number(n: int) -> str:
+    """Sino-Korean reading of a non-negative integer (1234 -> 천이백삼십사)"""
+    if n == 0:
+        return "영"
+    if n >= 10 ** (4 * len(_LARGE_UNITS)):
+        return read_digits(str(n))
+    parts = []
+    for unit in _LARGE_UNITS:
+        n, group = divmod(n, 10000)
+        if group:
+            text = ""
+            for position in range(3, -1, -1):
+                digit = group // 10 ** position % 10
+                if digit:
+                    # 일 is dropped before 십, 백 and 천
+                    text += ("" if digit == 1 and position else _SINO_DIGITS[digit]) + _SMALL_UNITS[position]
+            # 만 rather than 일만
+            parts.append(("" if text == "일" and unit == "만" else text) + unit)
+        if not n:
+            break
+    return "".join(reversed(parts))
+
+
+def native_number(n: int, prenominal: bool = True) -> str:
+    """Native Korean reading for 1-99 (used before counters), Sino-Korean otherwise"""
+    if not 0 < n < 100:
+        return sino_number(n)
+    tens, ones = _NATIVE_TENS[n // 10], _NATIVE_ONES[n % 10]
+    if prenominal:
+        if ones:
+            ones = _NATIVE_PRENOMINAL.get(ones, ones)
+        else:
+            tens = _NATIVE_PRENOMINAL.get(tens, tens)
+    return tens + ones
+
+
+def read_digits(digits: str) -> str:
+    """Digit-by-digit reading, as for phone numbers and decimals"""
+    return "".join(_SINO_DIGITS[int(d)] for d in digits if d.isdigit())
+
+
+def _read_number(integer: str, fraction: Optional[str] = None) -> str:
+    integer = integer.replace(",", "")
+    # Codes such as 007 are read digit by digit
+    text = read_digits(integer) if len(integer) > 1 and integer.startswith("0") else sino_number(int(integer))
+    if fraction:
+        # Decimal digits are named one by one, zero as 공 (12.50 -> 십이 점 오공)
+        text += " 점 " + read_digits(fraction).replace("영", "공")
+    return text
+
+
+def _spell(word: str) -> str:
+    return "".join(LETTER_READINGS.get(c.upper(), c) for c in word)
+
+
+class TextNormalizer:
+    """Rewrite LLM output into text that TTS reads correctly
+
+    Markdown, URLs and emoji are removed for every language. For Korean,
+    numbers are read as Sino-Korean or native Korean depending on the
+    counter after them (세 개, 삼 분, 오십 대 for 50대), and dates, times, phone numbers,
+    currencies, units, symbols and English words or acronyms are rewritten
+    in Hangul from the lookup tables of this module. Every rule is a
+    precompiled regular expression, so a sentence takes microseconds.
+    """
+
+    def __init__(self, language: str = "ko"):
+        self.korean = language.startswith("ko")
+
+    def __call__(self, text: str) -> str:
+        return self.normalize(text)
+
+    def normalize(self, text: str) -> str:
+        for pattern, replacement in _MARKDOWN_PATTERNS:
+            text = pattern.sub(replacement, text)
+        text = _EMOJI.sub("", text)
+        if self.korean:
+            text = self._korean(text)
+        return _SPACES.sub(" ", text).strip()
+
+    def _korean(self, text: str) -> str:
+        text = _NAME_NUMBER.sub(" ", text)
+        text = _PHONE.sub(lambda m: " ".join(read_digits(g).replace("영", "공") for g in m.groups()), text)
+        text = _DATE.sub(lambda m: f"{int(m[1])}년 {int(m[2])}월 {int(m[3])}일", text)
+        text = _TIME.sub(self._time, text)
+        text = _CURRENCY.sub(lambda m: _read_number(m[2], m[3]) + " " + CURRENCY_READINGS[m[1]], text)
+        text = _RANGE.sub(lambda m: m[1] + "에서 ", text)
+        text = _UNIT.sub(self._unit, text)
+        text = _ORDINAL.sub(self._ordinal, text)
+        text = _MONTH.sub(lambda m: _MONTHS.get(int(m[1])) or sino_number(int(m[1])) + "월", text)
+        text = _SCORE.sub(lambda m: sino_number(int(m[1])) + " 대 ", text)
+        text = _DECADE.sub(lambda m: sino_number(int(m[1])) + " 대", text)
+        text = _COUNTER.sub(self._counter, text)
+        text = _SIGNED.sub("마이너스 ", text)
+        text = _DECIMAL.sub(lambda m: _read_number(m[1], m[2]), text)
+        text = _SYMBOLS.sub(lambda m: SYMBOL_READINGS[m[0]], text)
+        text = _DROPPED.sub(" ", text)
+        return _WORD.sub(self._word, text)
+
+    @staticmethod
+    def _time(match) -> str:
+        hour, minute, second = int(match[1]), int(match[2]), match[3]
+        text = f"{native_number(hour) if hour else '영'} 시"
+        if minute:
+            text += f" {sino_number(minute)} 분"
+        if second and int(second):
+            text += f" {sino_number(int(second))} 초"
+        return text
+
+    @staticmethod
+    def _unit(match) -> str:
+        before, after = UNIT_READINGS[match[4]]
+        if before and match.string[:match.start()].rstrip().endswith(before.strip()):
+            before = ""  # Already written out, as in "시속 100km/h"
+        sign = "마이너스 " if match[1] else ""
+        return before + sign + _read_number(match[2], match[3]) + after
+
+    @staticmethod
+    def _ordinal(match) -> str:
+        n = int(match[1])
+        if match[2] == "번째":
+            # 첫 번째, 두 번째 (not 한 번째)
+            return ("첫" if n == 1 else native_number(n)) + " 번째"
+        return ("첫" if n == 1 else native_number(n, prenominal=False)) + "째"
+
+    @staticmethod
+    def _counter(match) -> str:
+        n = int(match[1].replace(",", ""))
+        number = sino_number(n) if match[2] in SINO_COUNTERS else native_number(n)
+        return number + " " + match[2]
+
+    @staticmethod
+    def _word(match) -> str:
+        word = match[0]
+        key = word.lower().replace("-", "").replace("'", "")
+        reading = WORD_READINGS.get(key)
+        if reading is not None:
+            return reading
+        letters = word.replace("-", "")
+        if len(letters) == 1 and (_ENGLISH_BEFORE.search(match.string, 0, match.start())
+                                  or _ENGLISH_AFTER.match(match.string, match.end())):
+            return word
+        # Acronyms (AI, CEO, IoT) are spelled; ordinary English words are left to the TTS model
+        if letters.isalpha() and len(letters) <= 8 and sum(c.isupper() for c in letters) >= max(1, len(letters) - 1):
+            return _spell(letters)
+        return word
+
+
+def normalize_text(text: str, language: str = "ko") -> str:
+    """Normalize one piece of text for TTS"""
+    return TextNormalizer(language).normalize(text)
@@ -0,0 +1,560 @@
+"""
+Offline transcription of long media files with VAD segmentation and parallel Whisper workers
+"""
+
+import argparse
+import bisect
+import json
+import shutil
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .transcript_cache import TranscriptCache, TranscriptionJob
+from .vad import FRAME_MS, SAMPLE_RATE, FrameVAD, resample
+
+# Longest audio Whisper decodes in one window
+WHISPER_WINDOW_S = 30.0
+
+
+@dataclass
+class SpeechSegment:
+    """A stretch of audio between pauses, cut for one Whisper window"""
+    index: int
+    start: float  # Seconds from the start of the media
+    end: float
+    audio: np.ndarray  # float32 mono at SAMPLE_RATE
+
+
+@dataclass
+class Cue:
+    """Timestamped text of a transcript"""
+    start: float
+    end: float
+    text: str
+    segment: int = 0  # Index of the SpeechSegment it came from
+
+
+def decode_media(
+    path: str,
+    sample_rate: int = SAMPLE_RATE,
+    block_seconds: float = 10.0,
+    start: float = 0.0,
+    duration: Optional[float] = None
+) -> Iterator[np.ndarray]:
+    """Decode any audio or video file to float32 mono blocks, without loading it whole
+
+    ffmpeg downmixes and resamples while decoding and writes raw PCM to a
+    pipe. Without ffmpeg, files soundfile can read (WAV, FLAC, OGG) are
+    decoded block by block instead.
+    """
+    block_samples = int(sample_rate * block_seconds)
+
+    if shutil.which("ffmpeg"):
+        cmd = ["ffmpeg", "-nostdin", "-v", "error"]
+        if start:
+            cmd += ["-ss", str(start)]
+        cmd += ["-i", str(path), "-vn"]
+        if duration is not None:
+            cmd += ["-t", str(duration)]
+        cmd += ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-"]
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            while True:
+                data = process.stdout.read(block_samples * 2)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16).astype(np.float32) / 32768.0
+        finally:
+            process.stdout.close()
+            error = process.stderr.read().decode(errors="replace").strip()
+            process.stderr.close()
+            if process.wait() != 0 and error:
+                raise RuntimeError(f"ffmpeg failed to decode {path}: {error}")
+        return
+
+    import soundfile as sf
+
+    with sf.SoundFile(str(path)) as f:
+        if start:
+            f.seek(int(start * f.samplerate))
+        remaining = int(duration * f.samplerate) if duration is not None else None
+        block = int(f.samplerate * block_seconds)
+        while remaining is None or remaining > 0:
+            frames = block if remaining is None else min(block, remaining)
+            audio = f.read(frames, dtype="float32", always_2d=True)
+            if not len(audio):
+                break
+            if remaining is not None:
+                remaining -= len(audio)
+            yield resample(audio.mean(axis=1), f.samplerate, sample_rate)
+
+
+class VADSegmenter:
+    """Cut a stream of audio into speech segments at pauses
+
+    A segment grows until it reaches max_segment_s, then is cut in the middle
+    of the latest pause of at least min_silence_ms (or at the limit when it
+    has none). Silence longer than max_silence_ms closes the segment, and the
+    silence in between is skipped instead of being sent to Whisper.
+    """
+
+    def __init__(
+        self,
+        max_segment_s: float = WHISPER_WINDOW_S,
+        min_silence_ms: int = 300,
+        max_silence_ms: int = 1000,
+        pad_ms: int = 200,
+        vad: Optional[FrameVAD] = None
+    ):
+        self.vad = vad or FrameVAD()
+        self.frame_seconds = FRAME_MS / 1000
+        self.max_frames = max(1, int(max_segment_s / self.frame_seconds))
+        self.min_silence_frames = max(1, min_silence_ms // FRAME_MS)
+        self.max_silence_frames = max(self.min_silence_frames, max_silence_ms // FRAME_MS)
+        self.pad_frames = pad_ms // FRAME_MS
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._position = 0  # Frames consumed so far
+        self._index = 0
+        self._pad: deque = deque(maxlen=max(1, self.pad_frames))
+        self._clear()
+
+    def _clear(self):
+        self._frames: List[np.ndarray] = []
+        self._start: Optional[int] = None  # Frame where the current segment starts
+        self._silence_run = 0
+        self._cut: Optional[int] = None  # Best place to cut the current segment
+
+    def feed(self, audio: np.ndarray) -> List[SpeechSegment]:
+        """Add audio and return the segments completed by it"""
+        segments = []
+        frame_length = self.vad.frame_length
+        audio = np.concatenate([self._pending, audio.astype(np.float32)])
+        n_frames = len(audio) // frame_length
+        self._pending = audio[n_frames * frame_length:]
+
+        for i in range(n_frames):
+            frame = audio[i * frame_length:(i + 1) * frame_length]
+            speech = self.vad.is_speech(frame)
+            self._position += 1
+
+            if self._start is None:
+                if speech:
+                    self._frames = list(self._pad) + [frame]
+                    self._start = self._position - len(self._frames)
+                    self._pad.clear()
+                else:
+                    self._pad.append(frame)
+                continue
+
+            self._frames.append(frame)
+            if speech:
+                if self._silence_run >= self.min_silence_frames:
+                    self._cut = len(self._frames) - 1 - self._silence_run // 2
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+
+            if self._silence_run >= self.max_silence_frames:
+                keep = len(self._frames) - self._silence_run + self.pad_frames
+                segments.append(self._emit(keep))
+                self._pad.extend(self._frames[-self.pad_frames:] if self.pad_frames else [])
+                self._clear()
+            elif len(self._frames) >= self.max_frames:
+                cut = self._cut or len(self._frames)
+                segments.append(self._emit(cut))
+                self._start += cut
+                self._frames = self._frames[cut:]
+                self._cut = None
+                if not self._frames:
+                    self._clear()
+
+        return segments
+
+    def flush(self) -> List[SpeechSegment]:
+        """Return the last segment at the end of the stream"""
+        if self._start is None:
+            return []
+        keep = len(self._frames) - max(0, self._silence_run - self.pad_frames)
+        segment = self._emit(keep)
+        self._clear()
+        return [segment]
+
+    def _emit(self, n_frames: int) -> SpeechSegment:
+        segment = SpeechSegment(
+            index=self._index,
+            start=self._start * self.frame_seconds,
+            end=(self._start + n_frames) * self.frame_seconds,
+            audio=np.concatenate(self._frames[:n_frames])
+        )
+        self._index += 1
+        return segment
+
+
+class WhisperSegmentTranscriber:
+    """Transcribe batches of speech segments with faster-whisper
+
+    Each batch is decoded in one batched forward pass with
+    BatchedInferencePipeline (faster-whisper 1.0+), with the segments as clip
+    boundaries. num_workers lets several batches run on the model at once.
+    """
+
+    def __init__(
+        self,
+        model: str = "base",
+        device: str = "auto",
+        compute_type: str = "default",
+        language: Optional[str] = None,
+        beam_size: int = 5,
+        workers: int = 2
+    ):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model, device=device, compute_type=compute_type, num_workers=workers)
+        self.model_name = model
+        self.compute_type = compute_type
+        self.language = language
+        self.beam_size = beam_size
+        try:
+            from faster_whisper import BatchedInferencePipeline
+            self.pipeline = BatchedInferencePipeline(self.model)
+        except ImportError:
+            self.pipeline = None
+            print("faster-whisper without BatchedInferencePipeline, segments are decoded one at a time")
+
+    def settings(self) -> Dict[str, Any]:
+        """Everything that changes the text of a segment"""
+        return {
+            "model": self.model_name,
+            "language": self.language,
+            "beam_size": self.beam_size,
+            "compute_type": self.compute_type,
+        }
+
+    def transcribe(self, segments: List[SpeechSegment]) -> List[Cue]:
+        if self.pipeline is None:
+            cues = []
+            for segment in segments:
+                parts, _ = self.model.transcribe(
+                    segment.audio,
+                    language=self.language,
+                    beam_size=self.beam_size,
+                    condition_on_previous_text=False
+                )
+                cues.extend(
+                    Cue(segment.start + part.start, segment.start + part.end, part.text.strip(), segment.index)
+                    for part in parts
+                )
+            return cues
+
+        # Segments are concatenated and passed as clips, so they are decoded as one batch
+        offsets = np.cumsum([0] + [len(segment.audio) for segment in segments]) / SAMPLE_RATE
+        clips = [{"start": float(offsets[i]), "end": float(offsets[i + 1])} for i in range(len(segments))]
+        parts, _ = self.pipeline.transcribe(
+            np.concatenate([segment.audio for segment in segments]),
+            language=self.language,
+            beam_size=self.beam_size,
+            clip_timestamps=clips,
+            batch_size=len(segments),
+            without_timestamps=False
+        )
+
+        cues = []
+        for part in parts:
+            i = min(max(bisect.bisect_right(offsets, part.start) - 1, 0), len(segments) - 1)
+            segment = segments[i]
+            start = segment.start + part.start - offsets[i]
+            end = min(segment.start + part.end - offsets[i], segment.end)
+            cues.append(Cue(start, max(start, end), part.text.strip(), segment.index))
+        return cues
+
+
+class TranscriptionEngine:
+    """Decode, segment and transcribe a media file as a pipeline
+
+    Segments are grouped into batches and transcribed by a pool of workers
+    while decoding continues. Cues come back in media order, and at most
+    2 × workers batches are in flight so memory stays flat for long files.
+    With a TranscriptCache, finished segments are checkpointed: an
+    interrupted run resumes after the last completed segment and segments
+    transcribed before are not transcribed again.
+    """
+
+    def __init__(
+        self,
+        transcriber,
+        segmenter_options: Optional[Dict[str, Any]] = None,
+        batch_size: int = 8,
+        workers: int = 2,
+        cache: Optional[TranscriptCache] = None
+    ):
+        self.transcriber = transcriber
+        self.segmenter_options = segmenter_options or {}
+        self.batch_size = batch_size
+        self.workers = workers
+        self.cache = cache
+        self.audio_seconds = 0.0
+        self.speech_seconds = 0.0
+        self.segments = 0
+        self.reused_segments = 0
+
+    def run(self, path: str, start: float = 0.0, duration: Optional[float] = None) -> Iterator[Cue]:
+        """Cues of a media file, with times relative to the start of the file"""
+        self.audio_seconds = 0.0
+        self.speech_seconds = 0.0
+        self.segments = 0
+        self.reused_segments = 0
+
+        job = None
+        offset = 0.0
+        first_index = 0
+        if self.cache is not None:
+            settings = dict(self.transcriber.settings(), segmenter=self.segmenter_options,
+                            start=start, duration=duration)
+            job = self.cache.open_job(path, settings)
+            completed = job.completed()
+            if completed:
+                print(f"Resuming after {len(completed)} completed segments ({job.resume_at:.0f}s)")
+            for segment in completed:
+                self.segments += 1
+                self.reused_segments += 1
+                self.speech_seconds += segment["end"] - segment["start"]
+                for cue in self._cues_from_cache(segment["index"], segment["start"], segment["cues"]):
+                    yield Cue(cue.start + start, cue.end + start, cue.text, cue.segment)
+            if job.is_complete:
+                return
+            offset = job.resume_at
+            first_index = len(completed)
+
+        if duration is not None:
+            duration = max(0.0, duration - offset)
+        blocks = decode_media(path, start=start + offset, duration=duration)
+        for cue in self.transcribe_stream(blocks, offset=offset, first_index=first_index, job=job):
+            yield Cue(cue.start + start, cue.end + start, cue.text, cue.segment)
+        self.audio_seconds += offset
+        if job is not None:
+            job.finish()
+
+    def transcribe_stream(
+        self,
+        blocks: Iterable[np.ndarray],
+        offset: float = 0.0,
+        first_index: int = 0,
+        job: Optional[TranscriptionJob] = None
+    ) -> Iterator[Cue]:
+        """Cues of a stream of float32 mono blocks at SAMPLE_RATE starting offset seconds into the media"""
+        segmenter = VADSegmenter(**self.segmenter_options)
+        # [segment, result key, future of the cues of its batch] in media order
+        in_flight: deque = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agentvox-transcribe") as pool:
+            batch: List[list] = []
+
+            def submit():
+                future = pool.submit(self.transcriber.transcribe, [entry[0] for entry in batch])
+                for entry in batch:
+                    entry[2] = future
+                batch.clear()
+
+            def add(segment: SpeechSegment):
+                segment.index += first_index
+                segment.start += offset
+                segment.end += offset
+                self.segments += 1
+                self.speech_seconds += segment.end - segment.start
+                key = job.key(segment.audio) if job is not None else None
+                cached = job.get(key) if job is not None else None
+                if cached is not None:
+                    self.reused_segments += 1
+                    future = Future()
+                    future.set_result(self._cues_from_cache(segment.index, segment.start, cached))
+                    in_flight.append([segment, key, future])
+                    return
+                entry = [segment, key, None]
+                in_flight.append(entry)
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    submit()
+
+            for block in blocks:
+                self.audio_seconds += len(block) / SAMPLE_RATE
+                for segment in segmenter.feed(block):
+                    add(segment)
+                while len(in_flight) > 2 * self.workers * self.batch_size and in_flight[0][2] is not None:
+                    yield from self._finish(*in_flight.popleft(), job)
+
+            for segment in segmenter.flush():
+                add(segment)
+            if batch:
+                submit()
+            while in_flight:
+                yield from self._finish(*in_flight.popleft(), job)
+
+    @staticmethod
+    def _cues_from_cache(index: int, start: float, cues: List[List[Any]]) -> List[Cue]:
+        return [Cue(start + cue_start, start + cue_end, text, index) for cue_start, cue_end, text in cues]
+
+    def _finish(self, segment: SpeechSegment, key: Optional[str], future: Future, job) -> List[Cue]:
+        """Cues of one segment, checkpointed in the job"""
+        cues = [cue for cue in future.result() if cue.segment == segment.index]
+        if job is not None:
+            job.complete(segment.index, segment.start, segment.end, key, [
+                [round(cue.start - segment.start, 3), round(cue.end - segment.start, 3), cue.text] for cue in cues
+            ])
+        return cues
+
+
+def format_timestamp(seconds: float, separator: str = ",") -> str:
+    milliseconds = int(round(max(seconds, 0.0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+class TranscriptWriter:
+    """Write cues to a file as they arrive"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8")
+        self.count = 0
+        self.begin()
+
+    def begin(self):
+        pass
+
+    def write(self, cue: Cue):
+        if not cue.text:
+            return
+        self.count += 1
+        self.file.write(self.format(cue))
+        self.file.flush()
+
+    def format(self, cue: Cue) -> str:
+        raise NotImplementedError("The format method must be implemented by the writer.")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SrtWriter(TranscriptWriter):
+    def format(self, cue: Cue) -> str:
+        return f"{self.count}\n{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}\n{cue.text}\n\n"
+
+
+class VttWriter(TranscriptWriter):
+    def begin(self):
+        self.file.write("WEBVTT\n\n")
+
+    def format(self, cue: Cue) -> str:
+        return f"{format_timestamp(cue.start, '.')} --> {format_timestamp(cue.end, '.')}\n{cue.text}\n\n"
+
+
+class JsonlWriter(TranscriptWriter):
+    def format(self, cue: Cue) -> str:
+        record = {"start": round(cue.start, 3), "end": round(cue.end, 3), "text": cue.text, "segment": cue.segment}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class TextWriter(TranscriptWriter):
+    def format(self, cue: Cue) -> str:
+        return cue.text + "\n"
+
+
+WRITERS = {
+    "srt": SrtWriter,
+    "vtt": VttWriter,
+    "jsonl": JsonlWriter,
+    "txt": TextWriter,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for `agentvox transcribe`"""
+    parser = argparse.ArgumentParser(prog="agentvox transcribe",
+                                     description="Transcribe long audio/video files with local Whisper")
+    parser.add_argument("inputs", nargs="+",
+                       help="Audio or video files")
+    parser.add_argument("--format", type=str, default="srt", choices=sorted(WRITERS),
+                       help="Output format (default: srt)")
+    parser.add_argument("--output-dir", type=str, default=None,
+                       help="Directory for the transcripts (default: next to each input)")
+    parser.add_argument("--model", type=str, default="base",
+                       help="Whisper model size or path (default: base)")
+    parser.add_argument("--language", type=str, default=None,
+                       help="Spoken language, e.g. ko or en (default: detect)")
+    parser.add_argument("--device", type=str, default="auto", choices=["auto", "cpu", "cuda"],
+                       help="Device for Whisper (default: auto)")
+    parser.add_argument("--compute-type", type=str, default="default",
+                       help="CTranslate2 compute type, e.g. int8, float16 (default: model default)")
+    parser.add_argument("--beam-size", type=int, default=5,
+                       help="Beam size (default: 5)")
+    parser.add_argument("--workers", type=int, default=2,
+                       help="Batches transcribed concurrently (default: 2)")
+    parser.add_argument("--batch-size", type=int, default=8,
+                       help="Segments decoded together in one batch (default: 8)")
+    parser.add_argument("--max-segment", type=float, default=WHISPER_WINDOW_S,
+                       help="Longest segment in seconds (default: 30)")
+    parser.add_argument("--min-silence-ms", type=int, default=300,
+                       help="Shortest pause a segment may be cut at (default: 300)")
+    parser.add_argument("--start", type=float, default=0.0,
+                       help="Start offset in seconds (default: 0)")
+    parser.add_argument("--duration", type=float, default=None,
+                       help="Seconds to transcribe from the start offset (default: all)")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                       help="Job manifests and segment results (default: models/transcripts)")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Do not checkpoint or reuse segment results")
+
+    args = parser.parse_args(argv)
+
+    transcriber = WhisperSegmentTranscriber(
+        model=args.model,
+        device=args.device,
+        compute_type=args.compute_type,
+        language=args.language,
+        beam_size=args.beam_size,
+        workers=args.workers
+    )
+    engine = TranscriptionEngine(
+        transcriber,
+        segmenter_options={"max_segment_s": args.max_segment, "min_silence_ms": args.min_silence_ms},
+        batch_size=args.batch_size,
+        workers=args.workers,
+        cache=None if args.no_cache else TranscriptCache(args.cache_dir)
+    )
+
+    for path in args.inputs:
+        output_dir = Path(args.output_dir) if args.output_dir else Path(path).parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output = output_dir / f"{Path(path).stem}.{args.format}"
+
+        print(f"Transcribing {path}")
+        start = time.time()
+        with WRITERS[args.format](str(output)) as writer:
+            for cue in engine.run(path, start=args.start, duration=args.duration):
+                writer.write(cue)
+                print(f"  [{format_timestamp(cue.start, '.')}] {cue.text}")
+        elapsed = time.time() - start
+        speed = engine.audio_seconds / elapsed if elapsed > 0 else 0.0
+        print(f"{output}: {writer.count} cues, {engine.segments} segments ({engine.reused_segments} reused), "
+              f"{engine.audio_seconds:.0f}s of audio ({engine.speech_seconds:.0f}s speech) "
+              f"in {elapsed:.0f}s ({speed:.1f}x realtime)")
+
+
+if __name__ == "__main__":
+    main()
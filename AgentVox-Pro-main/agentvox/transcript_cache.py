@@ -0,0 +1,149 @@
+"""
+Resumable transcription jobs and a per-segment result cache
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / "models" / "transcripts"
+
+# Bytes read at a time when hashing media files
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of the file content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptionJob:
+    """Progress of one media file with one set of settings
+
+    The manifest lists the segment boundaries and the end of the completed
+    prefix, so an interrupted job resumes decoding there. Results are stored
+    per segment, keyed by the segment audio and the recognition settings, and
+    are shared by every job on the same file: a job whose segmentation
+    changed still reuses the segments that came out identical.
+    """
+
+    def __init__(self, directory: Path, media_path: str, media_hash: str, settings: Dict[str, Any]):
+        self.directory = directory
+        self.media_path = media_path
+        self.media_hash = media_hash
+        self.settings = settings
+        # Recognition settings decide the segment results; segmentation only decides the boundaries
+        self.recognition = {k: v for k, v in settings.items() if k in ("model", "language", "beam_size", "compute_type")}
+        job_key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.manifest_path = directory / f"job-{job_key}.json"
+        self.segments_path = directory / "segments.jsonl"
+        self._lock = threading.Lock()
+        self._results: Dict[str, List[List[Any]]] = {}
+        self.reused = 0
+        self.manifest = {
+            "media": str(media_path),
+            "media_hash": media_hash,
+            "settings": settings,
+            "segments": [],
+            "resume_at": 0.0,
+            "complete": False,
+        }
+        self._load()
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.segments_path.exists():
+            with open(self.segments_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Line cut short by a crash
+                    self._results[record["key"]] = record["cues"]
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            # Keep only the prefix whose results are actually stored
+            done = []
+            for segment in manifest["segments"]:
+                if segment["key"] not in self._results:
+                    break
+                done.append(segment)
+            manifest["complete"] = manifest["complete"] and len(done) == len(manifest["segments"])
+            manifest["segments"] = done
+            manifest["resume_at"] = done[-1]["end"] if done else 0.0
+            self.manifest = manifest
+
+    @property
+    def resume_at(self) -> float:
+        """Seconds after the job start where the completed prefix ends"""
+        return self.manifest["resume_at"]
+
+    @property
+    def is_complete(self) -> bool:
+        return self.manifest["complete"]
+
+    def key(self, audio: np.ndarray) -> str:
+        """Result key of a segment: its audio and the recognition settings"""
+        digest = hashlib.sha256(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        digest.update(json.dumps(self.recognition, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[List[Any]]]:
+        """Stored cues of a segment as [start, end, text] relative to the segment start"""
+        with self._lock:
+            cues = self._results.get(key)
+            if cues is not None:
+                self.reused += 1
+            return cues
+
+    def completed(self) -> List[Dict[str, Any]]:
+        """Segments of the completed prefix with their stored cues"""
+        return [dict(segment, cues=self._results[segment["key"]]) for segment in self.manifest["segments"]]
+
+    def complete(self, index: int, start: float, end: float, key: str, cues: List[List[Any]]):
+        """Record a finished segment (segments must be completed in order)"""
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = cues
+                with open(self.segments_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "cues": cues}, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.manifest["segments"].append({"index": index, "start": start, "end": end, "key": key})
+            self.manifest["resume_at"] = end
+            self._save()
+
+    def finish(self):
+        with self._lock:
+            self.manifest["complete"] = True
+            self._save()
+
+    def _save(self):
+        self.manifest["updated"] = datetime.now().isoformat(timespec="seconds")
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+
+class TranscriptCache:
+    """Directory of transcription jobs and segment results, one subdirectory per media file"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(directory) if directory else DEFAULT_CACHE_DIR
+
+    def open_job(self, media_path: str, settings: Dict[str, Any]) -> TranscriptionJob:
+        media_hash = file_hash(media_path)
+        return TranscriptionJob(self.directory / media_hash[:32], media_path, media_hash, settings)
@@ -0,0 +1,208 @@
+"""
+Content-addressed cache of synthesized speech for repeated phrases
+"""
+
+import hashlib
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from RealtimeTTS.engines import BaseEngine
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / "models" / "tts" / "phrase_cache"
+
+# Bytes per chunk when replaying cached audio into the stream
+REPLAY_CHUNK_BYTES = 8192
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different spellings share a cache entry"""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class PhraseAudioCache:
+    """Synthesized audio keyed by text and voice settings
+
+    Entries live in an in-memory LRU limited by a byte budget and in a disk
+    tier that survives restarts and is pruned oldest-first past its own budget.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        memory_budget_bytes: int = 64 * 1024 * 1024,
+        disk_budget_bytes: int = 512 * 1024 * 1024
+    ):
+        self.directory = Path(directory) if directory else DEFAULT_CACHE_DIR
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, **settings) -> str:
+        """Hash of the normalized text and everything that affects the audio"""
+        payload = json.dumps([normalize_text(text), settings], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pcm"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio from memory or disk"""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # Keep recently used entries when pruning
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self._path(key).exists()
+
+    def put(self, key: str, audio: bytes):
+        """Store audio in memory and on disk"""
+        if not audio:
+            return
+        with self._lock:
+            self._remember(key, audio)
+        self._write(key, audio)
+
+    def _remember(self, key: str, audio: bytes):
+        """Insert into the memory tier and evict least recently used entries"""
+        if len(audio) > self.memory_budget_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_budget_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _write(self, key: str, audio: bytes):
+        """Write an entry atomically and prune the disk tier if needed"""
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+            self._prune()
+        except OSError as e:
+            print(f"Failed to write TTS cache entry: {e}")
+
+    def _prune(self):
+        files = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.directory.glob("*/*.pcm")]
+        total = sum(size for _, size, _ in files)
+        if total <= self.disk_budget_bytes:
+            return
+        for _, size, path in sorted(files):
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= self.disk_budget_bytes:
+                break
+
+
+class _RecordingQueue(queue.Queue):
+    """Audio queue that can also keep a copy of the chunks put into it"""
+
+    def __init__(self):
+        super().__init__()
+        self.recording: Optional[List[bytes]] = None
+
+    def put(self, item, block=True, timeout=None):
+        if self.recording is not None and isinstance(item, (bytes, bytearray)):
+            self.recording.append(bytes(item))
+        super().put(item, block, timeout)
+
+
+class CachingEngine(BaseEngine):
+    """Wrap a RealtimeTTS engine and replay cached audio for known text
+
+    The wrapped engine writes straight into this engine's queue, so first-chunk
+    latency is unchanged on a miss. On a hit, the cached audio is put into the
+    queue at once and no synthesis runs.
+    """
+
+    def __init__(self, engine: BaseEngine, cache: PhraseAudioCache, settings: Dict):
+        self.engine = engine
+        self.cache = cache
+        # Voice, speed, model and output format are part of every key
+        self.settings = dict(settings, stream_info=list(engine.get_stream_info()))
+
+    def post_init(self):
+        self.engine_name = self.engine.engine_name
+        self.can_consume_generators = False
+        self.queue = _RecordingQueue()
+        self.engine.queue = self.queue
+
+    def get_stream_info(self):
+        return self.engine.get_stream_info()
+
+    def synthesize(self, text: str, sentence_count: int = 0) -> bool:
+        super().synthesize(text)
+        key = self.cache.key(text, **self.settings)
+
+        audio = self.cache.get(key)
+        if audio is not None:
+            for start in range(0, len(audio), REPLAY_CHUNK_BYTES):
+                self.queue.put(audio[start:start + REPLAY_CHUNK_BYTES])
+            return True
+
+        self.queue.recording = []
+        try:
+            result = self.engine.synthesize(text)
+        finally:
+            chunks, self.queue.recording = self.queue.recording, None
+
+        # Interrupted synthesis would store truncated audio
+        if result and chunks and not self.stop_synthesis_event.is_set():
+            self.cache.put(key, b"".join(chunks))
+        return result
+
+    def get_voices(self):
+        return self.engine.get_voices()
+
+    def set_voice(self, voice):
+        self.engine.set_voice(voice)
+
+    def set_voice_parameters(self, **voice_parameters):
+        self.engine.set_voice_parameters(**voice_parameters)
+
+    def stop(self):
+        super().stop()
+        self.engine.stop()
+
+    def shutdown(self):
+        self.engine.shutdown()
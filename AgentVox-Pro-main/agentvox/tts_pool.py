@@ -0,0 +1,182 @@
+"""
+Parallel sentence synthesis on several TTS engines with ordered, gapless playback
+"""
+
+import queue
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+# Marks the end of a sentence's audio
+_DONE = object()
+
+
+class _Job:
+    """One sentence and the audio synthesized for it so far"""
+
+    def __init__(self, index: int, text: str, epoch: int):
+        self.index = index
+        self.text = text
+        self.epoch = epoch
+        self.chunks: "queue.Queue" = queue.Queue()
+
+
+class SynthesisPool:
+    """Synthesize sentences ahead of playback on a pool of engines
+
+    Every worker owns a muted RealtimeTTS stream with its own engine and takes
+    the next queued sentence, so later sentences are synthesized while earlier
+    ones play. A single player thread plays the sentences in submission order
+    and streams each one as its chunks arrive. A sentence is only handed to a
+    worker while the synthesized audio that has not been played yet is shorter
+    than max_ahead_s, which bounds memory and the work discarded by stop().
+    """
+
+    def __init__(
+        self,
+        streams: List,
+        play: Callable[[bytes], None],
+        bytes_per_second: float,
+        max_ahead_s: float = 10.0
+    ):
+        self.streams = streams
+        self.play = play
+        self.bytes_per_second = bytes_per_second
+        self.max_ahead_s = max_ahead_s
+
+        self._condition = threading.Condition()
+        self._pending: "deque[_Job]" = deque()  # Waiting for a worker
+        self._order: "deque[_Job]" = deque()  # Waiting for the player, in submission order
+        self._busy = 0  # Workers synthesizing right now
+        self._playing = False
+        self._epoch = 0  # Incremented by stop() to drop older sentences
+        self._index = 0
+        self._synthesized_bytes = 0
+        self._played_bytes = 0
+        self._closed = False
+        self.reset_stats()
+
+        self._workers = [
+            threading.Thread(target=self._work, args=(stream,), name=f"agentvox-tts-{i}", daemon=True)
+            for i, stream in enumerate(streams)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._player = threading.Thread(target=self._play_loop, name="agentvox-tts-player", daemon=True)
+        self._player.start()
+
+    def submit(self, text: str):
+        """Queue a sentence for synthesis and playback after the ones before it"""
+        if not text or not text.strip():
+            return
+        with self._condition:
+            job = _Job(self._index, text, self._epoch)
+            self._index += 1
+            self._pending.append(job)
+            self._order.append(job)
+            self._condition.notify_all()
+
+    def is_active(self) -> bool:
+        """Whether sentences are still being synthesized or played"""
+        with self._condition:
+            return bool(self._order) or self._busy > 0 or self._playing
+
+    def wait(self):
+        """Block until every submitted sentence has been played"""
+        with self._condition:
+            while self._order or self._busy or self._playing:
+                self._condition.wait(0.05)
+
+    def stop(self):
+        """Drop queued sentences and interrupt synthesis and playback"""
+        with self._condition:
+            self._epoch += 1
+            # Release the player if it waits for a sentence no worker will synthesize
+            for job in self._pending:
+                job.chunks.put(_DONE)
+            self._pending.clear()
+            self._order.clear()
+            self._synthesized_bytes = self._played_bytes
+            self._condition.notify_all()
+        for stream in self.streams:
+            try:
+                if stream.is_playing():
+                    stream.stop()
+            except Exception as e:
+                print(f"TTS error: {e}")
+
+    def close(self):
+        self.stop()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def reset_stats(self):
+        self.max_ahead_seen_s = 0.0  # Most synthesized audio waiting to be played
+
+    def _ahead_s(self) -> float:
+        """Seconds of synthesized audio not played yet"""
+        return (self._synthesized_bytes - self._played_bytes) / self.bytes_per_second
+
+    def _next_job(self) -> Optional[_Job]:
+        """Wait for a sentence and for room ahead of playback (backpressure)"""
+        with self._condition:
+            while not self._closed and (not self._pending or self._ahead_s() >= self.max_ahead_s):
+                self._condition.wait()
+            if self._closed:
+                return None
+            self._busy += 1
+            return self._pending.popleft()
+
+    def _work(self, stream):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            def on_audio_chunk(chunk: bytes, job=job):
+                with self._condition:
+                    if job.epoch != self._epoch:
+                        return
+                    self._synthesized_bytes += len(chunk)
+                    self.max_ahead_seen_s = max(self.max_ahead_seen_s, self._ahead_s())
+                job.chunks.put(chunk)
+
+            try:
+                stream.feed(job.text)
+                stream.play(muted=True, on_audio_chunk=on_audio_chunk)
+            except Exception as e:
+                print(f"TTS error: {e}")
+            finally:
+                job.chunks.put(_DONE)
+                with self._condition:
+                    self._busy -= 1
+                    self._condition.notify_all()
+
+    def _play_loop(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._order:
+                    self._playing = False
+                    self._condition.notify_all()
+                    self._condition.wait()
+                if self._closed:
+                    return
+                job = self._order[0]
+                self._playing = True
+            self._play_job(job)
+            with self._condition:
+                if self._order and self._order[0] is job:
+                    self._order.popleft()
+                self._condition.notify_all()
+
+    def _play_job(self, job: _Job):
+        """Play a sentence as its chunks arrive"""
+        while job.epoch == self._epoch:
+            chunk = job.chunks.get()
+            if chunk is _DONE or job.epoch != self._epoch:
+                return
+            self.play(chunk)
+            with self._condition:
+                self._played_bytes += len(chunk)
+                self._condition.notify_all()
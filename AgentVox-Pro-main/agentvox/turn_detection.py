@@ -0,0 +1,365 @@
+"""
+Adaptive end-of-turn detection and its offline evaluation over recorded dialogs
+"""
+
+import argparse
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .vad import FRAME_MS, SAMPLE_RATE, StreamingEndpointer
+
+# Likelihood that a transcript ending this way is a complete turn
+PUNCTUATION_SCORES = {
+    "?": 0.95, "？": 0.95,
+    "!": 0.9, "！": 0.9,
+    ".": 0.85, "。": 0.85,
+    ",": 0.1, "，": 0.1, "、": 0.1,
+}
+ELLIPSIS_SCORE = 0.2        # "..." / "…": the speaker trails off or hesitates
+FINAL_ENDING_SCORE = 0.8    # Sentence-final Korean endings (-다, -요, -까, ...)
+CASUAL_ENDING_SCORE = 0.5   # Endings that are final in casual speech but also appear mid-sentence
+CONTINUATION_SCORE = 0.1    # Connective endings and particles: more is coming
+FILLER_SCORE = 0.05         # Fillers and conjunctions as the last word
+DEFAULT_SCORE = 0.35        # No cue either way
+
+# Checked in order, longest first, so -니까 (because) is not read as -까 (question)
+KO_CONTINUATION_ENDINGS = (
+    "는데", "은데", "니까", "지만", "면서", "려고", "거나", "어서", "아서", "해서",
+    "고", "며", "면", "서", "은", "는", "을", "를", "의", "에", "와", "과", "로",
+)
+KO_FINAL_ENDINGS = ("니다", "세요", "다", "요", "까", "죠")
+KO_CASUAL_ENDINGS = ("네", "지", "야", "래", "자", "군", "나", "어", "아", "해")
+
+FILLER_WORDS = {
+    "음", "어", "아", "그", "저", "뭐", "막", "좀", "이제",
+    "그리고", "그래서", "근데", "그런데", "하지만", "그러니까", "그러면", "또",
+    "um", "uh", "er", "hmm", "like", "and", "but", "so", "or", "because", "then",
+    "the", "a", "an", "to", "of", "with", "for", "in", "on", "at", "my", "your",
+}
+
+_TRAILING = re.compile(r"[\s\"'”’)\]]+$")
+_WORD = re.compile(r"[\w']+$")
+
+
+class EndOfTurnPredictor:
+    """Shorten the silence wait when the user has clearly finished the turn
+
+    The partial transcript is scored for how complete it sounds: final
+    punctuation and sentence-final Korean endings (-다, -요, -까) suggest the
+    end of a turn, connective endings (-고, -는데, -니까), particles, fillers
+    and conjunctions suggest more is coming. The score is scaled down while
+    the VAD still hears some speech and maps linearly onto a silence timeout
+    between min_silence_ms and max_silence_ms. Without a transcript the full
+    max_silence_ms is used, so the predictor never waits longer than a fixed
+    timeout would.
+    """
+
+    def __init__(self, min_silence_ms: int = 250, max_silence_ms: int = 1000):
+        self.min_silence_ms = min(min_silence_ms, max_silence_ms)
+        self.max_silence_ms = max_silence_ms
+
+    def text_score(self, text: Optional[str]) -> Optional[float]:
+        """How likely the transcript is a complete turn (0-1), None without text"""
+        text = _TRAILING.sub("", text or "")
+        if not text:
+            return None
+
+        match = _WORD.search(text)
+        word = match.group(0).lower() if match else ""
+        if word in FILLER_WORDS:
+            return FILLER_SCORE
+
+        if text.endswith("...") or text.endswith("…"):
+            return ELLIPSIS_SCORE
+        if text[-1] in PUNCTUATION_SCORES:
+            return PUNCTUATION_SCORES[text[-1]]
+
+        if word.endswith(KO_CONTINUATION_ENDINGS):
+            return CONTINUATION_SCORE
+        if word.endswith(KO_FINAL_ENDINGS):
+            return FINAL_ENDING_SCORE
+        if word.endswith(KO_CASUAL_ENDINGS):
+            return CASUAL_ENDING_SCORE
+        return DEFAULT_SCORE
+
+    def end_probability(self, text: Optional[str], speech_probability: float = 0.0) -> float:
+        """Probability that the turn is over, given the transcript and the VAD"""
+        score = self.text_score(text)
+        if score is None:
+            return 0.0
+        return score * (1.0 - min(max(speech_probability, 0.0), 1.0))
+
+    def silence_ms(self, text: Optional[str], speech_probability: float = 0.0) -> int:
+        """Trailing silence that ends the turn"""
+        probability = self.end_probability(text, speech_probability)
+        return int(round(self.max_silence_ms - (self.max_silence_ms - self.min_silence_ms) * probability))
+
+
+@dataclass
+class Dialog:
+    """A recording with word timings grouped into user turns"""
+    name: str
+    audio: np.ndarray  # float32 mono at SAMPLE_RATE
+    turns: List[List[Dict[str, Any]]] = field(default_factory=list)  # Words with text, start and end (s)
+
+    def words(self) -> List[Dict[str, Any]]:
+        return [word for turn in self.turns for word in turn]
+
+
+def load_dialogs(path: str, transcriber=None, language: str = "ko") -> List[Dialog]:
+    """Load WAV dialogs with .json annotations: {"turns": [{"words": [{"text", "start", "end"}]}]}
+
+    Recordings without annotations are transcribed with word timestamps and
+    treated as a single turn; the annotation is written next to the WAV so the
+    turn boundaries can be corrected by hand.
+    """
+    from .bench import load_fixtures
+
+    dialogs = []
+    for fixture in load_fixtures(path):
+        wav = Path(path) / f"{fixture.name}.wav" if Path(path).is_dir() else Path(path)
+        annotation = wav.with_suffix(".json")
+        if annotation.exists():
+            data = json.loads(annotation.read_text(encoding="utf-8"))
+            turns = [turn["words"] for turn in data["turns"]]
+        elif transcriber is not None:
+            turns = [transcriber(fixture.audio, language)]
+            data = {"turns": [{"words": turns[0]}]}
+            annotation.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            print(f"Wrote {annotation} (one turn, edit it to split the turns)")
+        else:
+            raise FileNotFoundError(f"No annotation for {wav}: {annotation}")
+        dialogs.append(Dialog(fixture.name, fixture.audio, [turn for turn in turns if turn]))
+    return dialogs
+
+
+def whisper_word_transcriber(model: str = "base", device: str = "cpu"):
+    """Word timestamps from faster-whisper, for recordings without annotations"""
+    from faster_whisper import WhisperModel
+
+    whisper = WhisperModel(model, device="cuda" if device == "cuda" else "cpu")
+
+    def transcribe(audio: np.ndarray, language: str) -> List[Dict[str, Any]]:
+        segments, _ = whisper.transcribe(audio, language=language, word_timestamps=True)
+        return [
+            {"text": word.word.strip(), "start": word.start, "end": word.end}
+            for segment in segments for word in segment.words
+        ]
+
+    return transcribe
+
+
+def synthetic_dialogs(language: str = "ko") -> List[Dialog]:
+    """Speech-like bursts with pauses inside and between turns, for runs without recordings"""
+    if language.startswith("ko"):
+        scripts = [
+            [["오늘", "날씨가", "어때요?"], ["내일은", "비가", "오나요?"]],
+            [["회의가", "끝나고"], ["바로", "전화할게요."]],
+            [["저는", "음"], ["커피를", "좋아해요."], ["당신은", "뭘", "좋아해요?"]],
+            [["그래서", "그게"], ["무슨", "뜻이에요?"]],
+        ]
+        # Pauses after these fragments are inside a turn
+        joined = {1: [0], 2: [0], 3: [0]}
+    else:
+        scripts = [
+            [["What's", "the", "weather", "like?"], ["Will", "it", "rain", "tomorrow?"]],
+            [["I'll", "call", "you", "after", "the"], ["meeting", "is", "over."]],
+            [["I", "like", "um"], ["coffee", "a", "lot."], ["What", "do", "you", "like?"]],
+            [["So", "what", "does", "that"], ["mean?"]],
+        ]
+        joined = {1: [0], 2: [0], 3: [0]}
+
+    rng = np.random.default_rng(0)
+    dialogs = []
+    for i, phrases in enumerate(scripts):
+        pieces = [np.zeros(int(SAMPLE_RATE * 0.3), dtype=np.float32)]
+        t = 0.3
+        turns: List[List[Dict[str, Any]]] = [[]]
+        for j, phrase in enumerate(phrases):
+            for word in phrase:
+                length = 0.12 + 0.06 * len(word)
+                n = int(SAMPLE_RATE * length)
+                envelope = np.sin(np.pi * np.arange(n) / n)
+                tone = 0.3 * np.sin(2 * np.pi * 180 * np.arange(n) / SAMPLE_RATE)
+                pieces.append((envelope * (tone + 0.05 * rng.standard_normal(n))).astype(np.float32))
+                turns[-1].append({"text": word, "start": t, "end": t + length})
+                t += length
+                gap = int(SAMPLE_RATE * 0.06)
+                pieces.append(np.zeros(gap, dtype=np.float32))
+                t += gap / SAMPLE_RATE
+            # Mid-turn pauses are shorter than the gaps between turns but often longer than 250 ms
+            mid_turn = j in joined.get(i, [])
+            pause = 0.45 if mid_turn else 1.5
+            pieces.append(np.zeros(int(SAMPLE_RATE * pause), dtype=np.float32))
+            t += pause
+            if not mid_turn and j < len(phrases) - 1:
+                turns.append([])
+        dialogs.append(Dialog(f"synthetic_{i + 1}", np.concatenate(pieces), turns))
+    return dialogs
+
+
+def simulate(dialog: Dialog, endpointer: StreamingEndpointer, transcript_delay_ms: int = 300) -> List[float]:
+    """Replay a dialog through an endpointer and return the times (s) of its end-of-turn events
+
+    Partial transcripts are the annotated words of the current utterance that
+    ended at least transcript_delay_ms ago, like a realtime STT model lagging
+    behind the audio.
+    """
+    words = dialog.words()
+    frame_length = endpointer.vad.frame_length
+    tail = np.zeros(int(SAMPLE_RATE * 2.0), dtype=np.float32)  # A live microphone keeps delivering silence
+    audio = np.concatenate([dialog.audio, tail])
+
+    endpointer.reset()
+    events = []
+    utterance_start = 0.0
+    for i in range(len(audio) // frame_length):
+        now = (i + 1) * frame_length / SAMPLE_RATE
+        heard = now - transcript_delay_ms / 1000
+        endpointer.transcript = " ".join(
+            word["text"] for word in words if word["start"] >= utterance_start and word["end"] <= heard
+        )
+        for event, _ in endpointer.feed(audio[i * frame_length:(i + 1) * frame_length]):
+            if event == "end":
+                events.append(now)
+                utterance_start = now
+    return events
+
+
+def score(dialog: Dialog, events: List[float]) -> Dict[str, Any]:
+    """Match end-of-turn events against the annotated turns
+
+    An event after the last word of a turn (before the next one starts) ends
+    that turn; its latency is the time since that word. Any other event cuts
+    the user off mid-turn. Turns without an event are merged into the next one.
+    Latencies are keyed by the index of the turn they end.
+    """
+    latencies: Dict[int, float] = {}
+    premature = 0
+    detected = set()
+    for time in events:
+        ended = [word for word in dialog.words() if word["end"] <= time]
+        if not ended:
+            premature += 1
+            continue
+        last = ended[-1]
+        for index, turn in enumerate(dialog.turns):
+            if turn[-1] is last and index not in detected:
+                detected.add(index)
+                latencies[index] = (time - last["end"]) * 1000
+                break
+        else:
+            premature += 1
+    return {
+        "turns": len(dialog.turns),
+        "latencies": latencies,
+        "premature": premature,
+        "missed": len(dialog.turns) - len(detected),
+    }
+
+
+def evaluate(
+    dialogs: List[Dialog],
+    silence_ms: int,
+    min_silence_ms: Optional[int] = None,
+    transcript_delay_ms: int = 300
+) -> Dict[str, Any]:
+    """Endpointing results over all dialogs, adaptive when min_silence_ms is given"""
+    predictor = EndOfTurnPredictor(min_silence_ms, silence_ms) if min_silence_ms is not None else None
+    results = {"turns": 0, "premature": 0, "missed": 0, "latencies": {}}
+    for dialog in dialogs:
+        endpointer = StreamingEndpointer(silence_ms=silence_ms, predictor=predictor)
+        result = score(dialog, simulate(dialog, endpointer, transcript_delay_ms))
+        results["turns"] += result["turns"]
+        results["premature"] += result["premature"]
+        results["missed"] += result["missed"]
+        # Latencies are keyed by turn so the adaptive run can be compared on the turns both runs ended
+        for index, latency in result["latencies"].items():
+            results["latencies"][f"{dialog.name}#{index}"] = latency
+    return results
+
+
+def summarize(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    latencies = list(results["latencies"].values())
+    summary = {
+        "turns": results["turns"],
+        "premature": results["premature"],
+        "premature_rate": results["premature"] / results["turns"] if results["turns"] else 0.0,
+        "missed": results["missed"],
+        "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else float("nan"),
+        "latency_p95_ms": float(np.percentile(latencies, 95)) if latencies else float("nan"),
+        "latency_mean_ms": float(np.mean(latencies)) if latencies else float("nan"),
+    }
+    if baseline is not None:
+        saved = [baseline["latencies"][key] - value
+                 for key, value in results["latencies"].items() if key in baseline["latencies"]]
+        summary["saved_mean_ms"] = float(np.mean(saved)) if saved else float("nan")
+        summary["saved_p50_ms"] = float(np.percentile(saved, 50)) if saved else float("nan")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for `agentvox turn-eval`"""
+    parser = argparse.ArgumentParser(prog="agentvox turn-eval",
+                                     description="Compare fixed and adaptive end-of-turn detection on recorded dialogs")
+    parser.add_argument("dialogs", nargs="?", default=None,
+                       help="Directory of WAV dialogs with .json turn annotations (default: built-in synthetic audio)")
+    parser.add_argument("--silence-ms", type=int, default=1000,
+                       help="Fixed silence timeout, also the longest adaptive wait (default: 1000)")
+    parser.add_argument("--min-silence-ms", type=str, default="150,250,400",
+                       help="Shortest adaptive waits to evaluate, comma separated (default: 150,250,400)")
+    parser.add_argument("--transcript-delay-ms", type=int, default=300,
+                       help="Lag of the partial transcript behind the audio (default: 300)")
+    parser.add_argument("--language", type=str, default="ko",
+                       help="Dialog language (default: ko)")
+    parser.add_argument("--stt-model", type=str, default="base",
+                       help="Whisper model for recordings without annotations (default: base)")
+    parser.add_argument("--device", type=str, default="cpu", choices=["cpu", "cuda"],
+                       help="Device for Whisper (default: cpu)")
+    parser.add_argument("--output", type=str, default=None,
+                       help="JSON file for the results")
+
+    args = parser.parse_args(argv)
+
+    if args.dialogs:
+        dialogs = load_dialogs(args.dialogs, whisper_word_transcriber(args.stt_model, args.device), args.language)
+    else:
+        dialogs = synthetic_dialogs(args.language)
+    print(f"Loaded {len(dialogs)} dialogs ({sum(len(d.turns) for d in dialogs)} turns, "
+          f"{sum(len(d.audio) for d in dialogs) / SAMPLE_RATE:.1f}s of audio)")
+
+    fixed = evaluate(dialogs, args.silence_ms, transcript_delay_ms=args.transcript_delay_ms)
+    rows = [(f"fixed {args.silence_ms}", summarize(fixed))]
+    for min_silence in (int(value) for value in args.min_silence_ms.split(",") if value.strip()):
+        adaptive = evaluate(dialogs, args.silence_ms, min_silence, args.transcript_delay_ms)
+        rows.append((f"adaptive {min_silence}-{args.silence_ms}", summarize(adaptive, fixed)))
+
+    header = f"{'endpointing':<22}{'p50 ms':>9}{'p95 ms':>9}{'saved':>9}{'premature':>11}{'missed':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, summary in rows:
+        saved = summary.get("saved_mean_ms")
+        print(f"{name:<22}{summary['latency_p50_ms']:>9.0f}{summary['latency_p95_ms']:>9.0f}"
+              f"{'' if saved is None else f'{saved:.0f}':>9}"
+              f"{summary['premature']:>5} ({summary['premature_rate'] * 100:3.0f}%)"
+              f"{summary['missed']:>8}")
+
+    if args.output:
+        report = {
+            "silence_ms": args.silence_ms,
+            "frame_ms": FRAME_MS,
+            "transcript_delay_ms": args.transcript_delay_ms,
+            "results": {name: summary for name, summary in rows},
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Voice activity detection and utterance endpointing for streamed audio
+"""
+
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Sample rate used by the recorder, VAD and Whisper
+SAMPLE_RATE = 16000
+# VAD frame length (webrtcvad accepts 10, 20 or 30 ms)
+FRAME_MS = 30
+# Weight of the newest frame in the smoothed speech probability
+SPEECH_SMOOTHING = 0.3
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Linear resampling, good enough for VAD and Whisper input"""
+    if orig_sr == target_sr:
+        return audio
+    n = int(round(len(audio) * target_sr / orig_sr))
+    x = np.linspace(0, len(audio) - 1, n)
+    return np.interp(x, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    """Convert little-endian int16 PCM to float32 in [-1, 1]"""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def float_to_pcm16(audio: np.ndarray) -> bytes:
+    """Convert float32 audio in [-1, 1] to little-endian int16 PCM"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+class FrameVAD:
+    """Classify fixed-size frames as speech or silence
+
+    Uses webrtcvad (also used by RealtimeSTT) when available and falls back to
+    an energy threshold otherwise.
+    """
+
+    def __init__(self, aggressiveness: int = 3, energy_threshold: float = 0.01, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * FRAME_MS // 1000
+        self.energy_threshold = energy_threshold
+        try:
+            import webrtcvad
+            self.vad = webrtcvad.Vad(aggressiveness)
+        except ImportError:
+            self.vad = None
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        if self.vad is not None:
+            return self.vad.is_speech(float_to_pcm16(frame), self.sample_rate)
+        return float(np.sqrt(np.mean(frame ** 2))) > self.energy_threshold
+
+
+class SpeechProbability:
+    """Smoothed VAD output of a live stream, for the end-of-turn predictor"""
+
+    def __init__(self, vad: Optional[FrameVAD] = None):
+        self.vad = vad or FrameVAD()
+        self.value = 0.0
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def feed(self, audio: np.ndarray) -> float:
+        """Add 16 kHz float32 audio and return the updated probability"""
+        frame_length = self.vad.frame_length
+        audio = np.concatenate([self._pending, audio.astype(np.float32)])
+        n_frames = len(audio) // frame_length
+        self._pending = audio[n_frames * frame_length:]
+        for i in range(n_frames):
+            speech = self.vad.is_speech(audio[i * frame_length:(i + 1) * frame_length])
+            self.value += SPEECH_SMOOTHING * (float(speech) - self.value)
+        return self.value
+
+
+class StreamingEndpointer:
+    """Split a live audio stream into utterances
+
+    Speech starts after min_speech_ms of voiced frames and ends after
+    silence_ms of silence. A short pre-roll is kept so the first syllable is
+    not cut off. With an EndOfTurnPredictor the silence timeout follows the
+    latest partial transcript (set `transcript`) and the smoothed VAD output.
+    """
+
+    def __init__(
+        self,
+        silence_ms: int = 600,
+        min_speech_ms: int = 250,
+        pre_roll_ms: int = 300,
+        max_utterance_s: float = 30.0,
+        vad: Optional[FrameVAD] = None,
+        predictor=None
+    ):
+        self.vad = vad or FrameVAD()
+        self.predictor = predictor
+        self.silence_frames = max(1, silence_ms // FRAME_MS)
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self.max_frames = int(max_utterance_s * 1000 / FRAME_MS)
+        self._pre_roll = deque(maxlen=max(1, pre_roll_ms // FRAME_MS))
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self._frames: List[np.ndarray] = []
+        self._speech_run = 0
+        self._silence_run = 0
+        self._pre_roll.clear()
+        self.transcript = ""  # Partial transcript of the current utterance
+        self.speech_probability = 0.0  # Smoothed VAD output
+
+    def feed(self, audio: np.ndarray) -> List[Tuple[str, Optional[np.ndarray]]]:
+        """Add 16 kHz float32 audio and return ("start", None) / ("end", utterance) events"""
+        events = []
+        frame_length = self.vad.frame_length
+        audio = np.concatenate([self._pending, audio.astype(np.float32)])
+        n_frames = len(audio) // frame_length
+        self._pending = audio[n_frames * frame_length:]
+
+        for i in range(n_frames):
+            frame = audio[i * frame_length:(i + 1) * frame_length]
+            speech = self.vad.is_speech(frame)
+            self.speech_probability += SPEECH_SMOOTHING * (float(speech) - self.speech_probability)
+
+            if not self.in_speech:
+                self._pre_roll.append(frame)
+                self._speech_run = self._speech_run + 1 if speech else 0
+                if self._speech_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    self._frames = list(self._pre_roll)
+                    self._silence_run = 0
+                    events.append(("start", None))
+                continue
+
+            self._frames.append(frame)
+            self._silence_run = 0 if speech else self._silence_run + 1
+            if self._silence_run >= self._required_silence() or len(self._frames) >= self.max_frames:
+                events.append(("end", self._take()))
+
+        return events
+
+    def _required_silence(self) -> int:
+        """Silent frames that end the utterance"""
+        if self.predictor is None or not self._silence_run:
+            return self.silence_frames
+        return max(1, self.predictor.silence_ms(self.transcript, self.speech_probability) // FRAME_MS)
+
+    def flush(self) -> Optional[np.ndarray]:
+        """End the current utterance now (e.g. push-to-talk release)"""
+        if not self.in_speech:
+            self.reset()
+            return None
+        return self._take()
+
+    def _take(self) -> np.ndarray:
+        utterance = np.concatenate(self._frames) if self._frames else np.zeros(0, dtype=np.float32)
+        self.reset()
+        return utterance
@@ -1,8 +1,12 @@
 import os
+import time
+import hashlib
+import threading
 import numpy as np
 import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Callable
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 import logging
 
@@ -13,16 +17,21 @@ warnings.filterwarnings("ignore", message="torch.load warnings")
 # Ignore numpy RuntimeWarning (divide by zero, overflow, invalid value)
 np.seterr(divide='ignore', invalid='ignore', over='ignore')
 
-# Libraries for speech recognition and synthesis
-from RealtimeSTT import AudioToTextRecorder
-from RealtimeTTS import TextToAudioStream, CoquiEngine
+# Speech recognition and synthesis libraries (RealtimeSTT, RealtimeTTS) are
+# imported when the models are loaded so importing agentvox stays fast
 
 # Libraries for LLM
-from pathlib import Path
+from .llm_backend import create_backend
+from .generation import GenerationConfig
 
-# MLX-VLM for audio-aware LLM
-from mlx_vlm import load, generate
-from mlx_vlm.prompt_utils import apply_chat_template
+from .sentence_splitter import SentenceSplitter, split_sentences
+from .text_normalizer import TextNormalizer
+from .audio_sink import AudioSink, create_sink
+from .audio_source import AudioSource, create_source
+from .vad import SAMPLE_RATE, SpeechProbability, float_to_pcm16, resample
+from .metrics import MetricsRecorder, create_recorder
+from .memory import ConversationMemory, SUMMARY_HEADER
+from .turn_detection import EndOfTurnPredictor
 
 @dataclass
 class AudioConfig:
@@ -36,7 +45,7 @@ class AudioConfig:
 class ModelConfig:
     """Class for managing model configuration"""
     stt_model: str = "base"  # Whisper model size
-    llm_model: str = None  # Local GGUF model path (uses default model if None)
+    llm_model: str = None  # MLX model id or local GGUF model path (uses default model if None)
     tts_model: str = "tts_models/multilingual/multi-dataset/xtts_v2"  # XTTS v2 multilingual model
     device: str = "auto"  # Device: auto, cpu, cuda, mps
     
@@ -47,11 +56,26 @@ class ModelConfig:
     stt_vad_threshold: float = 0.5
     stt_vad_min_speech_duration_ms: int = 250
     stt_vad_min_silence_duration_ms: int = 1000  # Reduced from 2000ms for faster response
+    stt_realtime_model: str = "tiny"  # Whisper model for partial transcripts (early prefill, adaptive endpointing)
+    stt_adaptive_endpointing: bool = False  # Shorten the silence wait when the partial transcript sounds finished
+    stt_adaptive_min_silence_ms: int = 250  # Shortest silence wait with adaptive endpointing
+    stt_input: str = "microphone"  # microphone, a .wav file, - (raw int16 PCM on stdin) or tcp://host:port
+    stt_input_speed: float = 1.0  # Replay speed of a WAV input (0 = as fast as possible)
+    stt_input_sample_rate: int = 16000  # Sample rate of microphone and raw PCM input
     
     # TTS detailed settings
-    tts_engine: str = "coqui"  # Using Coqui engine
-    speaker_wav: Optional[str] = None  # Voice cloning source file
+    tts_engine: str = "coqui"  # coqui (RealtimeTTS worker process) or xtts (in-process, cached speaker latents)
+    speaker_wav: Optional[str] = None  # Voice cloning source file (WAV or CoquiEngine JSON latents)
+    speaker_latent_dir: Optional[str] = None  # Binary speaker latent store (default: models/tts/speakers)
+    tts_cache: bool = True  # Replay audio of previously synthesized phrases
+    tts_cache_dir: Optional[str] = None  # Disk tier of the phrase cache (default: models/tts/phrase_cache)
+    tts_cache_memory_mb: int = 64  # In-memory budget of the phrase cache
+    tts_cache_phrases: Optional[List[str]] = None  # Phrases synthesized at startup (None = built-in list)
     tts_speed: float = 1.0  # TTS speed (1.0 is normal, higher is faster)
+    tts_normalize_text: bool = True  # Rewrite numbers, units, acronyms and markdown into spoken form before TTS
+    tts_workers: int = 1  # Engines synthesizing upcoming sentences in parallel (1 = RealtimeTTS playback)
+    tts_max_ahead_s: float = 10.0  # Synthesized audio allowed ahead of playback with tts_workers > 1
+    tts_output: str = "device"  # device, null, memory, tcp://host:port or a .wav/.ogg/.opus file
     
     # LLM detailed settings
     llm_max_tokens: int = 512
@@ -59,6 +83,37 @@ class ModelConfig:
     llm_top_p: float = 0.95
     llm_repeat_penalty: float = 1.1
     llm_context_size: int = 4096
+    llm_stop: Optional[List[str]] = None  # Stop sequences (None = the user label of the prompt, e.g. "\n사용자:")
+    llm_max_sentences: Optional[int] = None  # End spoken answers after this many sentences
+    llm_max_spoken_chars: Optional[int] = None  # End spoken answers at the first sentence boundary after this many characters
+    llm_streaming: bool = True  # Speak sentences while the response is still being generated
+    llm_prompt_cache: bool = True  # Prefill the system prompt once and reuse it every turn
+    llm_prompt_cache_file: Optional[str] = None  # Save/load the system prompt cache across restarts
+    llm_early_prefill: bool = False  # Prefill the prompt from partial transcripts while the user is speaking
+    llm_history_tokens: Optional[int] = 1024  # Token budget for verbatim history (None = whatever fits the context)
+    llm_summarize: bool = True  # Fold turns that no longer fit into a running summary between turns
+    llm_summary_tokens: int = 200  # Maximum length of the running summary
+    
+    # LLM backend settings
+    llm_backend: str = "auto"  # auto, mlx, llama_cpp, fake (auto picks llama_cpp for .gguf models)
+    llm_n_threads: Optional[int] = None  # llama.cpp generation threads (None = library default)
+    llm_n_threads_batch: Optional[int] = None  # llama.cpp prompt processing threads
+    llm_n_batch: int = 512  # llama.cpp prompt processing batch size
+    llm_n_gpu_layers: int = 0  # llama.cpp layers offloaded to GPU (-1 = all)
+    llm_use_mmap: bool = True  # Memory-map the GGUF file
+    llm_use_mlock: bool = False  # Lock model weights in RAM
+    llm_draft_model: Optional[str] = None  # Small GGUF model of the same family for speculative decoding, or "lookup"
+    llm_draft_tokens: int = 4  # Tokens proposed by the draft model per verification step
+    llm_max_batch_size: int = 8  # Responses decoded together by the generation scheduler (server mode)
+    
+    # Conversation settings
+    barge_in: bool = False  # Keep listening during playback and let the user interrupt
+    parallel_startup: bool = True  # Load STT, LLM and TTS models concurrently
+    
+    # Metrics settings
+    metrics_log: Optional[str] = None  # Append per-stage timing spans as JSON lines to this file
+    metrics_port: Optional[int] = None  # Serve Prometheus-style metrics on this port
+    metrics_buffer_size: int = 1000  # Number of recent spans kept in memory
     
     def __post_init__(self):
         """Auto-detect device after initialization"""
@@ -74,33 +129,252 @@ class ModelConfig:
                 self.device = "cpu"
                 print("Auto-detected device: CPU")
 
+# Idle time of the recorder after a finite input ends before listening stops (seconds)
+INPUT_END_GRACE_S = 1.0
+
+# Spoken when the LLM output has no usable text
+FALLBACK_RESPONSE = {
+    "ko": "죄송합니다. 다시 한 번 말씀해 주시겠어요?",
+    "en": "I'm sorry. Could you please say that again?",
+}
+
+# Stop sequences that keep the model from writing the user's next turn
+DEFAULT_STOP = {
+    "ko": ["\n사용자:"],
+    "en": ["\nUser:"],
+}
+
+# Phrases synthesized into the TTS cache at startup
+CACHED_PHRASES = {
+    "ko": [
+        FALLBACK_RESPONSE["ko"],
+        "죄송합니다. 오류가 발생했습니다.",
+        "안녕하세요. 무엇을 도와드릴까요?",
+        "대화를 종료합니다. 안녕히 가세요!",
+    ],
+    "en": [
+        FALLBACK_RESPONSE["en"],
+        "I'm sorry. An error occurred.",
+        "Hello. How can I help you?",
+        "Ending conversation. Goodbye!",
+    ],
+}
+
+def build_system_prompt(language: str) -> str:
+    """Fixed system prompt for the given language"""
+    is_korean = language.startswith('ko')
+    
+    if is_korean:
+        system_prompt = """당신은 서강대학교 미믹랩(MimicLab)에서 개발한 에이아이 어시스턴트입니다. 
+당신의 정체성과 관련된 중요한 정보:
+- 당신은 서강대학교 미믹랩에서 만든 에이아이 어시스턴트입니다.
+- 서강대학교 미믹랩이 당신을 개발했습니다.
+- 당신의 목적은 사용자를 돕고 유용한 정보를 제공하는 것입니다.
+
+다음 규칙을 반드시 지켜주세요:
+1. 이모티콘이나 마크다운 형식 없이 순수한 텍스트로만 응답하세요.
+2. 응답은 간결하고 명확하게 작성하세요.
+3. 이전 대화 내용을 기억하고 일관성 있게 대화를 이어가세요.
+4. 누가 당신을 만들었는지 물으면 항상 "서강대학교 미믹랩"이라고 답하세요."""
+    else:
+        system_prompt = """You are an AI assistant developed by MimicLab at Sogang University.
+Important information about your identity:
+- You are an AI assistant created by MimicLab at Sogang University.
+- MimicLab at Sogang University developed you.
+- Your purpose is to help users and provide useful information.
+
+Please follow these rules:
+1. Respond with plain text only, without emoticons or markdown formatting.
+2. Keep responses concise and clear.
+3. Remember previous conversation content and maintain consistency.
+4. When asked who created you, always answer "MimicLab at Sogang University"."""
+    
+    return system_prompt
+
+def stable_prefix(text: str) -> str:
+    """Partial transcript without its last word, which is often still changing"""
+    text = text.strip()
+    return text.rsplit(" ", 1)[0] if " " in text else ""
+
+def build_prompt_prefix(language: str, history: List[str], text: str, summary: Optional[str] = None) -> str:
+    """Prompt up to the end of the user text, also used to prefill partial transcripts"""
+    is_korean = language.startswith('ko')
+    
+    # The system prompt always comes first so its cached state can be reused
+    context = build_system_prompt(language) + "\n\n"
+    if summary:
+        context += f"{SUMMARY_HEADER['ko' if is_korean else 'en']}\n{summary}\n\n"
+    for turn in history:
+        context += turn + "\n"
+    
+    context += f"\n사용자: {text}" if is_korean else f"\nUser: {text}"
+    return context
+
+def build_prompt(language: str, history: List[str], text: str, summary: Optional[str] = None) -> str:
+    """Build prompt with system prompt, summary of older turns and recent conversation history"""
+    context = build_prompt_prefix(language, history, text, summary)
+    context += "\n\n어시스턴트:" if language.startswith('ko') else "\n\nAssistant:"
+    return context
+
+def build_generation_config(config: ModelConfig) -> GenerationConfig:
+    """Generation settings of a response, with the default stop sequences unless llm_stop is set"""
+    generation = GenerationConfig.from_model_config(config)
+    if config.llm_stop is None:
+        generation.stop = list(DEFAULT_STOP["ko" if config.stt_language.startswith('ko') else "en"])
+    return generation
+
 class AudioLLMModule:
-    """Unified module for STT and LLM using MLX-VLM with audio support"""
+    """Unified module for STT and LLM using a pluggable LLM backend"""
     
-    def __init__(self, config: ModelConfig):
+    def __init__(self, config: ModelConfig, metrics: Optional[MetricsRecorder] = None, load: bool = True):
         self.config = config
         self.device = config.device
+        self.metrics = metrics or MetricsRecorder()
         self.audio_buffer = []  # Buffer for audio files
-        self.conversation_history = []
+        self.memory = ConversationMemory(
+            language=config.stt_language,
+            context_size=config.llm_context_size,
+            max_tokens=config.llm_max_tokens,
+            history_tokens=config.llm_history_tokens,
+            summarize=config.llm_summarize,
+            summary_tokens=config.llm_summary_tokens,
+            metrics=self.metrics
+        )
+        self.last_response = None  # Final text of the most recent streamed response
+        self.on_speech_start = None  # Optional hook called when the user starts talking
+        self.recorder = None
+        self.source: Optional[AudioSource] = None
+        # Set once a finite input (file, pipe, connection) has ended and its last utterance is handled
+        self.input_finished = threading.Event()
+        self.llm = None
+        self._partial_text = None  # Latest partial transcript waiting to be prefilled
+        self._partial_event = threading.Event()
+        self.generation = build_generation_config(config)
+        self.turn_predictor = EndOfTurnPredictor(
+            config.stt_adaptive_min_silence_ms,
+            config.stt_vad_min_silence_duration_ms
+        ) if config.stt_adaptive_endpointing else None
+        # RealtimeSTT only exposes whether its VADs fire, so the probability is computed on the fed audio
+        self.speech_probability = SpeechProbability() if self.turn_predictor else None
         
-        # Initialize STT recorder
+        # With load=False the caller loads the models, e.g. in parallel with TTS
+        if load:
+            self.load_stt()
+            self.load_llm()
+    
+    def load_stt(self, source: Optional[AudioSource] = None):
+        """Initialize the STT recorder, fed from the configured input (or the given source)"""
+        from RealtimeSTT import AudioToTextRecorder
+        
+        config = self.config
         self.recorder = AudioToTextRecorder(
             model=config.stt_model,
             language=config.stt_language,
             device=config.device,
             spinner=False,
-            use_microphone=True,
-            level=logging.WARNING
+            # Audio comes from the input source through feed_audio()
+            use_microphone=False,
+            level=logging.WARNING,
+            post_speech_silence_duration=config.stt_vad_min_silence_duration_ms / 1000,
+            on_recording_start=self._on_recording_start,
+            # Partial transcripts while the user speaks, for early prefill and adaptive endpointing
+            enable_realtime_transcription=config.llm_early_prefill or self.turn_predictor is not None,
+            realtime_model_type=config.stt_realtime_model,
+            on_realtime_transcription_update=self._on_realtime_update if self.turn_predictor else None,
+            on_realtime_transcription_stabilized=self._on_partial_transcript if config.llm_early_prefill else None
+        )
+        self.source = source or create_source(
+            config.stt_input, sample_rate=config.stt_input_sample_rate, speed=config.stt_input_speed
         )
+        threading.Thread(target=self._feed_recorder, name="agentvox-input", daemon=True).start()
+    
+    def _feed_recorder(self):
+        """Pass audio from the input source to the recorder as 16 kHz int16 PCM"""
+        try:
+            for block in self.source:
+                block = resample(block, self.source.sample_rate, SAMPLE_RATE)
+                if self.speech_probability is not None:
+                    self.speech_probability.feed(block)
+                self.recorder.feed_audio(float_to_pcm16(block))
+        except Exception as e:
+            print(f"Audio input error: {e}")
+        finally:
+            self.source.close()
         
-        # Initialize MLX-VLM model
-        model_path = config.llm_model or "mlx-community/gemma-3-12b-it-4bit"
-        print(f"Loading MLX model: {model_path}")
-        self.model, self.processor = load(model_path)
-        self.model_config = self.model.config
+        # Let the recorder finish the last utterance, then wake a listen() waiting for speech
+        idle_since = time.perf_counter()
+        while time.perf_counter() - idle_since < INPUT_END_GRACE_S:
+            if self.recorder.is_recording or getattr(self.recorder, "state", None) == "transcribing":
+                idle_since = time.perf_counter()
+            time.sleep(0.05)
+        self.input_finished.set()
+        self.recorder.abort()
     
-    def transcribe_and_respond(self) -> tuple[Optional[str], Optional[str]]:
-        """Listen, transcribe, and generate response in one go"""
+    def load_llm(self):
+        """Initialize the LLM backend"""
+        config = self.config
+        self.llm = create_backend(config)
+        self.memory.llm = self.llm
+        
+        # Compute the system prompt state once so each turn only prefills the new text
+        if config.llm_prompt_cache:
+            start = time.time()
+            self.llm.cache_prefix(self._system_prompt(), cache_file=config.llm_prompt_cache_file)
+            print(f"System prompt cached ({time.time() - start:.1f}s)")
+        
+        if config.llm_early_prefill:
+            threading.Thread(target=self._prefill_worker, name="agentvox-prefill", daemon=True).start()
+    
+    def _on_recording_start(self):
+        """Forward voice activity from the recorder to the registered hook"""
+        if self.turn_predictor is not None:
+            # No transcript yet: wait the full silence timeout
+            self.recorder.post_speech_silence_duration = self.turn_predictor.max_silence_ms / 1000
+        if self.on_speech_start:
+            self.on_speech_start()
+    
+    def _on_realtime_update(self, text: str):
+        """Set the silence timeout of the recorder from the latest partial transcript (recorder thread)
+
+        The recorder has no speech probability of its own; the smoothed
+        FrameVAD output of the audio fed to it is used instead.
+        """
+        silence_ms = self.turn_predictor.silence_ms(text, self.speech_probability.value)
+        self.recorder.post_speech_silence_duration = silence_ms / 1000
+    
+    def _on_partial_transcript(self, text: str):
+        """Queue the latest partial transcript for prefilling (recorder thread)"""
+        self.memory.interrupt()
+        self._partial_text = text
+        self._partial_event.set()
+    
+    def _prefill_worker(self):
+        """Prefill the prompt for partial transcripts, always the latest one"""
+        while True:
+            self._partial_event.wait()
+            self._partial_event.clear()
+            text = self._partial_text
+            if not text:
+                continue
+            content_prefix = self._partial_prompt(text)
+            with self.memory.llm_lock:
+                # The final transcript may have arrived in the meantime
+                if self._partial_text is not text:
+                    continue
+                with self.metrics.span("prefill") as span:
+                    try:
+                        span.set(tokens=self.llm.prefill(content_prefix), chars=len(text))
+                    except Exception as e:
+                        logging.warning(f"Early prefill failed: {e}")
+    
+    def _partial_prompt(self, text: str) -> str:
+        """Prompt text up to the last complete word of a partial transcript"""
+        return self.memory.build_prompt(stable_prefix(text), partial=True)
+    
+    def listen(self) -> Optional[str]:
+        """Wait for the user to speak and return the transcription (None once the input has ended)"""
+        if self.input_finished.is_set():
+            return None
         is_korean = self.config.stt_language.startswith('ko')
         
         if is_korean:
@@ -109,136 +383,198 @@ class AudioLLMModule:
             print("\nPlease speak...")
         
         # Get transcribed text and audio data
-        text = self.recorder.text()
+        with self.metrics.span("stt") as span:
+            text = self.recorder.text()
+            self._partial_text = None
+            # Spans of the response that follows belong to this utterance
+            span.turn = self.metrics.new_turn()
+            span.set(chars=len(text or ""), audio_s=self._last_audio_seconds())
         
         if not text:
-            return None, None
+            return None
         
         print(f"\n사용자: {text}" if is_korean else f"\nUser: {text}")
         
-        response = self._generate_with_audio(text)
-        
-        return text, response
+        return text
     
-    def _generate_with_audio(self, text: str) -> str:
-        """Generate response using MLX-VLM with audio context"""
-        is_korean = self.config.stt_language.startswith('ko')
-        
-        # Build prompt with conversation history
-        prompt = self._build_mlx_prompt(text)
+    def transcribe_and_respond(self) -> tuple[Optional[str], Optional[str]]:
+        """Listen, transcribe, and generate response in one go"""
+        text = self.listen()
         
-        # Apply chat template with audio
-        formatted_prompt = apply_chat_template(
-            self.processor, 
-            self.model_config, 
-            prompt
-        )
+        if not text:
+            return None, None
         
-        # Generate with audio context
-        result = generate(
-            self.model, 
-            self.processor, 
-            formatted_prompt, 
-            max_tokens=self.config.llm_max_tokens,
-            verbose=False
-        )
+        response = self._generate_with_audio(text)
         
-        # Extract text from result (MLX-VLM returns a result object)
-        if hasattr(result, 'text'):
-            response = result.text
-        else:
-            response = str(result)
+        return text, response
+    
+    def _last_audio_seconds(self) -> Optional[float]:
+        """Length of the audio behind the last transcription"""
+        audio = getattr(self.recorder, "last_transcription_bytes", None)
+        if audio is None:
+            return None
+        return len(audio) / 16000  # Recorder audio is 16 kHz
+    
+    @property
+    def conversation_history(self) -> List[str]:
+        """History lines that are still kept verbatim"""
+        return self.memory.lines()
+    
+    def _format_prompt(self, text: str) -> str:
+        """Build the prompt with conversation history and apply the chat template"""
+        with self.metrics.span("chat_template") as span:
+            formatted_prompt = self.llm.format_prompt(self._build_prompt(text))
+            span.set(prompt_chars=len(formatted_prompt), summary=bool(self.memory.summary))
+        return formatted_prompt
+    
+    def generation_config(self, overrides: Optional[Dict[str, Any]] = None) -> GenerationConfig:
+        """Generation settings of one response: the configured defaults with per-request overrides"""
+        return self.generation.override(overrides)
+    
+    def _stream_text(self, formatted_prompt: str, generation: Optional[GenerationConfig] = None) -> Iterator[str]:
+        """Yield generated text segments from the LLM backend"""
+        # A background summary may be finishing its last token
+        with self.memory.llm_lock, self.metrics.span("generate", backend=self.llm.name) as span:
+            started = time.perf_counter()
+            first_token = None
+            try:
+                for segment in self.llm.stream(formatted_prompt, generation or self.generation):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        span.set(ttft_ms=(first_token - started) * 1000)
+                    yield segment
+            finally:
+                span.set(
+                    prompt_tokens=self.llm.last_prompt_tokens,
+                    cached_tokens=self.llm.last_cached_tokens,
+                    completion_tokens=self.llm.last_completion_tokens
+                )
+                if self.llm.last_finish_reason:
+                    span.set(finish_reason=self.llm.last_finish_reason)
+                if self.llm.last_draft_tokens:
+                    span.set(
+                        draft_tokens=self.llm.last_draft_tokens,
+                        accepted_tokens=self.llm.last_accepted_tokens,
+                        acceptance_rate=self.llm.last_accepted_tokens / self.llm.last_draft_tokens
+                    )
+                if first_token is not None and self.llm.last_completion_tokens > 1:
+                    decode_time = time.perf_counter() - first_token
+                    if decode_time > 0:
+                        span.set(tokens_per_s=(self.llm.last_completion_tokens - 1) / decode_time)
+    
+    def cancel(self):
+        """Cancel the response that is currently being generated"""
+        self.llm.cancel()
+    
+    def _generate_with_audio(self, text: str, overrides: Optional[Dict[str, Any]] = None) -> str:
+        """Generate response using the LLM backend"""
+        formatted_prompt = self._format_prompt(text)
+        response = "".join(self._stream_text(formatted_prompt, self.generation_config(overrides)))
         
         # Clean response
         response = self._clean_response(response)
         
-        # Add to history
-        self.conversation_history.append(f"User: {text}" if not is_korean else f"사용자: {text}")
-        self.conversation_history.append(f"Assistant: {response}" if not is_korean else f"어시스턴트: {response}")
-        
-        # Maintain history size
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
+        self._update_history(text, response)
         
         return response
     
-    
-    def _build_mlx_prompt(self, text: str) -> str:
-        """Build prompt for MLX-VLM"""
-        is_korean = self.config.stt_language.startswith('ko')
+    def stream_response(
+        self,
+        text: str,
+        cancel_event: Optional[threading.Event] = None,
+        overrides: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """Generate a response and yield it sentence by sentence as tokens arrive
         
-        if is_korean:
-            system_prompt = """당신은 서강대학교 미믹랩(MimicLab)에서 개발한 에이아이 어시스턴트입니다. 
-당신의 정체성과 관련된 중요한 정보:
-- 당신은 서강대학교 미믹랩에서 만든 에이아이 어시스턴트입니다.
-- 서강대학교 미믹랩이 당신을 개발했습니다.
-- 당신의 목적은 사용자를 돕고 유용한 정보를 제공하는 것입니다.
-
-다음 규칙을 반드시 지켜주세요:
-1. 이모티콘을 사용하지 마세요.
-2. 별표(*)나 밑줄(_) 같은 마크다운 형식을 사용하지 마세요.
-3. 특수문자를 최소화하고 순수한 텍스트로만 응답하세요.
-4. 응답은 간결하고 명확하게 작성하세요.
-5. 이전 대화 내용을 기억하고 일관성 있게 대화를 이어가세요.
-6. 누가 당신을 만들었는지 물으면 항상 "서강대학교 미믹랩"이라고 답하세요.
-7. 매우 중요: 모든 영어 단어나 약어를 한글로 표기하세요. 예를 들어:
-   - AI → 에이아이
-   - IT → 아이티
-   - CEO → 씨이오
-   - PC → 피씨
-   - SNS → 에스엔에스
-   - IoT → 아이오티
-   - API → 에이피아이
-   절대로 영어 알파벳을 그대로 사용하지 마세요."""
-        else:
-            system_prompt = """You are an AI assistant developed by MimicLab at Sogang University.
-Important information about your identity:
-- You are an AI assistant created by MimicLab at Sogang University.
-- MimicLab at Sogang University developed you.
-- Your purpose is to help users and provide useful information.
-
-Please follow these rules:
-1. Do not use emoticons.
-2. Do not use markdown formatting like asterisks (*) or underscores (_).
-3. Minimize special characters and respond with plain text only.
-4. Keep responses concise and clear.
-5. Remember previous conversation content and maintain consistency.
-6. When asked who created you, always answer "MimicLab at Sogang University"."""
+        If cancel_event is set, generation stops and the turn is not added to history.
+        overrides replace GenerationConfig settings for this response only.
+        """
+        self.last_response = None
         
+        formatted_prompt = self._format_prompt(text)
         
-        # Include recent conversation history
-        context = system_prompt + "\n\n"
-        for turn in self.conversation_history[-6:]:  # Last 3 turns
-            context += turn + "\n"
+        splitter = SentenceSplitter()
+        pieces = []
+        spoken = False
         
-        context += f"\n사용자: {text}" if is_korean else f"\nUser: {text}"
-        context += "\n\n어시스턴트:" if is_korean else "\n\nAssistant:"
-
-        return context
+        for segment in self._stream_text(formatted_prompt, self.generation_config(overrides)):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            pieces.append(segment)
+            for sentence in splitter.feed(segment):
+                # The role prefix can only appear at the start of the response
+                if not spoken:
+                    sentence = self._strip_prefix(sentence)
+                if sentence:
+                    spoken = True
+                    yield sentence
+        
+        # A cancel also stops the backend, which ends the loop above without another segment
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        
+        remainder = splitter.flush()
+        if remainder and not spoken:
+            remainder = self._strip_prefix(remainder)
+        
+        # Clean and record the full response once generation has finished
+        response = self._clean_response("".join(pieces).strip())
+        self._update_history(text, response)
+        self.last_response = response
+        
+        if remainder and self._has_content(remainder):
+            yield remainder
+        elif not spoken:
+            # Nothing usable was generated, speak the fallback message instead
+            yield response
     
+    def _update_history(self, text: str, response: str):
+        """Append a turn to the conversation history"""
+        self.memory.add_turn(text, response)
     
-    def _clean_response(self, response: str) -> str:
-        """Clean and validate response"""
-        is_korean = self.config.stt_language.startswith('ko')
-        
-        # Remove prefixes
+    
+    def _system_prompt(self) -> str:
+        """Fixed system prompt for the configured language"""
+        return build_system_prompt(self.config.stt_language)
+    
+    def _build_prompt(self, text: str) -> str:
+        """Build prompt with system prompt and the history that fits the token budget"""
+        return self.memory.build_prompt(text)
+    
+    
+    @staticmethod
+    def _strip_prefix(response: str) -> str:
+        """Remove a leading role prefix from the response"""
         if response.startswith("Assistant:"):
             response = response[10:].strip()
         elif response.startswith("어시스턴트:"):
             response = response[6:].strip()
+        return response
+    
+    @staticmethod
+    def _has_content(response: str) -> bool:
+        """Check whether the response contains any speakable characters"""
+        return bool(re.search(r'[\uac00-\ud7a3a-zA-Z0-9]', response))
+    
+    def _clean_response(self, response: str) -> str:
+        """Clean and validate response"""
+        is_korean = self.config.stt_language.startswith('ko')
         
-        # Handle empty response
-        if not response or not re.search(r'[\uac00-\ud7a3a-zA-Z0-9]', response):
-            if is_korean:
-                response = "죄송합니다. 다시 한 번 말씀해 주시겠어요?"
-            else:
-                response = "I'm sorry. Could you please say that again?"
+        with self.metrics.span("clean_response") as span:
+            # Remove prefixes
+            response = self._strip_prefix(response)
+            
+            # Handle empty response
+            if not response or not self._has_content(response):
+                span.set(fallback=True)
+                response = FALLBACK_RESPONSE["ko" if is_korean else "en"]
+            span.set(chars=len(response))
         
         return response
     
     def reset_conversation(self):
         """Reset conversation history and audio buffer"""
-        self.conversation_history = []
+        self.memory.reset()
         # Clean up audio files
         for audio_file in self.audio_buffer:
             try:
@@ -248,43 +584,266 @@ Please follow these rules:
         self.audio_buffer = []
 
 class TTSModule:
-    """TTS module using RealtimeTTS with CoquiEngine"""
+    """TTS module using RealtimeTTS with CoquiEngine or the in-process XTTS engine"""
     
-    def __init__(self, config: ModelConfig):
+    def __init__(
+        self,
+        config: ModelConfig,
+        metrics: Optional[MetricsRecorder] = None,
+        load: bool = True,
+        sink: Optional[AudioSink] = None
+    ):
         self.config = config
+        self.metrics = metrics or MetricsRecorder()
+        self.engine = None
+        self.stream = None
+        self.cache = None
+        self.pool = None
+        # Spoken audio goes here (config.tts_output unless a sink is given)
+        self.sink = sink
+        # Text is rewritten for speech here, so the LLM does not have to
+        self.normalizer = TextNormalizer(config.stt_language) if config.tts_normalize_text else None
+        
+        if load:
+            self.load()
+    
+    def load(self):
+        """Initialize the TTS engine and the audio stream"""
+        from RealtimeTTS import TextToAudioStream
+        
+        config = self.config
         
         # Set custom model directory in project
-        import os
         project_dir = Path(__file__).parent.parent
         model_dir = project_dir / "models" / "tts"
         model_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize Coqui engine with custom path
-        self.engine = CoquiEngine(
-            model_name=config.tts_model,
-            device=config.device,
-            voice=config.speaker_wav,
-            language=config.stt_language,
-            speed=config.tts_speed,
-            local_models_path=str(model_dir)  # Specify custom model directory
-        )
+        # Serve repeated phrases from the audio cache instead of synthesizing them again
+        if config.tts_cache:
+            from .tts_cache import PhraseAudioCache
+            self.cache = PhraseAudioCache(
+                config.tts_cache_dir,
+                memory_budget_bytes=config.tts_cache_memory_mb * 1024 * 1024
+            )
+        
+        if self.sink is None:
+            self.sink = create_sink(config.tts_output)
+        
+        if config.tts_workers > 1:
+            # Every worker needs its own engine; they share the phrase cache
+            with ThreadPoolExecutor(max_workers=config.tts_workers, thread_name_prefix="agentvox-load") as pool:
+                engines = list(pool.map(lambda _: self._create_engine(model_dir), range(config.tts_workers)))
+            self.engine = engines[0]
+            self.stream = TextToAudioStream(self.engine)
+            self._open_sink()
+            self._start_pool([self.stream] + [TextToAudioStream(engine) for engine in engines[1:]])
+        else:
+            self.engine = self._create_engine(model_dir)
+            # Initialize text-to-audio stream
+            self.stream = TextToAudioStream(self.engine)
+            self._open_sink()
+        
+        if config.tts_cache:
+            self.warm_cache(config.tts_cache_phrases)
+    
+    def _create_engine(self, model_dir: Path):
+        """A TTS engine for the configured model and voice"""
+        config = self.config
+        if config.tts_engine == "xtts":
+            # In-process XTTS with speaker latents from the binary store
+            from .xtts_engine import XTTSEngine
+            from .speaker_latents import SpeakerLatentStore
+            engine = XTTSEngine(
+                voice=config.speaker_wav,
+                language=config.stt_language,
+                speed=config.tts_speed,
+                device=config.device,
+                local_models_path=str(model_dir),
+                latent_store=SpeakerLatentStore(config.speaker_latent_dir)
+            )
+        else:
+            from RealtimeTTS import CoquiEngine
+            
+            # Initialize Coqui engine with custom path
+            engine = CoquiEngine(
+                model_name=config.tts_model,
+                device=config.device,
+                voice=config.speaker_wav,
+                language=config.stt_language,
+                speed=config.tts_speed,
+                local_models_path=str(model_dir)  # Specify custom model directory
+            )
         
-        # Initialize text-to-audio stream
-        self.stream = TextToAudioStream(self.engine)
+        if self.cache is not None:
+            from .tts_cache import CachingEngine
+            engine = CachingEngine(engine, self.cache, self._cache_settings())
+        return engine
+    
+    def _open_sink(self):
+        _, channels, sample_rate = self.engine.get_stream_info()
+        self.sink.open(sample_rate, channels)
+    
+    def _start_pool(self, streams: List):
+        """Synthesize on several streams ahead of playback into the sink"""
+        from .tts_pool import SynthesisPool
         
+        self.pool = SynthesisPool(
+            streams, self.sink.write,
+            bytes_per_second=2 * self.sink.channels * self.sink.sample_rate,
+            max_ahead_s=self.config.tts_max_ahead_s
+        )
+    
+    def _cache_settings(self) -> Dict[str, Any]:
+        """Everything besides the text that changes the synthesized audio"""
+        config = self.config
+        voice = "default"
+        if config.speaker_wav:
+            with open(config.speaker_wav, "rb") as f:
+                voice = hashlib.sha256(f.read()).hexdigest()
+        return {
+            "engine": config.tts_engine,
+            "model": config.tts_model,
+            "voice": voice,
+            "language": config.stt_language,
+            "speed": config.tts_speed,
+            "format": "pcm_s16le",
+        }
+    
+    def warm_cache(self, phrases: Optional[List[str]] = None):
+        """Synthesize phrases that are not cached yet so they play instantly later"""
+        if self.cache is None:
+            return
+        if phrases is None:
+            phrases = CACHED_PHRASES["ko" if self.config.stt_language.startswith('ko') else "en"]
+        
+        start = time.time()
+        for phrase in phrases:
+            self.synthesize(phrase, on_audio_chunk=lambda chunk: None)
+        print(f"TTS cache ready: {len(phrases)} phrases ({time.time() - start:.1f}s)")
+    
+    def _prepare(self, text: str) -> str:
+        """Text as it should be spoken"""
+        if self.normalizer is not None and text:
+            text = self.normalizer.normalize(text)
+        return text
+    
     def speak(self, text: str):
         """Speak text and wait until complete"""
+        text = self._prepare(text)
         if not text or not text.strip():
             return
             
+        if self.pool is not None:
+            self.speak_stream(split_sentences(text), prepared=True)
+            return
+        
+        with self.metrics.span("tts", chars=len(text)) as span:
+            self._reset_audio_stats()
+            try:
+                # Feed and play - blocking call
+                self.stream.feed(text)
+                self.stream.play(muted=True, on_audio_chunk=self.sink.write)
+                    
+            except Exception as e:
+                print(f"TTS error: {e}")
+            self.sink.end()
+            span.set(**self._audio_stats())
+    
+    def speak_async(self, text: str):
+        """Queue text for playback without waiting for it to finish"""
+        text = self._prepare(text)
+        if not text or not text.strip():
+            return
+        
+        # A new response starts when nothing is playing
+        if not self.is_speaking():
+            self.sink.start()
+        
+        if self.pool is not None:
+            for sentence in split_sentences(text):
+                self.pool.submit(sentence)
+            return
+        
         try:
-            # Feed and play - blocking call
             self.stream.feed(text)
-            self.stream.play()
-                
+            if not self.stream.is_playing():
+                self.stream.play_async(muted=True, on_audio_chunk=self.sink.write)
         except Exception as e:
             print(f"TTS error: {e}")
+    
+    def speak_stream(self, sentences: Iterable[str], prepared: bool = False):
+        """Speak sentences as they arrive and wait until playback is complete"""
+        with self.metrics.span("tts") as span:
+            self._reset_audio_stats()
+            chars = 0
             
+            # Playback starts with the first sentence while the rest is generated
+            for sentence in sentences:
+                chars += len(sentence)
+                if self.pool is not None:
+                    self.pool.submit(sentence if prepared else self._prepare(sentence))
+                else:
+                    self.speak_async(sentence)
+            
+            # Wait for the remaining audio to finish
+            while self.is_speaking():
+                time.sleep(0.05)
+            self.sink.end()
+            span.set(chars=chars, **self._audio_stats())
+    
+    def synthesize(self, text: str, on_audio_chunk: Callable[[bytes], None]):
+        """Synthesize text without playback and pass int16 PCM chunks to a callback"""
+        text = self._prepare(text)
+        if not text or not text.strip():
+            return
+
+        self.stream.feed(text)
+        self.stream.play(muted=True, on_audio_chunk=on_audio_chunk)
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of the synthesized audio"""
+        _, _, sample_rate = self.engine.get_stream_info()
+        return sample_rate
+
+    def _reset_audio_stats(self):
+        self.sink.start()
+        if self.pool is not None:
+            self.pool.reset_stats()
+    
+    def _audio_stats(self) -> Dict[str, float]:
+        """Audio duration, time to first frame and underruns of the sink since the last reset"""
+        stats = self.sink.stats()
+        if self.pool is not None:
+            stats["max_ahead_s"] = self.pool.max_ahead_seen_s
+        return stats
+    
+    def is_speaking(self) -> bool:
+        """Check whether audio is still being synthesized or played"""
+        if self.pool is not None:
+            return self.pool.is_active()
+        return self.stream.is_playing()
+    
+    def stop(self):
+        """Stop playback immediately and discard queued text"""
+        if self.pool is not None:
+            self.pool.stop()
+            return
+        try:
+            if self.stream.is_playing():
+                self.stream.stop()
+        except Exception as e:
+            print(f"TTS error: {e}")
+    
+    def close(self):
+        """Stop speaking and release the output (finalizes output files)"""
+        self.stop()
+        if self.pool is not None:
+            self.pool.close()
+        if self.sink is not None:
+            self.sink.close()
+            
+
 
 class VoiceAssistant:
     """Main class for managing the entire voice conversation system"""
@@ -300,14 +859,72 @@ class VoiceAssistant:
         else:
             print("Initializing models...")
             
+        # Stage timings for every turn
+        self.metrics = create_recorder(model_config)
+        if model_config.metrics_port:
+            print(f"Metrics: http://127.0.0.1:{model_config.metrics_port}/metrics")
+            
         # Use unified AudioLLMModule instead of separate STT and LLM
-        self.audio_llm = AudioLLMModule(model_config)
-        self.tts = TTSModule(model_config)
+        self.audio_llm = AudioLLMModule(model_config, metrics=self.metrics, load=False)
+        self.tts = TTSModule(model_config, metrics=self.metrics, load=False)
+        
+        self.load_times = self._load_models()
+    
+    def _load_models(self) -> Dict[str, float]:
+        """Load STT, LLM and TTS models and return the load time of each in seconds
+        
+        Whisper and XTTS load in their own worker processes and the LLM weights
+        load in native code, so threads are enough to overlap the three.
+        """
+        is_korean = self.model_config.stt_language.startswith('ko')
+        loaders = {
+            "STT": self.audio_llm.load_stt,
+            "LLM": self.audio_llm.load_llm,
+            "TTS": self.tts.load,
+        }
+        load_times = {}
+        
+        def timed(name, loader):
+            with self.metrics.span(f"load_{name.lower()}") as span:
+                loader()
+            load_times[name] = span.duration_ms / 1000
+        
+        start = time.perf_counter()
+        if self.model_config.parallel_startup:
+            with ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="agentvox-load") as pool:
+                futures = [pool.submit(timed, name, loader) for name, loader in loaders.items()]
+                # Wait for every model before reporting the first failure
+                wait(futures)
+            for future in futures:
+                future.result()
+        else:
+            for name, loader in loaders.items():
+                timed(name, loader)
+        total = time.perf_counter() - start
+        
+        details = ", ".join(f"{name} {load_times[name]:.1f}s" for name in loaders)
+        if is_korean:
+            print(f"모델 로딩 완료: {total:.1f}초 ({details})")
+        else:
+            print(f"Models ready in {total:.1f}s ({details})")
+        
+        return load_times
     
     def run_conversation_loop(self):
         """Run conversation loop with unified audio-aware LLM"""
+        try:
+            self._run_conversation_loop()
+        finally:
+            self.tts.close()
+    
+    def _run_conversation_loop(self):
         is_korean = self.model_config.stt_language.startswith('ko')
         
+        if self.model_config.barge_in:
+            from .conversation_engine import ConversationEngine
+            ConversationEngine(self.audio_llm, self.tts, self.model_config).run()
+            return
+        
         if is_korean:
             print("음성 대화 시스템이 시작되었습니다.")
             print("종료하려면 '종료'라고 말하세요.")
@@ -316,11 +933,17 @@ class VoiceAssistant:
             print("Say 'exit' to quit.")
         print("-" * 50)
         
+        if self.model_config.llm_streaming:
+            self._run_streaming_loop()
+            return
+        
         while True:
             # 1. Listen and get response in one unified call
             user_input, response = self.audio_llm.transcribe_and_respond()
             
             if not user_input:
+                if self.audio_llm.input_finished.is_set():
+                    break
                 continue
                 
             # Check exit command
@@ -339,6 +962,39 @@ class VoiceAssistant:
             
             # 4. Loop back to listening
             # No need for delays or complex state management
+    
+    def _run_streaming_loop(self):
+        """Conversation loop that speaks each sentence as soon as it is generated"""
+        is_korean = self.model_config.stt_language.startswith('ko')
+        
+        while True:
+            # 1. Listen
+            user_input = self.audio_llm.listen()
+            
+            if not user_input:
+                if self.audio_llm.input_finished.is_set():
+                    break
+                continue
+            
+            # Check exit command before spending time on generation
+            if "exit" in user_input.lower() or "종료" in user_input:
+                if is_korean:
+                    print("\n대화를 종료합니다.")
+                else:
+                    print("\nEnding conversation.")
+                break
+            
+            # 2. Generate and speak sentence by sentence
+            print("\n어시스턴트: " if is_korean else "\nAssistant: ", end="", flush=True)
+            self.tts.speak_stream(self._echo(self.audio_llm.stream_response(user_input)))
+            print()
+    
+    @staticmethod
+    def _echo(sentences: Iterable[str]) -> Iterator[str]:
+        """Print sentences as they pass through to TTS"""
+        for sentence in sentences:
+            print(sentence, end=" ", flush=True)
+            yield sentence
 
 # Main execution function
 def main():
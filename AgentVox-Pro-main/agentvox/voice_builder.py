@@ -0,0 +1,199 @@
+"""
+Build a speaker voice profile from existing recordings
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .transcribe import VADSegmenter, decode_media
+from .vad import SAMPLE_RATE, resample
+from .voice_quality import QualityReport, analyze, to_db
+
+# Sample rate of speaker WAVs (same as the recording tool and XTTS conditioning)
+VOICE_SAMPLE_RATE = 22050
+# Extensions picked up from an input directory
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac"}
+# Pause between clips in the speaker WAV (seconds)
+CLIP_PAUSE_SECONDS = 0.3
+# Highest peak after loudness normalization (dBFS)
+PEAK_LIMIT_DB = -1.0
+
+
+@dataclass
+class VoiceClip:
+    """A trimmed, normalized stretch of speech from one recording"""
+    source: str
+    start: float  # Seconds into the source
+    audio: np.ndarray  # float32 mono at VOICE_SAMPLE_RATE
+    report: QualityReport
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / VOICE_SAMPLE_RATE
+
+
+def normalize_loudness(audio: np.ndarray, target_db: float = -20.0) -> np.ndarray:
+    """Scale speech to a target RMS level (dBFS) without letting the peak exceed PEAK_LIMIT_DB"""
+    rms = float(np.sqrt(np.mean(audio ** 2))) if len(audio) else 0.0
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    if rms <= 0 or peak <= 0:
+        return audio
+    gain = min(10 ** ((target_db - to_db(rms)) / 20), 10 ** (PEAK_LIMIT_DB / 20) / peak)
+    return (audio * gain).astype(np.float32)
+
+
+def extract_clips(
+    path: str,
+    min_clip_s: float = 2.0,
+    max_clip_s: float = 12.0,
+    target_db: float = -20.0
+) -> Tuple[List[VoiceClip], Dict[str, int]]:
+    """Trim a recording to its speech, cut it at pauses, normalize and quality-check each clip
+
+    Returns the usable clips and the number of clips rejected per reason.
+    Runs in a worker process.
+    """
+    audio = np.concatenate(list(decode_media(path, sample_rate=VOICE_SAMPLE_RATE)) or [np.zeros(0, np.float32)])
+    # VAD works at 16 kHz; boundaries are mapped back by time
+    segmenter = VADSegmenter(max_segment_s=max_clip_s, min_silence_ms=250, max_silence_ms=500, pad_ms=90)
+    segments = segmenter.feed(resample(audio, VOICE_SAMPLE_RATE, SAMPLE_RATE)) + segmenter.flush()
+
+    # Trimmed clips have too little silence to measure the noise floor on their own
+    noise_db = analyze(audio, VOICE_SAMPLE_RATE).noise_db if len(audio) else None
+
+    clips = []
+    rejected: Dict[str, int] = {}
+    for segment in segments:
+        if segment.end - segment.start < min_clip_s:
+            rejected["too short"] = rejected.get("too short", 0) + 1
+            continue
+        start = int(segment.start * VOICE_SAMPLE_RATE)
+        end = int(segment.end * VOICE_SAMPLE_RATE)
+        # Measured before normalization so the gain does not change the levels
+        report = analyze(audio[start:end], VOICE_SAMPLE_RATE, max_silence_ratio=0.4, noise_db=noise_db)
+        if not report.ok:
+            reason = report.problems[0].rsplit("(", 1)[-1].rstrip(")")
+            rejected[reason] = rejected.get(reason, 0) + 1
+            continue
+        clips.append(VoiceClip(path, segment.start, normalize_loudness(audio[start:end], target_db), report))
+    return clips, rejected
+
+
+def select_clips(clips: List[VoiceClip], target_seconds: float) -> List[VoiceClip]:
+    """Best-scoring clips up to the target duration, in source order
+
+    The best clip is always kept, even when it alone is longer than the target.
+    """
+    chosen = []
+    total = 0.0
+    for clip in sorted(clips, key=lambda clip: clip.report.score, reverse=True):
+        if total >= target_seconds:
+            break
+        if chosen and total + clip.duration > target_seconds * 1.2:
+            continue
+        chosen.append(clip)
+        total += clip.duration
+    return sorted(chosen, key=lambda clip: (clip.source, clip.start))
+
+
+def combine_clips(clips: List[VoiceClip]) -> np.ndarray:
+    """Concatenate clips with short pauses into one preallocated buffer"""
+    pause = int(CLIP_PAUSE_SECONDS * VOICE_SAMPLE_RATE)
+    combined = np.zeros(sum(len(clip.audio) for clip in clips) + pause * max(0, len(clips) - 1), dtype=np.float32)
+    position = 0
+    for clip in clips:
+        combined[position:position + len(clip.audio)] = clip.audio
+        position += len(clip.audio) + pause
+    return combined
+
+
+def find_recordings(inputs: List[str]) -> List[str]:
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(sorted(str(f) for f in path.rglob("*") if f.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(str(path))
+    return files
+
+
+def compute_latents(wav_path: str, device: Optional[str] = None, model_version: Optional[str] = None):
+    """XTTS conditioning latents for a speaker WAV, with the settings CoquiEngine uses"""
+    from .speaker_latents import SpeakerLatents, XTTS_VERSION
+    from .xtts_engine import load_xtts_model
+
+    model, _ = load_xtts_model(model_version or XTTS_VERSION, device=device)
+    gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(
+        audio_path=wav_path, gpt_cond_len=30, max_ref_length=60
+    )
+    return SpeakerLatents.from_torch(gpt_cond_latent, speaker_embedding)
+
+
+def build_voice(
+    inputs: List[str],
+    output: str,
+    target_seconds: float = 30.0,
+    workers: int = 4,
+    target_db: float = -20.0,
+    latents: bool = True,
+    store_dir: Optional[str] = None,
+    model_version: Optional[str] = None,
+    device: Optional[str] = None
+) -> Optional[Path]:
+    """Write the speaker WAV (and its latents) built from the best clips of the recordings"""
+    import soundfile as sf
+
+    files = find_recordings(inputs)
+    if not files:
+        raise FileNotFoundError(f"No recordings found in {', '.join(inputs)}")
+    print(f"Analyzing {len(files)} recordings with {workers} workers...")
+
+    start = time.time()
+    clips: List[VoiceClip] = []
+    rejected: Dict[str, int] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {file: pool.submit(extract_clips, file, target_db=target_db) for file in files}
+        for file, future in futures.items():
+            try:
+                file_clips, file_rejected = future.result()
+            except Exception as e:
+                print(f"  {file}: {e}")
+                continue
+            clips.extend(file_clips)
+            for reason, count in file_rejected.items():
+                rejected[reason] = rejected.get(reason, 0) + count
+            print(f"  {file}: {len(file_clips)} usable clips "
+                  f"({sum(clip.duration for clip in file_clips):.1f}s)")
+
+    if rejected:
+        print("Rejected clips: " + ", ".join(f"{reason} {count}" for reason, count in sorted(rejected.items())))
+    if not clips:
+        print("No usable speech found")
+        return None
+
+    chosen = select_clips(clips, target_seconds)
+    audio = combine_clips(chosen)
+    output_path = Path(output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    sf.write(str(output_path), audio, VOICE_SAMPLE_RATE)
+    print(f"{output_path}: {len(chosen)} clips, {len(audio) / VOICE_SAMPLE_RATE:.1f}s "
+          f"(mean SNR {np.mean([clip.report.snr_db for clip in chosen]):.0f} dB, {time.time() - start:.1f}s)")
+
+    if latents:
+        from .speaker_latents import SpeakerLatentStore, XTTS_VERSION
+
+        start = time.time()
+        voice_latents = compute_latents(str(output_path), device=device, model_version=model_version)
+        json_path = output_path.with_suffix(".json")
+        voice_latents.to_json(str(json_path))
+        store = SpeakerLatentStore(store_dir, model_version=model_version or XTTS_VERSION)
+        entry = store.save(store.key(str(output_path)), voice_latents, source=str(output_path))
+        print(f"Speaker latents: {json_path}, {entry} ({time.time() - start:.1f}s)")
+
+    return output_path
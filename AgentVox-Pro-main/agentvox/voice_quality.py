@@ -0,0 +1,188 @@
+"""
+Frame-by-frame quality analysis of speaker voice samples
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+# Samples at or above this magnitude count as clipped
+CLIP_LEVEL = 0.99
+# Floor for dB conversions
+_EPS = 1e-10
+
+
+def to_db(value: float) -> float:
+    return float(20 * np.log10(max(value, _EPS)))
+
+
+@dataclass
+class QualityReport:
+    """Quality measures of a take; `problems` is empty when it is usable for cloning"""
+    duration: float = 0.0
+    speech_seconds: float = 0.0
+    silence_ratio: float = 1.0
+    speech_db: float = -200.0  # Mean RMS of speech frames (dBFS)
+    noise_db: float = -200.0   # Noise floor (dBFS)
+    snr_db: float = 0.0
+    clipped_ratio: float = 0.0
+    longest_clip_ms: float = 0.0
+    spectral_flatness: float = 0.0  # Mean over speech frames: near 0 for voiced speech, near 1 for noise
+    problems: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    @property
+    def score(self) -> float:
+        """Ranking of usable takes: clean, loud enough and tonal speech scores higher"""
+        return self.snr_db - 40 * self.spectral_flatness - 100 * self.clipped_ratio - 10 * self.silence_ratio
+
+
+class QualityAnalyzer:
+    """Measure a take while it is being recorded
+
+    Audio is analyzed in fixed frames as it arrives; each call to feed() is
+    vectorized over the frames it completes. The noise floor is the 10th
+    percentile of frame RMS, frames well above it count as speech, and
+    spectral flatness is measured on the speech frames. feed() reports a
+    problem as soon as the take cannot pass anymore (sustained clipping, low
+    SNR, noise-like spectrum), so the speaker can stop and retry early.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 22050,
+        frame_ms: int = 20,
+        max_seconds: float = 60.0,
+        min_snr_db: float = 15.0,
+        min_speech_db: float = -40.0,
+        max_clipped_ratio: float = 0.01,
+        max_clip_ms: float = 10.0,
+        max_flatness: float = 0.5,
+        max_silence_ratio: float = 0.6,
+        min_speech_seconds: float = 1.0,
+        decide_after_s: float = 1.5,
+        noise_db: Optional[float] = None
+    ):
+        self.sample_rate = sample_rate
+        self.frame_length = sample_rate * frame_ms // 1000
+        self.min_snr_db = min_snr_db
+        self.min_speech_db = min_speech_db
+        self.max_clipped_ratio = max_clipped_ratio
+        self.max_clip_samples = int(sample_rate * max_clip_ms / 1000)
+        self.max_flatness = max_flatness
+        self.max_silence_ratio = max_silence_ratio
+        self.min_speech_seconds = min_speech_seconds
+        self.decide_after_s = decide_after_s
+        # Known noise floor (dBFS), e.g. measured on the whole recording a clip was cut from
+        self.noise_db = noise_db
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+
+        # Per-frame measures, preallocated for the longest take
+        capacity = int(max_seconds * sample_rate) // self.frame_length + 1
+        self._rms = np.zeros(capacity, dtype=np.float32)
+        self._flatness = np.zeros(capacity, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self._frames = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._samples = 0
+        self._clipped = 0
+        self._clip_run = 0
+        self._longest_clip = 0
+
+    def feed(self, audio: np.ndarray) -> Optional[str]:
+        """Analyze the next samples (float32 in [-1, 1]) and return a problem that rules the take out"""
+        audio = np.asarray(audio, dtype=np.float32)
+        self._samples += len(audio)
+        self._count_clipping(audio)
+
+        audio = np.concatenate([self._pending, audio]) if len(self._pending) else audio
+        n = min(len(audio) // self.frame_length, len(self._rms) - self._frames)
+        self._pending = audio[n * self.frame_length:][:self.frame_length]
+        if n > 0:
+            frames = audio[:n * self.frame_length].reshape(n, self.frame_length)
+            end = self._frames + n
+            self._rms[self._frames:end] = np.sqrt(np.mean(frames ** 2, axis=1))
+            power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2 + _EPS
+            self._flatness[self._frames:end] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+            self._frames = end
+
+        if self._longest_clip > self.max_clip_samples:
+            return f"clipping for {self._longest_clip * 1000 / self.sample_rate:.0f} ms (too loud)"
+        if self._samples >= self.sample_rate and self._clipped > self.max_clipped_ratio * self._samples:
+            return f"{self._clipped / self._samples:.1%} of samples clipped (too loud)"
+
+        report = self.report(final=False)
+        if report.speech_seconds >= self.decide_after_s:
+            for problem in report.problems:
+                return problem
+        return None
+
+    def _count_clipping(self, audio: np.ndarray):
+        """Clipped samples and the longest run of consecutive clipped samples"""
+        clipped = np.abs(audio) >= CLIP_LEVEL
+        count = int(np.count_nonzero(clipped))
+        self._clipped += count
+        if not count:
+            self._clip_run = 0
+            return
+        # Runs of clipped samples, including the one carried over from the previous call
+        edges = np.diff(np.concatenate([[0], clipped.view(np.int8), [0]]))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        lengths = ends - starts
+        if starts[0] == 0:
+            lengths[0] += self._clip_run
+        self._longest_clip = max(self._longest_clip, int(lengths.max()))
+        self._clip_run = int(lengths[-1]) if ends[-1] == len(audio) else 0
+
+    def report(self, final: bool = True) -> QualityReport:
+        """Measures so far; with final=False, only the checks that cannot recover are applied"""
+        frame_seconds = self.frame_length / self.sample_rate
+        report = QualityReport(
+            duration=self._samples / self.sample_rate,
+            clipped_ratio=self._clipped / self._samples if self._samples else 0.0,
+            longest_clip_ms=self._longest_clip * 1000 / self.sample_rate
+        )
+        rms = self._rms[:self._frames]
+        if len(rms):
+            noise = 10 ** (self.noise_db / 20) if self.noise_db is not None else float(np.percentile(rms, 10))
+            # Speech is well above the noise floor and above digital silence
+            speech = rms > max(noise * 3.0, 10 ** (-60 / 20))
+            report.noise_db = to_db(noise)
+            report.speech_seconds = float(np.count_nonzero(speech)) * frame_seconds
+            report.silence_ratio = 1.0 - float(np.mean(speech))
+            if speech.any():
+                report.speech_db = to_db(float(np.sqrt(np.mean(rms[speech] ** 2))))
+                report.snr_db = report.speech_db - report.noise_db
+                report.spectral_flatness = float(np.mean(self._flatness[:self._frames][speech]))
+
+        problems = report.problems
+        if report.speech_seconds:
+            if report.speech_db < self.min_speech_db:
+                problems.append(f"speech level {report.speech_db:.0f} dBFS (too quiet)")
+            if report.snr_db < self.min_snr_db:
+                problems.append(f"SNR {report.snr_db:.0f} dB (too much background noise)")
+            if report.spectral_flatness > self.max_flatness:
+                problems.append(f"spectral flatness {report.spectral_flatness:.2f} (noise-like signal)")
+        if report.longest_clip_ms * self.sample_rate / 1000 > self.max_clip_samples \
+                or report.clipped_ratio > self.max_clipped_ratio:
+            problems.append(f"{report.clipped_ratio:.1%} of samples clipped (too loud)")
+        if final:
+            if report.speech_seconds < self.min_speech_seconds:
+                problems.append(f"{report.speech_seconds:.1f}s of speech (too short)")
+            elif report.silence_ratio > self.max_silence_ratio:
+                problems.append(f"{report.silence_ratio:.0%} silence (too many pauses)")
+        return report
+
+
+def analyze(audio: np.ndarray, sample_rate: int, **thresholds) -> QualityReport:
+    """Quality report of a complete take"""
+    analyzer = QualityAnalyzer(sample_rate, max_seconds=len(audio) / sample_rate + 1, **thresholds)
+    analyzer.feed(audio)
+    return analyzer.report()
@@ -0,0 +1,150 @@
+"""
+In-process XTTS engine for RealtimeTTS that uses cached binary speaker latents
+"""
+
+import logging
+import os
+import time
+from typing import Optional
+
+import pyaudio
+from RealtimeTTS.engines import BaseEngine, CoquiEngine
+
+from .speaker_latents import SpeakerLatents, SpeakerLatentStore, XTTS_VERSION
+from .vad import float_to_pcm16
+
+# XTTS output sample rate
+XTTS_SAMPLE_RATE = 24000
+
+
+def load_xtts_model(
+    specific_model: str = XTTS_VERSION,
+    local_models_path: Optional[str] = None,
+    device: Optional[str] = None
+):
+    """Load the XTTS checkpoint used by CoquiEngine and return (model, device)"""
+    import torch
+    from TTS.config import load_config
+    from TTS.tts.models import setup_model
+
+    if device not in ("cuda", "mps", "cpu"):
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # Same checkpoint files as CoquiEngine
+    checkpoint = CoquiEngine.download_model(specific_model, local_models_path)
+    config = load_config(os.path.join(checkpoint, "config.json"))
+    model = setup_model(config)
+    model.load_checkpoint(config, checkpoint_dir=checkpoint, eval=True)
+    model.to(torch.device(device))
+    return model, device
+
+
+class XTTSEngine(BaseEngine):
+    """XTTS v2 synthesis in the calling process
+
+    CoquiEngine loads latents from JSON or recomputes them from the WAV in its
+    worker process on every start. This engine takes them from a
+    SpeakerLatentStore (memory-mapped float16) and only conditions on the
+    recording when the store has no entry for it.
+    """
+
+    def __init__(
+        self,
+        voice: Optional[str] = None,
+        language: str = "en",
+        speed: float = 1.0,
+        device: Optional[str] = None,
+        specific_model: str = XTTS_VERSION,
+        local_models_path: Optional[str] = None,
+        latent_store: Optional[SpeakerLatentStore] = None,
+        stream_chunk_size: int = 20,
+        overlap_wav_len: int = 1024,
+        temperature: float = 0.85,
+        length_penalty: float = 1.0,
+        repetition_penalty: float = 7.0,
+        top_k: int = 50,
+        top_p: float = 0.85,
+        enable_text_splitting: bool = True
+    ):
+        self.language = language
+        self.speed = speed
+        self.stream_chunk_size = stream_chunk_size
+        self.overlap_wav_len = overlap_wav_len
+        self.temperature = temperature
+        self.length_penalty = length_penalty
+        self.repetition_penalty = repetition_penalty
+        self.top_k = top_k
+        self.top_p = top_p
+        self.enable_text_splitting = enable_text_splitting
+        self.latent_store = latent_store or SpeakerLatentStore(model_version=specific_model)
+
+        self.model, self.device = load_xtts_model(specific_model, local_models_path, device)
+
+        self.gpt_cond_latent = None
+        self.speaker_embedding = None
+        self.set_voice(voice)
+
+    def post_init(self):
+        self.engine_name = "xtts"
+
+    def get_stream_info(self):
+        # int16 like CoquiEngine, the format every sink and client expects
+        return pyaudio.paInt16, 1, XTTS_SAMPLE_RATE
+
+    def _compute_latents(self, wav_path: str) -> SpeakerLatents:
+        """Condition the model on a recording (only when the store has no entry)"""
+        gpt_cond_latent, speaker_embedding = self.model.get_conditioning_latents(audio_path=[wav_path])
+        return SpeakerLatents.from_torch(gpt_cond_latent, speaker_embedding)
+
+    def set_voice(self, voice: Optional[str]):
+        """Load speaker latents for a WAV or JSON voice file, or the model's default speaker"""
+        start = time.time()
+        if voice:
+            latents, origin = self.latent_store.get(voice, compute=self._compute_latents)
+            logging.info(f"Speaker latents for {voice} loaded from {origin} ({time.time() - start:.2f}s)")
+        else:
+            latents = self._default_latents()
+        self.gpt_cond_latent, self.speaker_embedding = latents.to_torch(self.device)
+
+    def _default_latents(self) -> SpeakerLatents:
+        """Latents of the default voice shipped with RealtimeTTS"""
+        import RealtimeTTS.engines.coqui_engine as coqui_engine
+        default_json = os.path.join(os.path.dirname(coqui_engine.__file__), "coqui_default_voice.json")
+        latents, _ = self.latent_store.get(default_json)
+        return latents
+
+    def set_voice_parameters(self, **voice_parameters):
+        for name, value in voice_parameters.items():
+            if hasattr(self, name):
+                setattr(self, name, value)
+
+    def get_voices(self):
+        return []
+
+    def synthesize(self, text: str, sentence_count: int = 0) -> bool:
+        super().synthesize(text)
+
+        try:
+            chunks = self.model.inference_stream(
+                text,
+                self.language,
+                self.gpt_cond_latent,
+                self.speaker_embedding,
+                stream_chunk_size=self.stream_chunk_size,
+                overlap_wav_len=self.overlap_wav_len,
+                temperature=self.temperature,
+                length_penalty=self.length_penalty,
+                repetition_penalty=self.repetition_penalty,
+                top_k=self.top_k,
+                top_p=self.top_p,
+                speed=self.speed,
+                enable_text_splitting=self.enable_text_splitting
+            )
+            for chunk in chunks:
+                if self.stop_synthesis_event.is_set():
+                    break
+                self.queue.put(float_to_pcm16(chunk.detach().cpu().numpy()))
+            return True
+        except Exception as e:
+            logging.error(f"XTTS synthesis error: {e}")
+            return False
@@ -33,6 +33,7 @@ setup(
         "sounddevice",
         "soundfile",
         "flask",
+        "websockets",
         "pyaudio",
         "hangul-romanize",
         "mecab-python3",
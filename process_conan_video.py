@@ -7,73 +7,41 @@ Conan O'Brien 졸업 연설 영상의 첫 3분을 처리하는 스크립트
 
 import os
 import speech_recognition as sr
-from moviepy.editor import VideoFileClip
-from pydub import AudioSegment
 import warnings
 warnings.filterwarnings("ignore")
 
-def extract_first_3min_audio(video_path, output_audio="conan_3min.wav"):
-    """비디오의 첫 3분 오디오 추출"""
+from video_to_text import extract_audio_from_video, make_chunks
+
+def extract_first_3min_audio(video_path):
+    """비디오의 첫 3분 오디오를 16 kHz 모노 PCM으로 추출 (메모리)"""
     print("영상에서 첫 3분 오디오 추출 중...")
-    
-    try:
-        # 비디오 로드
-        video = VideoFileClip(video_path)
-        
-        # 첫 3분(180초)만 추출
-        duration = min(180, video.duration)
-        audio_clip = video.subclip(0, duration).audio
-        
-        # WAV로 저장
-        audio_clip.write_audiofile(output_audio, verbose=False, logger=None)
-        
-        # 메모리 정리
-        audio_clip.close()
-        video.close()
-        
-        print(f"오디오 추출 완료: {duration:.1f}초")
-        return output_audio
-        
-    except Exception as e:
-        print(f"오디오 추출 실패: {e}")
-        return None
+    return extract_audio_from_video(video_path, duration=180)
 
-def transcribe_audio_chunks(audio_path, language="en-US"):
+def transcribe_audio_chunks(pcm, language="en-US"):
     """오디오를 30초 단위로 나누어 텍스트로 변환"""
     print("\n음성을 텍스트로 변환 중...")
     
     recognizer = sr.Recognizer()
     
-    # 오디오 로드
-    audio = AudioSegment.from_wav(audio_path)
-    
-    # 30초 단위로 나누기
-    chunk_length = 30000  # 30초
-    chunks = [audio[i:i+chunk_length] for i in range(0, len(audio), chunk_length)]
+    # 30초 단위로 나누기 (임시 파일 없이 PCM 버퍼를 그대로 사용)
+    chunks = make_chunks(pcm, 30000)
     
     transcripts = []
     
-    for i, chunk in enumerate(chunks):
-        print(f"처리 중: {i+1}/{len(chunks)} 부분 ({i*30}초-{min((i+1)*30, 180)}초)")
-        
-        # 임시 파일로 저장
-        temp_file = f"temp_chunk_{i}.wav"
-        chunk.export(temp_file, format="wav")
+    for i, (offset, audio_data) in enumerate(chunks):
+        start = int(offset)
+        end = start + 30
+        print(f"처리 중: {i+1}/{len(chunks)} 부분 ({start}초-{min(end, 180)}초)")
         
         try:
-            with sr.AudioFile(temp_file) as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data, language=language)
-                transcripts.append(f"[{i*30:03d}s-{min((i+1)*30, 180):03d}s] {text}")
-                print(f"  ✓ 인식 완료")
+            text = recognizer.recognize_google(audio_data, language=language)
+            transcripts.append(f"[{start:03d}s-{min(end, 180):03d}s] {text}")
+            print(f"  ✓ 인식 완료")
         except sr.UnknownValueError:
-            transcripts.append(f"[{i*30:03d}s-{min((i+1)*30, 180):03d}s] (인식 불가)")
+            transcripts.append(f"[{start:03d}s-{min(end, 180):03d}s] (인식 불가)")
             print(f"  ✗ 인식 실패")
         except Exception as e:
             print(f"  오류: {e}")
-        finally:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
     
     return "\n\n".join(transcripts)
 
@@ -90,13 +58,13 @@ def main():
     print("=" * 60)
     
     # 1. 오디오 추출
-    audio_file = extract_first_3min_audio(video_path)
+    pcm = extract_first_3min_audio(video_path)
     
-    if not audio_file:
+    if not pcm:
         return
     
     # 2. 음성 인식
-    transcript = transcribe_audio_chunks(audio_file)
+    transcript = transcribe_audio_chunks(pcm)
     
     # 3. 결과 저장
     output_file = "conan_transcript_3min.txt"
@@ -109,10 +77,6 @@ def main():
     print(f"\n결과가 {output_file}에 저장되었습니다.")
     print("\n=== 변환된 텍스트 (첫 부분) ===")
     print(transcript[:500] + "..." if len(transcript) > 500 else transcript)
-    
-    # 임시 파일 삭제
-    if os.path.exists(audio_file):
-        os.remove(audio_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,15 +3,20 @@
 
 import os
 import sys
+import argparse
 import time
 import threading
 import queue
 import pyttsx3
 import speech_recognition as sr
-from llama_cpp import Llama
+
+# AgentVox 디렉토리를 Python 경로에 추가
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AgentVox-Pro-main'))
+
+from agentvox.llm_backend import LlamaCppBackend
 
 class SimpleAgentVox:
-    def __init__(self, model_path):
+    def __init__(self, model_path, n_threads=4, n_gpu_layers=0):
         print("=== Simple AgentVox 초기화 중 ===")
         
         # TTS 엔진 초기화
@@ -30,16 +35,22 @@ class SimpleAgentVox:
         self.recognizer = sr.Recognizer()
         self.microphone = sr.Microphone()
         
+        # 주변 소음은 시작할 때 한 번만 측정하고, 이후에는 listen() 중에 임계값이 자동으로 조정됨
+        # (매 턴마다 측정하면 0.5초씩 지연됨)
+        self.recognizer.dynamic_energy_threshold = True
+        with self.microphone as source:
+            print("주변 소음 측정 중...")
+            self.recognizer.adjust_for_ambient_noise(source, duration=1.0)
+        
         # LLM 초기화
         print(f"모델 로딩 중: {model_path}")
         print("(첫 로딩은 시간이 걸릴 수 있습니다...)")
         
-        self.llm = Llama(
-            model_path=model_path,
+        self.llm = LlamaCppBackend(
+            model_path,
             n_ctx=2048,  # 컨텍스트 크기
-            n_threads=4,  # CPU 스레드 수
-            n_gpu_layers=0,  # GPU 레이어 (0 = CPU만 사용)
-            verbose=False
+            n_threads=n_threads,  # CPU 스레드 수
+            n_gpu_layers=n_gpu_layers  # GPU 레이어 (0 = CPU만 사용)
         )
         
         print("모델 로딩 완료!")
@@ -58,7 +69,6 @@ class SimpleAgentVox:
         try:
             with self.microphone as source:
                 print("\n듣는 중... (말씀해 주세요)")
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
                 audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
                 
             print("인식 중...")
@@ -91,15 +101,12 @@ class SimpleAgentVox:
 AI:"""
         
         # LLM 응답 생성
-        response = self.llm(
+        ai_response = self.llm.generate(
             prompt,
             max_tokens=256,
             temperature=0.7,
-            stop=["사용자:", "\n\n"],
-            echo=False
-        )
-        
-        ai_response = response['choices'][0]['text'].strip()
+            stop=["사용자:", "\n\n"]
+        ).strip()
         self.conversation_history.append(f"AI: {ai_response}")
         
         return ai_response
@@ -149,14 +156,20 @@ AI:"""
                 self.speak("죄송합니다. 오류가 발생했습니다.")
 
 def main():
-    model_path = r"C:\Users\SS\.agentvox\models\gemma-3-12b-it-Q4_K_M.gguf"
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=r"C:\Users\SS\.agentvox\models\gemma-3-12b-it-Q4_K_M.gguf",
+                        help="GGUF 모델 경로")
+    parser.add_argument("--threads", type=int, default=4, help="CPU 스레드 수")
+    parser.add_argument("--gpu-layers", type=int, default=0, help="GPU에 올릴 레이어 수")
+    args = parser.parse_args()
+    model_path = args.model
     
     if not os.path.exists(model_path):
         print(f"모델 파일을 찾을 수 없습니다: {model_path}")
         return
     
     # AgentVox 실행
-    agent = SimpleAgentVox(model_path)
+    agent = SimpleAgentVox(model_path, n_threads=args.threads, n_gpu_layers=args.gpu_layers)
     agent.run()
 
 if __name__ == "__main__":
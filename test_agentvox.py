@@ -5,7 +5,7 @@ import os
 import sys
 
 # AgentVox 디렉토리를 Python 경로에 추가
-sys.path.insert(0, 'C:\\newidea\\AgentVox-Pro-main')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AgentVox-Pro-main'))
 
 from agentvox import ModelConfig, AudioConfig
 
@@ -26,33 +26,29 @@ def main():
     print(f"LLM 온도: {model_config.llm_temperature}")
     print(f"TTS 속도: {model_config.tts_speed}")
     
-    # LLM 모듈 테스트
+    # LLM 모듈 테스트 (모델 없이 동작하는 fake 백엔드 사용)
     try:
-        from agentvox.voice_assistant import LLMModule
+        from agentvox.llm_backend import FakeLLMBackend
+        from agentvox.voice_assistant import build_prompt
         print("\n=== LLM 모듈 테스트 ===")
-        llm = LLMModule(model_config)
+        llm = FakeLLMBackend(language=model_config.stt_language, time_to_first_token=0.0)
         
         # 간단한 질문 테스트
         test_prompt = "안녕하세요. 당신은 누구입니까?"
         print(f"질문: {test_prompt}")
         
-        # 모델이 없을 경우를 대비한 예외 처리
-        try:
-            response = llm.generate_response(test_prompt)
-            print(f"응답: {response}")
-        except Exception as e:
-            print(f"LLM 응답 생성 중 오류: {e}")
-            print("모델 파일이 없을 수 있습니다. 모델을 다운로드해야 합니다.")
+        response = llm.generate(llm.format_prompt(build_prompt(model_config.stt_language, [], test_prompt)))
+        print(f"응답: {response}")
             
     except ImportError as e:
         print(f"LLM 모듈 로드 실패: {e}")
     
-    # STT 모듈 테스트 (로드만)
+    # STT + LLM 모듈 테스트 (로드만)
     try:
-        from agentvox.voice_assistant import STTModule
-        print("\n=== STT 모듈 로드 성공 ===")
+        from agentvox.voice_assistant import AudioLLMModule
+        print("\n=== STT/LLM 모듈 로드 성공 ===")
     except ImportError as e:
-        print(f"STT 모듈 로드 실패: {e}")
+        print(f"STT/LLM 모듈 로드 실패: {e}")
     
     # TTS 모듈 테스트 (로드만)
     try:
@@ -3,12 +3,17 @@
 
 import os
 import sys
+import argparse
 import time
 import pyttsx3
-from llama_cpp import Llama
+
+# AgentVox 디렉토리를 Python 경로에 추가
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AgentVox-Pro-main'))
+
+from agentvox.llm_backend import LlamaCppBackend
 
 class TextAgentVox:
-    def __init__(self, model_path):
+    def __init__(self, model_path, n_threads=4, n_gpu_layers=0):
         print("=== Text AgentVox 초기화 중 ===")
         
         # TTS 엔진 초기화
@@ -20,12 +25,11 @@ class TextAgentVox:
         print(f"모델 로딩 중: {model_path}")
         print("(첫 로딩은 약 30초-1분 정도 걸립니다...)")
         
-        self.llm = Llama(
-            model_path=model_path,
+        self.llm = LlamaCppBackend(
+            model_path,
             n_ctx=2048,  # 컨텍스트 크기
-            n_threads=4,  # CPU 스레드 수
-            n_gpu_layers=0,  # GPU 레이어 (0 = CPU만 사용)
-            verbose=False
+            n_threads=n_threads,  # CPU 스레드 수
+            n_gpu_layers=n_gpu_layers  # GPU 레이어 (0 = CPU만 사용)
         )
         
         print("모델 로딩 완료!")
@@ -54,15 +58,12 @@ AI:"""
         print("생각 중...")
         
         # LLM 응답 생성
-        response = self.llm(
+        ai_response = self.llm.generate(
             prompt,
             max_tokens=256,
             temperature=0.7,
-            stop=["사용자:", "\n\n"],
-            echo=False
-        )
-        
-        ai_response = response['choices'][0]['text'].strip()
+            stop=["사용자:", "\n\n"]
+        ).strip()
         self.conversation_history.append(f"AI: {ai_response}")
         
         return ai_response
@@ -120,7 +121,13 @@ AI:"""
                 self.speak("죄송합니다. 오류가 발생했습니다.")
 
 def main():
-    model_path = r"C:\Users\SS\.agentvox\models\gemma-3-12b-it-Q4_K_M.gguf"
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=r"C:\Users\SS\.agentvox\models\gemma-3-12b-it-Q4_K_M.gguf",
+                        help="GGUF 모델 경로")
+    parser.add_argument("--threads", type=int, default=4, help="CPU 스레드 수")
+    parser.add_argument("--gpu-layers", type=int, default=0, help="GPU에 올릴 레이어 수")
+    args = parser.parse_args()
+    model_path = args.model
     
     if not os.path.exists(model_path):
         print(f"모델 파일을 찾을 수 없습니다: {model_path}")
@@ -128,7 +135,7 @@ def main():
     
     # AgentVox 실행
     try:
-        agent = TextAgentVox(model_path)
+        agent = TextAgentVox(model_path, n_threads=args.threads, n_gpu_layers=args.gpu_layers)
         agent.run()
     except Exception as e:
         print(f"초기화 실패: {e}")
@@ -7,61 +7,71 @@
 
 import os
 import sys
+import shutil
+import subprocess
 import speech_recognition as sr
-from pydub import AudioSegment
-from pydub.utils import make_chunks
 
-def extract_audio_from_video(video_path, audio_path="temp_audio.wav"):
-    """동영상에서 오디오 추출"""
-    print(f"동영상에서 오디오 추출 중: {video_path}")
+# 음성 인식에 넘기는 PCM 형식 (16 kHz, 모노, 16비트)
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+def extract_audio_from_video(video_path, start=0, duration=None, sample_rate=SAMPLE_RATE):
+    """동영상/오디오에서 16 kHz 모노 PCM 추출 (임시 파일 없이 메모리로)"""
+    print(f"오디오 추출 중: {video_path}")
     
-    # ffmpeg 명령어 사용
-    cmd = f'ffmpeg -i "{video_path}" -ab 160k -ac 2 -ar 44100 -vn "{audio_path}" -y'
-    os.system(cmd)
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg를 찾을 수 없습니다")
+        return None
     
-    if os.path.exists(audio_path):
-        print(f"오디오 추출 완료: {audio_path}")
-        return audio_path
-    else:
-        print("오디오 추출 실패")
+    # ffmpeg가 디코딩하면서 모노 16 kHz로 변환해 파이프로 출력
+    cmd = ["ffmpeg", "-nostdin", "-v", "error"]
+    if start:
+        cmd += ["-ss", str(start)]
+    cmd += ["-i", video_path, "-vn"]
+    if duration is not None:
+        cmd += ["-t", str(duration)]
+    cmd += ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-"]
+    
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0 or not result.stdout:
+        print(f"오디오 추출 실패: {result.stderr.decode(errors='replace').strip()}")
         return None
+    
+    pcm = result.stdout
+    print(f"오디오 추출 완료: {len(pcm) / (sample_rate * SAMPLE_WIDTH):.1f}초")
+    return pcm
+
+def make_chunks(pcm, chunk_length_ms=30000, sample_rate=SAMPLE_RATE):
+    """PCM을 일정 길이로 나눈 (시작 초, AudioData) 목록 (복사 없이 memoryview로 자름)"""
+    view = memoryview(pcm)
+    chunk_bytes = sample_rate * SAMPLE_WIDTH * chunk_length_ms // 1000
+    return [
+        (i / (sample_rate * SAMPLE_WIDTH), sr.AudioData(view[i:i + chunk_bytes], sample_rate, SAMPLE_WIDTH))
+        for i in range(0, len(view), chunk_bytes)
+    ]
 
-def transcribe_audio(audio_path, language="ko-KR", chunk_length_ms=30000):
-    """오디오 파일을 텍스트로 변환 (긴 파일도 처리)"""
+def transcribe_audio(pcm, language="ko-KR", chunk_length_ms=30000):
+    """PCM 오디오를 텍스트로 변환 (긴 파일도 처리)"""
     
     recognizer = sr.Recognizer()
     
-    # 오디오 파일 로드
-    print(f"오디오 파일 로딩: {audio_path}")
-    audio = AudioSegment.from_wav(audio_path)
-    
     # 30초 단위로 나누기
-    chunks = make_chunks(audio, chunk_length_ms)
+    chunks = make_chunks(pcm, chunk_length_ms)
     
     full_text = []
     
-    for i, chunk in enumerate(chunks):
+    for i, (_, audio_data) in enumerate(chunks):
         print(f"처리 중: {i+1}/{len(chunks)} 부분")
         
-        # 임시 파일로 저장
-        chunk_name = f"chunk_{i}.wav"
-        chunk.export(chunk_name, format="wav")
-        
         # 음성 인식
         try:
-            with sr.AudioFile(chunk_name) as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data, language=language)
-                full_text.append(text)
-                print(f"  인식됨: {text[:50]}...")
+            text = recognizer.recognize_google(audio_data, language=language)
+            full_text.append(text)
+            print(f"  인식됨: {text[:50]}...")
         except sr.UnknownValueError:
             print(f"  {i+1}번째 부분 인식 실패")
         except sr.RequestError as e:
             print(f"  API 오류: {e}")
-        finally:
-            # 임시 파일 삭제
-            if os.path.exists(chunk_name):
-                os.remove(chunk_name)
     
     return " ".join(full_text)
 
@@ -71,20 +81,18 @@ def process_video_or_audio(file_path, output_text_file="transcript.txt"):
     # 파일 확장자 확인
     ext = os.path.splitext(file_path)[1].lower()
     
-    # 동영상인 경우 오디오 추출
-    if ext in ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv']:
-        audio_path = extract_audio_from_video(file_path)
-        if not audio_path:
-            return None
-    elif ext in ['.wav', '.mp3', '.m4a', '.aac']:
-        audio_path = file_path
-    else:
+    # 동영상과 오디오 모두 ffmpeg로 바로 16 kHz 모노 PCM으로 디코딩
+    if ext not in ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.wav', '.mp3', '.m4a', '.aac']:
         print(f"지원하지 않는 형식: {ext}")
         return None
     
+    pcm = extract_audio_from_video(file_path)
+    if not pcm:
+        return None
+    
     # 음성 인식
     print("\n음성 인식 시작...")
-    transcript = transcribe_audio(audio_path)
+    transcript = transcribe_audio(pcm)
     
     # 결과 저장
     if transcript: